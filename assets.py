@@ -0,0 +1,62 @@
+import base64
+import hashlib
+import os
+from io import BytesIO
+from PIL import Image
+from cache import LRUCache
+
+
+class ImageAsset:
+    """Decoded image bytes plus the pixel size PIL reported for them."""
+
+    __slots__ = ('digest', 'data', 'width', 'height')
+
+    def __init__(self, data):
+        self.data = data
+        self.digest = hashlib.sha1(data).hexdigest()
+        with Image.open(BytesIO(data)) as img:
+            self.width, self.height = img.size
+
+    @property
+    def aspect(self):
+        return self.width / self.height
+
+    def stream(self):
+        # A fresh stream per add_picture call, the bytes themselves are shared
+        return BytesIO(self.data)
+
+
+# Keyed by a hash of the encoded form so that a cache hit skips the decode too
+_assets = LRUCache(
+    max_entries=int(os.getenv('ASSET_CACHE_ENTRIES', '32')),
+    max_bytes=int(os.getenv('ASSET_CACHE_BYTES', str(64 * 1024 * 1024))),
+    sizeof=lambda asset: len(asset.data),
+)
+
+
+def asset_from_data_url(data_url):
+    """Return the cached ImageAsset for a base64 data URL, decoding it on a miss."""
+    if ',' in data_url:
+        header, b64data = data_url.split(',', 1)
+    else:
+        b64data = data_url
+    key = 'data:' + hashlib.sha256(b64data.encode('ascii', 'ignore')).hexdigest()
+    asset = _assets.get(key)
+    if asset is None:
+        asset = _assets.put(key, ImageAsset(base64.b64decode(b64data)))
+    return asset
+
+
+def asset_from_path(path):
+    """Return the cached ImageAsset for an image file, re-reading it when it changes."""
+    st = os.stat(path)
+    key = 'file:%s:%d:%d' % (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    asset = _assets.get(key)
+    if asset is None:
+        with open(path, 'rb') as f:
+            asset = _assets.put(key, ImageAsset(f.read()))
+    return asset
+
+
+def asset_cache_stats():
+    return _assets.stats()
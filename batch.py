@@ -0,0 +1,64 @@
+"""Two-stage pipeline and streaming ZIP writer for batch deck generation.
+
+Each item goes through a generate stage and then a render stage. Up to
+`workers` items are in flight at once; rendering is CPU bound, so a separate
+gate allows at most `render_limit` of them in the render stage at a time.
+Results come back in completion order, so the first finished deck can be
+streamed while later ones are still generating.
+"""
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def run_pipeline(items, generate, render, workers=4, render_limit=2):
+    """Yield (index, result, error) for every item as it finishes; errors never stop the batch."""
+    render_gate = threading.BoundedSemaphore(render_limit)
+
+    def process(item):
+        generated = generate(item)
+        with render_gate:
+            return render(item, generated)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch') as pool:
+        futures = {pool.submit(process, item): index for index, item in enumerate(items)}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
+
+
+class _Sink:
+    """Write-only file object collecting what ZipFile writes between yields."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries):
+    """Generate a ZIP archive from (name, bytes) pairs without buffering the whole archive.
+
+    The sink is not seekable, so zipfile writes data descriptors after each
+    member instead of patching headers afterwards.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    yield sink.drain()
@@ -0,0 +1,84 @@
+"""Saving new slides on top of an uploaded deck: python-pptx vs. streaming append.
+
+Builds image-heavy decks of growing size, appends the same slides to each
+through both paths, checks the results have the same slides and reports
+time and peak Python memory. Peak memory of the append path should stay
+flat as the deck grows. Run from the repository root:
+
+    python benchmarks/bench_append.py [--sizes 20,200,500] [--new-slides 10]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pptx import Presentation
+
+import deck
+from bench_get_slides import make_deck
+from deck_append import append_slides
+
+
+def new_slides(count):
+    return [{'title': 'appended %d' % i, 'layoutType': ('boxes', 'versus', 'brain')[i % 3],
+             'content': [{'title': 'point %d' % j, 'content': 'detail'} for j in range(3)]} for i in range(count)]
+
+
+def in_memory(path, slides, out):
+    prs = Presentation(path)
+    renderer = deck.deck_renderer(prs, {}, {})
+    for slide_data in slides:
+        deck.render_slide(renderer, slide_data)
+    prs.save(out)
+
+
+def streaming(path, slides, out):
+    def render(prs, num_existing_slides):
+        renderer = deck.deck_renderer(prs, {}, {})
+        for slide_data in slides:
+            deck.render_slide(renderer, slide_data)
+    append_slides(path, out, render)
+
+
+def measure(fn, *args):
+    start = time.perf_counter()
+    with tempfile.TemporaryFile() as out:
+        fn(*args, out)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    with tempfile.TemporaryFile() as out:
+        fn(*args, out)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        out.seek(0)
+        slides = [slide.part.blob for slide in Presentation(BytesIO(out.read())).slides]
+    return slides, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='20,200,500')
+    parser.add_argument('--new-slides', type=int, default=10)
+    args = parser.parse_args()
+
+    slides = new_slides(args.new_slides)
+    print(f"{'slides':>7} {'MB':>6} {'pptx s':>8} {'pptx MB':>8} {'append s':>9} {'append MB':>10} {'speedup':>8}")
+    for size in [int(x) for x in args.sizes.split(',')]:
+        with tempfile.NamedTemporaryFile(suffix='.pptx') as source:
+            source.write(make_deck(size))
+            source.flush()
+            before, before_s, before_mem = measure(in_memory, source.name, slides)
+            after, after_s, after_mem = measure(streaming, source.name, slides)
+            if len(before) != len(after) or before[-len(slides):] != after[-len(slides):]:
+                sys.exit(f'appended slides differ for {size} slides')
+            print(f"{size:>7} {os.path.getsize(source.name) / 1e6:>6.1f} {before_s:>8.3f} {before_mem / 1e6:>8.1f}"
+                  f" {after_s:>9.3f} {after_mem / 1e6:>10.1f} {before_s / after_s:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""get-slides text extraction: python-pptx object model vs. streaming slide XML.
+
+Builds image-heavy decks (a picture, placeholders, a group and a table on
+every slide), checks that both paths give byte-identical JSON and reports
+time and peak Python memory for each. Run from the repository root:
+
+    python benchmarks/bench_get_slides.py [--sizes 20,200] [--repeat 3] [--processes 4]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from pptx import Presentation
+from pptx.util import Inches
+
+import legacy_layouts
+from slide_text import SlideParts, extract_slide_texts
+
+
+def make_deck(count, image_size=256):
+    prs = Presentation()
+    rng = random.Random(count)
+    for i in range(count):
+        slide = prs.slides.add_slide(prs.slide_layouts[1 if i % 2 else 5])
+        slide.shapes.title.text = 'Slide %d  ' % i
+        if i % 2:
+            body = slide.placeholders[1].text_frame
+            body.text = 'First point of slide %d' % i
+            body.add_paragraph().text = 'second\vwith a line break'
+            body.add_paragraph().text = '   '
+        # Noise pixels so every image is a distinct, poorly compressible part
+        image = Image.frombytes('RGB', (image_size, image_size), bytes(rng.getrandbits(8) for _ in range(3 * image_size * image_size)))
+        stream = BytesIO()
+        image.save(stream, 'PNG')
+        stream.seek(0)
+        slide.shapes.add_picture(stream, Inches(1), Inches(1), Inches(2), Inches(2))
+        group = slide.shapes.add_group_shape()
+        group.shapes.add_textbox(Inches(4), Inches(4), Inches(2), Inches(1)).text = 'grouped text is not read'
+        slide.shapes.add_table(2, 2, Inches(6), Inches(1), Inches(3), Inches(1)).table.cell(0, 0).text = 'table'
+        slide.shapes.add_textbox(Inches(1), Inches(5), Inches(4), Inches(1)).text = 'Note: caption %d\n\nend' % i
+    output = BytesIO()
+    prs.save(output)
+    return output.getvalue()
+
+
+def object_model(package_bytes):
+    return legacy_layouts.extract_slides(Presentation(BytesIO(package_bytes)))
+
+
+def streaming(package_bytes, processes=0):
+    return extract_slide_texts(SlideParts(package_bytes), processes=processes, min_parallel=1)
+
+
+def measure(fn, *args, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, min(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='20,200')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--processes', type=int, default=0, help='also time the process pool path')
+    args = parser.parse_args()
+
+    print(f"{'slides':>7} {'MB':>6} {'pptx s':>8} {'pptx MB':>8} {'xml s':>8} {'xml MB':>8} {'speedup':>8}"
+          + (f" {'pool s':>8}" if args.processes else ''))
+    for size in [int(x) for x in args.sizes.split(',')]:
+        package_bytes = make_deck(size)
+        before, before_s, before_mem = measure(object_model, package_bytes, repeat=args.repeat)
+        after, after_s, after_mem = measure(streaming, package_bytes, repeat=args.repeat)
+        if json.dumps(before) != json.dumps(after):
+            sys.exit(f'output differs for {size} slides')
+        line = (f"{size:>7} {len(package_bytes) / 1e6:>6.1f} {before_s:>8.3f} {before_mem / 1e6:>8.1f}"
+                f" {after_s:>8.3f} {after_mem / 1e6:>8.1f} {before_s / after_s:>7.1f}x")
+        if args.processes:
+            streaming(package_bytes, args.processes)  # start the workers outside the timing
+            pooled, pooled_s, _ = measure(streaming, package_bytes, args.processes, repeat=args.repeat)
+            if json.dumps(pooled) != json.dumps(before):
+                sys.exit(f'pooled output differs for {size} slides')
+            line += f" {pooled_s:>8.3f}"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Deck size and save time with and without media optimization.
+
+Builds decks with a logo on every slide, from a photo-sized PNG or JPEG
+data URL as the front end would send it, and saves each one as is and
+after media.optimize(). Reports the .pptx size, the image bytes saved and
+the time from a built deck to its saved bytes (best of --repeat). The
+first optimized save pays for resampling the logo; later decks get it from
+the cache, which is what "warm" shows. Run from the repository root:
+
+    python benchmarks/bench_media.py [--sizes 10,100] [--logo-size 2000] [--dpi 150] [--repeat 3]
+"""
+import argparse
+import base64
+import os
+import random
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageFilter
+
+import deck
+import media
+from bench_render import synthetic_slides
+
+
+def photo_data_url(size, image_format):
+    """A smooth, noisy, photo-like image; solid colours would compress too well to be realistic."""
+    rng = random.Random(size)
+    small = Image.frombytes('RGB', (size // 16, size // 16), bytes(rng.getrandbits(8) for _ in range(3 * (size // 16) ** 2)))
+    image = small.resize((size, size), Image.BICUBIC).filter(ImageFilter.GaussianBlur(2))
+    noise = Image.effect_noise((size, size), 12).convert('RGB')
+    image = Image.blend(image, noise, 0.15)
+    output = BytesIO()
+    image.save(output, image_format, **({'quality': 92} if image_format == 'JPEG' else {}))
+    mimetype = 'image/png' if image_format == 'PNG' else 'image/jpeg'
+    return f'data:{mimetype};base64,' + base64.b64encode(output.getvalue()).decode('ascii')
+
+
+def build(slides, logo):
+    prs = deck.PresentationPool.build()
+    renderer = deck.deck_renderer(prs, {}, {'logoDataUrl': logo, 'logoPosition': 'top-right'})
+    renderer.add_title_slide('Media')
+    for slide_data in slides:
+        deck.render_slide(renderer, slide_data)
+    return prs
+
+
+def save(prs, optimize, dpi):
+    start = time.perf_counter()
+    report = media.optimize(prs, dpi) if optimize else None
+    output = BytesIO()
+    prs.save(output)
+    return time.perf_counter() - start, len(output.getvalue()), report
+
+
+def best_of(slides, logo, optimize, dpi, repeat):
+    # A fresh deck per round: optimize() changes the deck it works on
+    runs = [save(build(slides, logo), optimize, dpi) for _ in range(repeat)]
+    return min(run[0] for run in runs), runs[-1][1], runs[-1][2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10,100')
+    parser.add_argument('--logo-size', type=int, default=2000, help='logo width and height in pixels')
+    parser.add_argument('--dpi', type=int, default=150)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    # Templates and the decoded logo outside the timed region, as a warm server would have them
+    build(synthetic_slides(3), None)
+
+    print(f"{'logo':>5} {'slides':>7} {'plain KB':>10} {'optimized KB':>13} {'saved KB':>9} "
+          f"{'plain s':>8} {'cold s':>8} {'warm s':>8}")
+    for image_format in ('PNG', 'JPEG'):
+        logo = photo_data_url(args.logo_size, image_format)
+        for size in [int(x) for x in args.sizes.split(',')]:
+            slides = synthetic_slides(size)
+            plain_seconds, plain_bytes, _ = best_of(slides, logo, False, args.dpi, args.repeat)
+            media._optimized.clear()
+            cold_seconds, _, _ = save(build(slides, logo), True, args.dpi)
+            warm_seconds, optimized_bytes, report = best_of(slides, logo, True, args.dpi, args.repeat)
+            print(f"{image_format:>5} {size:>7} {plain_bytes / 1024:>10.0f} {optimized_bytes / 1024:>13.0f} "
+                  f"{report['bytes_saved'] / 1024:>9.0f} {plain_seconds:>8.3f} {cold_seconds:>8.3f} {warm_seconds:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
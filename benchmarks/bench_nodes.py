@@ -0,0 +1,144 @@
+"""Two app nodes sharing one storage backend: what a request costs on the node that did not do the work.
+
+Starts benchmarks/stub_redis.py in process (--latency adds a network hop to
+every command) and two app processes pointed at it with STORAGE_URL, each
+with its own local folder, as two hosts behind a load balancer would be.
+Every round uploads a fresh deck to node A, then times the same request on
+A, which does the work, and on B, which finds it in the backend:
+get-slides (B reads the shared slide text), save-presentation on the
+uploaded deck (B reads the built deck) and a session edit (B rebuilds the
+session from its saved state, then edits its own copy). Results are
+written in the suite's JSON format. Run from the repository root:
+
+    python benchmarks/bench_nodes.py [--slides 50] [--rounds 5] [--latency 0.0005] [--output nodes.json]
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+from stub_redis import StubRedisServer
+from suite import Client, git_commit, summarize, upload
+
+# Runs in each node process
+CHILD = r'''
+import logging, sys
+import server
+from werkzeug.serving import make_server
+logging.getLogger('werkzeug').setLevel(logging.WARNING)
+if __name__ == '__main__':
+    make_server('127.0.0.1', int(sys.argv[1]), server.app, threaded=True).serve_forever()
+'''
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_node(env, port):
+    process = subprocess.Popen([sys.executable, '-c', CHILD, str(port)], cwd=ROOT, env=env)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f'node on port {port} did not start')
+
+
+def timed(samples, name, call):
+    start = time.perf_counter()
+    status, data = call()
+    if status not in (200, 201):
+        raise RuntimeError(f'{name} failed with {status}: {data[:200]!r}')
+    samples.setdefault(name, []).append(time.perf_counter() - start)
+    return data
+
+
+def uploaded_deck(slides, round_number):
+    """A deck with different bytes every round, so no round hits the caches of the one before."""
+    from pptx import Presentation
+    from io import BytesIO
+    prs = Presentation()
+    for i in range(slides):
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = f'Round {round_number} slide {i}'
+        slide.placeholders[1].text = f'Body text of slide {i}'
+    output = BytesIO()
+    prs.save(output)
+    return output.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--slides', type=int, default=50, help='slides in the uploaded deck')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.0005, help='seconds the stub Redis adds per command')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args()
+
+    from bench_render import synthetic_slides
+    redis = StubRedisServer(latency=args.latency).start()
+    scratch = tempfile.mkdtemp(prefix='sliding-nodes-')
+    nodes = {}
+    processes = []
+    started = time.time()
+    try:
+        for name in ('a', 'b'):
+            port = free_port()
+            env = dict(os.environ, STORAGE_URL=redis.url, LLM_BACKEND='stub',
+                       UPLOAD_STORE_FOLDER=os.path.join(scratch, name, 'uploads'),
+                       CACHE_FOLDER=os.path.join(scratch, name, 'cache'))
+            processes.append(start_node(env, port))
+            nodes[name] = Client(port)
+
+        samples = {}
+        edit = {'operations': [{'op': 'edit', 'index': 0, 'slide': synthetic_slides(1)[0]}]}
+        for round_number in range(args.rounds):
+            upload_id = upload(nodes['a'], uploaded_deck(args.slides, round_number))
+            for name in ('a', 'b'):
+                timed(samples, f'get_slides.node_{name}',
+                      lambda: nodes[name].post_json('/api/get-slides', {'uploadId': upload_id}))
+            payload = {'uploadId': upload_id, 'slides': synthetic_slides(5), 'filename': 'nodes.pptx'}
+            for name in ('a', 'b'):
+                timed(samples, f'save.node_{name}', lambda: nodes[name].post_json('/api/save-presentation', payload))
+            data = timed(samples, 'session.create', lambda: nodes['a'].post_json('/api/sessions', payload))
+            path = f"/api/sessions/{json.loads(data)['sessionId']}"
+            body = json.dumps(edit)
+            headers = {'Content-Type': 'application/json'}
+            timed(samples, 'session.edit_node_a', lambda: nodes['a'].request('PATCH', path, body, headers))
+            timed(samples, 'session.edit_node_b_restore', lambda: nodes['b'].request('PATCH', path, body, headers))
+            timed(samples, 'session.edit_node_b', lambda: nodes['b'].request('PATCH', path, body, headers))
+        results = {f'nodes.{name}': summarize(timings) for name, timings in samples.items()}
+        results['nodes.redis_commands'] = {'n': redis.commands}
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+        redis.shutdown()
+
+    text = json.dumps({
+        'meta': {'commit': git_commit(), 'timestamp': started, 'duration': time.time() - started, 'args': vars(args)},
+        'results': results,
+    }, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Slides/second of the python-pptx setter layouts vs. the template-compiled renderer.
+
+Run from the repository root:
+
+    python benchmarks/bench_render.py [--sizes 10,100,1000] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pptx import Presentation
+from pptx.util import Inches
+
+import legacy_layouts
+from layouts import SlideRenderer
+
+COLORS = ((34, 34, 34), (220, 53, 69), (244, 246, 251))
+LAYOUTS = ['boxes', 'versus', 'brain']
+
+
+def synthetic_slides(count):
+    slides = []
+    for i in range(count):
+        slides.append({
+            'layoutType': LAYOUTS[i % len(LAYOUTS)],
+            'title': 'slide %d about quarterly results' % i,
+            'content': [
+                {'title': 'point %d' % j, 'content': 'Short supporting sentence number %d for the slide.' % j}
+                for j in range(1 + i % 5)
+            ],
+        })
+    return slides
+
+
+def new_presentation():
+    prs = Presentation()
+    prs.slide_width = Inches(16)
+    prs.slide_height = Inches(9)
+    return prs
+
+
+def build_legacy(slides):
+    prs = new_presentation()
+    legacy_layouts.add_title_slide(prs, 'Benchmark')
+    for slide in slides:
+        legacy_layouts.add_content_slide(prs, slide['layoutType'], slide['title'].title(), slide['content'], *COLORS)
+    prs.save(BytesIO())
+
+
+def build_templates(slides):
+    prs = new_presentation()
+    renderer = SlideRenderer(prs, *COLORS)
+    renderer.add_title_slide('Benchmark')
+    for slide in slides:
+        renderer.add_slide(slide['layoutType'], slide['title'].title(), slide['content'])
+    prs.save(BytesIO())
+
+
+def best_of(fn, slides, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(slides)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    # Build the templates outside the timed region, as a warm server would
+    build_templates(synthetic_slides(3))
+
+    print(f"{'slides':>7} {'before s/s':>12} {'after s/s':>12} {'speedup':>8}")
+    for size in [int(x) for x in args.sizes.split(',')]:
+        slides = synthetic_slides(size)
+        before = best_of(build_legacy, slides, args.repeat)
+        after = best_of(build_templates, slides, args.repeat)
+        print(f"{size:>7} {size / before:>12.1f} {size / after:>12.1f} {before / after:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Cold start: time to load the app and latency of the first requests a fresh process serves.
+
+Every sample is a new Python process that loads the app, then sends GET /,
+a save-presentation and a second save-presentation through Flask's test
+client. The app is loaded two ways: "import" is a bare import server, as
+the development server does, and "preload" is serve.py's preload(), which
+imports everything up front and fills the pool of blank presentations
+before the first request. Each runs once per PRESENTATION_POOL_SIZE.
+Results are written in the suite's JSON format, so two runs can be compared
+with benchmarks/compare.py. Run from the repository root:
+
+    python benchmarks/bench_startup.py [--repeat 5] [--pool-sizes 0,4] [--output startup.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+from suite import git_commit, summarize
+
+# Runs in the child; prints one JSON line of timings in seconds
+CHILD = r'''
+import json, sys, time
+started = time.perf_counter()
+if sys.argv[2] == 'preload':
+    import serve
+    app = serve.preload()
+else:
+    import server
+    app = server.app
+timings = {'load': time.perf_counter() - started}
+timings['modules'] = sorted(m for m in ('pptx', 'openai', 'aiohttp', 'deck') if m in sys.modules)
+client = app.test_client()
+payload = json.loads(sys.argv[1])
+
+def timed(name, call):
+    start = time.perf_counter()
+    response = call()
+    assert response.status_code == 200, (name, response.status_code)
+    timings[name] = time.perf_counter() - start
+
+timed('index', lambda: client.get('/'))
+timed('first_save', lambda: client.post('/api/save-presentation', json=payload))
+timed('second_save', lambda: client.post('/api/save-presentation', json=dict(payload, filename='second.pptx')))
+timings['first_response'] = timings['load'] + timings['index']
+print(json.dumps(timings))
+'''
+
+
+def run_child(env, payload, mode):
+    output = subprocess.run([sys.executable, '-c', CHILD, json.dumps(payload), mode], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='fresh processes per configuration')
+    parser.add_argument('--pool-sizes', default='0,4', help='PRESENTATION_POOL_SIZE values to compare')
+    parser.add_argument('--slides', type=int, default=10, help='slides in the save-presentation payload')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args()
+
+    from bench_render import synthetic_slides
+    payload = {'slides': synthetic_slides(args.slides), 'filename': 'startup.pptx'}
+    scratch = tempfile.mkdtemp(prefix='sliding-startup-')
+    results = {}
+    started = time.time()
+    for pool_size in args.pool_sizes.split(','):
+        env = dict(os.environ, PRESENTATION_POOL_SIZE=pool_size, DECK_CACHE_BYTES='0', COMPLETION_CACHE_BYTES='0',
+                   LLM_BACKEND='stub', UPLOAD_STORE_FOLDER=os.path.join(scratch, 'uploads'),
+                   CACHE_FOLDER=os.path.join(scratch, 'cache'))
+        for mode in ('import', 'preload'):
+            samples = [run_child(env, payload, mode) for _ in range(args.repeat)]
+            for name in ('load', 'index', 'first_response', 'first_save', 'second_save'):
+                results[f'startup.{mode}.pool_{pool_size}.{name}'] = summarize([sample[name] for sample in samples])
+            print(f"{mode}, pool {pool_size}: heavy modules loaded before the first request: "
+                  f"{', '.join(samples[0]['modules']) or 'none'}", file=sys.stderr)
+
+    text = json.dumps({
+        'meta': {'commit': git_commit(), 'timestamp': started, 'duration': time.time() - started, 'args': vars(args)},
+        'results': results,
+    }, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
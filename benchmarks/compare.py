@@ -0,0 +1,57 @@
+"""Compare two benchmarks/suite.py result files.
+
+Prints a statistic (the median by default) of every benchmark in both runs
+and the change, and exits
+with status 1 if any benchmark got slower by more than --threshold (a
+fraction; 0.1 = 10%). Benchmarks faster than --min-seconds in both runs are
+shown but never fail the comparison, as their noise is larger than any change.
+
+    python benchmarks/compare.py base.json new.json [--threshold 0.1] [--min-seconds 0.0001] [--stat min]
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=0.1)
+    parser.add_argument('--min-seconds', type=float, default=0.0001)
+    parser.add_argument('--stat', default='median', choices=('median', 'mean', 'min', 'p95'),
+                        help='min is the steadiest for micro-benchmarks on a busy machine')
+    args = parser.parse_args()
+
+    base, new = load(args.base), load(args.new)
+    print(f"base {base['meta'].get('commit') or '?'}  new {new['meta'].get('commit') or '?'}")
+    names = sorted(set(base['results']) | set(new['results']))
+    width = max([len(name) for name in names] + [len(args.stat) + 12])
+    print(f"{'benchmark (' + args.stat + ')':<{width}} {'base':>11} {'new':>11} {'change':>8}")
+    regressions = []
+    for name in names:
+        before = base['results'].get(name, {}).get(args.stat)
+        after = new['results'].get(name, {}).get(args.stat)
+        if before is None or after is None:
+            shown = f'{before:>11.6f}' if before is not None else f"{'-':>11}"
+            shown += f' {after:>11.6f}' if after is not None else f" {'-':>11}"
+            print(f'{name:<{width}} {shown}')
+            continue
+        change = (after - before) / before if before else 0.0
+        flag = ''
+        if change > args.threshold and max(before, after) >= args.min_seconds:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f'{name:<{width}} {before:>11.6f} {after:>11.6f} {change:>+7.1%}{flag}')
+    if regressions:
+        print(f'{len(regressions)} regression(s) over {args.threshold:.0%}: {", ".join(regressions)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,357 @@
+"""The deck code the server used to run, kept as the baseline for the "before" benchmarks.
+
+Slides built one python-pptx property setter at a time (layouts.SlideRenderer
+renders the same XML from compiled templates) and slide text read through the
+python-pptx object model (slide_text.py reads the XML directly and must match
+extract_slides() exactly). Nothing in the app imports this module.
+"""
+import os
+from pptx.util import Inches, Pt
+from pptx.enum.text import PP_ALIGN, MSO_VERTICAL_ANCHOR
+from pptx.dml.color import RGBColor
+
+def add_logo_to_slide(slide, logo, logo_position):
+    if not logo or not logo_position:
+        return
+    try:
+        logo_height = Inches(0.5)
+        logo_width = Inches(0.5) * logo.aspect
+        slide_width = Inches(16)
+        slide_height = Inches(9)
+        # Position
+        if logo_position == 'top-left':
+            left = Inches(0.3)
+            top = Inches(0.3)
+        elif logo_position == 'top-right':
+            left = slide_width - logo_width - Inches(0.3)
+            top = Inches(0.3)
+        elif logo_position == 'bottom-left':
+            left = Inches(0.3)
+            top = slide_height - logo_height - Inches(0.3)
+        elif logo_position == 'bottom-right':
+            left = slide_width - logo_width - Inches(0.3)
+            top = slide_height - logo_height - Inches(0.3)
+        else:
+            left = Inches(0.3)
+            top = Inches(0.3)
+        # python-pptx matches the stream by SHA1, so the image part is stored once per deck
+        slide.shapes.add_picture(logo.stream(), left, top, logo_width, logo_height)
+    except Exception as e:
+        print(f"Error adding logo: {e}")
+
+def add_title_slide(prs, title_text):
+    """Title slide, one property setter at a time."""
+    title_slide_layout = prs.slide_layouts[6]  # Blank layout
+    title_slide = prs.slides.add_slide(title_slide_layout)
+    title_box = title_slide.shapes.add_shape(
+        1,  # Rectangle shape
+        Inches(0.61),  # Left position
+        Inches(2.16),  # Top position
+        Inches(8.7),   # Width
+        Inches(1.46)   # Height
+    )
+    title_box.fill.background()  # No fill
+    title_box.line.fill.background()  # No border
+    title_box.shadow.inherit = False  # Remove shadow
+    title_frame = title_box.text_frame
+    title_frame.word_wrap = True
+    title_paragraph = title_frame.paragraphs[0]
+    title_paragraph.alignment = PP_ALIGN.LEFT
+    title_run = title_paragraph.add_run()
+    title_run.text = title_text
+    title_run.font.name = 'Frutiger 45 Light'
+    title_run.font.size = Pt(40)
+    title_run.font.color.rgb = RGBColor(0, 0, 0)
+    title_run.font.shadow = None  # Remove shadow
+    presenter_box = title_slide.shapes.add_shape(
+        1,  # Rectangle shape
+        Inches(0.61),  # Left position
+        Inches(4.72),  # Top position
+        Inches(7.48),  # Width
+        Inches(0.3)    # Height
+    )
+    presenter_box.fill.background()  # No fill
+    presenter_box.line.fill.background()  # No border
+    presenter_box.shadow.inherit = False  # Remove shadow
+    presenter_frame = presenter_box.text_frame
+    presenter_frame.word_wrap = True
+    presenter_paragraph = presenter_frame.paragraphs[0]
+    presenter_paragraph.alignment = PP_ALIGN.LEFT
+    presenter_run = presenter_paragraph.add_run()
+    presenter_run.text = "Presenter"
+    presenter_run.font.name = 'Frutiger 45 Light'
+    presenter_run.font.size = Pt(16)
+    presenter_run.font.color.rgb = RGBColor(0, 0, 0)
+    presenter_run.font.shadow = None  # Remove shadow
+    return title_slide
+
+def add_content_slide(prs, layout_type, title_text, content, content_text_rgb, highlight_rgb, forms_bg_rgb, logo=None, logo_position=None):
+    """Content slide, one property setter at a time."""
+    slide_layout = prs.slide_layouts[6]
+    slide = prs.slides.add_slide(slide_layout)
+
+    # Add title at the top for all layouts
+    title_shape = slide.shapes.add_shape(
+        1,  # Rectangle shape
+        Inches(1),  # Left position
+        Inches(0.5),  # Top position
+        Inches(14),  # Width
+        Inches(1)  # Height
+    )
+    title_shape.fill.background()  # No fill
+    title_shape.line.fill.background()  # No border
+    title_shape.shadow.inherit = False  # Remove shadow
+    title_frame = title_shape.text_frame
+    title_frame.word_wrap = True
+    title_paragraph = title_frame.paragraphs[0]
+    title_paragraph.alignment = PP_ALIGN.LEFT
+    title_run = title_paragraph.add_run()
+    title_run.text = title_text
+    title_run.font.name = 'Frutiger 45 Light'
+    title_run.font.size = Pt(44)
+    title_run.font.color.rgb = RGBColor(0,0,0)
+    title_run.font.shadow = None  # Remove shadow
+
+    if layout_type == 'boxes':
+        create_list_boxes(slide, content, content_text_rgb, highlight_rgb, forms_bg_rgb)
+    elif layout_type == 'versus':
+        create_versus_layout(slide, content, content_text_rgb, highlight_rgb, forms_bg_rgb)
+    elif layout_type == 'brain':
+        create_brain_layout(slide, content, content_text_rgb, highlight_rgb, forms_bg_rgb)
+    else:
+        create_list_boxes(slide, content, content_text_rgb, highlight_rgb, forms_bg_rgb)
+    # Add logo to all slides except the first
+    add_logo_to_slide(slide, logo, logo_position)
+    return slide
+
+def create_list_boxes(slide, content, content_text_rgb, highlight_rgb, forms_bg_rgb):
+    """Create boxes for list items."""
+    # Filter out any empty content items
+    content = [item for item in content if item and (isinstance(item, dict) and (item.get('title') or item.get('content')) or isinstance(item, str) and item.strip())]
+    
+    num_points = len(content)
+    if num_points > 0:
+        # Get the actual slide width from the presentation
+        slide_width = Inches(16)  # Standard 16:9 slide width
+        slide_margin = Inches(1)  # Margin from edges
+        
+        # Calculate available width for boxes
+        available_width = slide_width - (2 * slide_margin)
+        
+        # Calculate box dimensions
+        box_margin = Inches(0.3)  # Margin between boxes
+        total_margins = box_margin * (num_points - 1)  # Total space needed for margins
+        box_width = (available_width - total_margins) / num_points
+        
+        # Calculate starting position to center the boxes
+        start_x = slide_margin
+        start_y = Inches(3)  # Position below title
+        
+        for i, point in enumerate(content):
+            # Calculate box position
+            left = start_x + (i * (box_width + box_margin))
+            top = start_y
+            
+            # Create box shape
+            box = slide.shapes.add_shape(1, left, top, box_width, Inches(2.5))
+            box.fill.solid()
+            box.fill.fore_color.rgb = RGBColor(*forms_bg_rgb)
+            box.line.fill.background()
+            box.shadow.inherit = False  # Remove shadow
+            
+            # Configure text frame
+            text_frame = box.text_frame
+            text_frame.word_wrap = True
+            text_frame.margin_left = Inches(0.2)
+            text_frame.margin_right = Inches(0.2)
+            text_frame.margin_top = Inches(0.2)
+            text_frame.margin_bottom = Inches(0.2)
+            
+            # Clear any default paragraphs
+            for paragraph in text_frame.paragraphs:
+                p = paragraph._element
+                p.getparent().remove(p)
+            
+            if isinstance(point, dict):
+                title = point.get('title', '')
+                content_val = point.get('content', '')
+                
+                # Add title
+                p = text_frame.add_paragraph()
+                p.alignment = PP_ALIGN.LEFT
+                run = p.add_run()
+                run.text = title.title()
+                run.font.name = 'Frutiger 45 Light'
+                run.font.size = Pt(16)
+                run.font.color.rgb = RGBColor(*highlight_rgb)
+                run.font.bold = False
+                run.font.shadow = None
+                # Add line break (empty paragraph)
+                if content_val:
+                    p = text_frame.add_paragraph()
+                    p.alignment = PP_ALIGN.LEFT
+                    p.add_run().text = ''
+                # Add content
+                if content_val:
+                    p = text_frame.add_paragraph()
+                    run = p.add_run()
+                    run.text = content_val
+                    run.font.name = 'Frutiger 45 Light'
+                    run.font.size = Pt(14)
+                    run.font.color.rgb = RGBColor(*content_text_rgb)
+                    run.font.shadow = None
+            else:
+                # Add simple text
+                p = text_frame.add_paragraph()
+                run = p.add_run()
+                run.text = point
+                run.font.name = 'Frutiger 45 Light'
+                run.font.size = Pt(14)
+                run.font.color.rgb = RGBColor(*content_text_rgb)
+                run.font.shadow = None
+
+            text_frame.vertical_anchor = MSO_VERTICAL_ANCHOR.TOP
+
+def create_versus_layout(slide, content, content_text_rgb, highlight_rgb, forms_bg_rgb):
+    # Add versus image in the center
+    img_path = os.path.join('sliding', 'icons', 'versus.png')
+    img_width = Inches(1.5)
+    img_height = Inches(1.5)
+    slide_width = Inches(16)
+    center_x = (slide_width - img_width) / 2
+    center_y = Inches(3.5)
+    if os.path.exists(img_path):
+        slide.shapes.add_picture(img_path, center_x, center_y, img_width, img_height)
+    # Two side boxes
+    left_box = slide.shapes.add_shape(1, Inches(1.2), Inches(2.5), Inches(5.5), Inches(3))
+    right_box = slide.shapes.add_shape(1, Inches(9.3), Inches(2.5), Inches(5.5), Inches(3))
+    for box, idx in zip([left_box, right_box], range(2)):
+        box.fill.solid()
+        box.fill.fore_color.rgb = RGBColor(*forms_bg_rgb)
+        box.line.fill.background()
+        box.shadow.inherit = False
+        text_frame = box.text_frame
+        text_frame.word_wrap = True
+        text_frame.margin_left = Inches(0.2)
+        text_frame.margin_right = Inches(0.2)
+        text_frame.margin_top = Inches(0.2)
+        text_frame.margin_bottom = Inches(0.2)
+        for paragraph in text_frame.paragraphs:
+            p = paragraph._element
+            p.getparent().remove(p)
+        if idx < len(content):
+            point = content[idx]
+            if isinstance(point, dict):
+                title = point.get('title', '')
+                box_p = text_frame.add_paragraph()
+                box_p.alignment = PP_ALIGN.LEFT
+                run = box_p.add_run()
+                run.text = title.title()
+                run.font.name = 'Frutiger 45 Light'
+                run.font.size = Pt(16)
+                run.font.color.rgb = RGBColor(*highlight_rgb)
+                run.font.bold = True
+                run.font.shadow = None
+                box_content = point.get('content', '')
+                if box_content:
+                    box_p = text_frame.add_paragraph()
+                    box_p.alignment = PP_ALIGN.LEFT
+                    run = box_p.add_run()
+                    run.text = box_content
+                    run.font.name = 'Frutiger 45 Light'
+                    run.font.size = Pt(14)
+                    run.font.color.rgb = RGBColor(*content_text_rgb)
+                    run.font.shadow = None
+            else:
+                box_p = text_frame.add_paragraph()
+                box_p.alignment = PP_ALIGN.LEFT
+                run = box_p.add_run()
+                run.text = str(point)
+                run.font.name = 'Frutiger 45 Light'
+                run.font.size = Pt(14)
+                run.font.color.rgb = RGBColor(*content_text_rgb)
+                run.font.shadow = None
+
+def create_brain_layout(slide, content, content_text_rgb, highlight_rgb, forms_bg_rgb):
+    # Add brain image in the center
+    img_path = os.path.join('sliding', 'icons', 'brain.png')
+    img_width = Inches(1.5)
+    img_height = Inches(1.5)
+    slide_width = Inches(16)
+    center_x = (slide_width - img_width) / 2
+    center_y = Inches(3.5)
+    if os.path.exists(img_path):
+        slide.shapes.add_picture(img_path, center_x, center_y, img_width, img_height)
+    # Two vertical boxes
+    top_box = slide.shapes.add_shape(1, Inches(5.5), Inches(1.5), Inches(5), Inches(2.2))
+    bottom_box = slide.shapes.add_shape(1, Inches(5.5), Inches(5.2), Inches(5), Inches(2.2))
+    for box, idx in zip([top_box, bottom_box], range(2)):
+        box.fill.solid()
+        box.fill.fore_color.rgb = RGBColor(*forms_bg_rgb)
+        box.line.fill.background()
+        box.shadow.inherit = False
+        text_frame = box.text_frame
+        text_frame.word_wrap = True
+        text_frame.margin_left = Inches(0.2)
+        text_frame.margin_right = Inches(0.2)
+        text_frame.margin_top = Inches(0.2)
+        text_frame.margin_bottom = Inches(0.2)
+        for paragraph in text_frame.paragraphs:
+            p = paragraph._element
+            p.getparent().remove(p)
+        if idx < len(content):
+            point = content[idx]
+            if isinstance(point, dict):
+                title = point.get('title', '')
+                box_p = text_frame.add_paragraph()
+                box_p.alignment = PP_ALIGN.LEFT
+                run = box_p.add_run()
+                run.text = title.title()
+                run.font.name = 'Frutiger 45 Light'
+                run.font.size = Pt(16)
+                run.font.color.rgb = RGBColor(*highlight_rgb)
+                run.font.bold = True
+                run.font.shadow = None
+                box_content = point.get('content', '')
+                if box_content:
+                    box_p = text_frame.add_paragraph()
+                    box_p.alignment = PP_ALIGN.LEFT
+                    run = box_p.add_run()
+                    run.text = box_content
+                    run.font.name = 'Frutiger 45 Light'
+                    run.font.size = Pt(14)
+                    run.font.color.rgb = RGBColor(*content_text_rgb)
+                    run.font.shadow = None
+            else:
+                box_p = text_frame.add_paragraph()
+                box_p.alignment = PP_ALIGN.LEFT
+                run = box_p.add_run()
+                run.text = str(point)
+                run.font.name = 'Frutiger 45 Light'
+                run.font.size = Pt(14)
+                run.font.color.rgb = RGBColor(*content_text_rgb)
+                run.font.shadow = None
+
+            text_frame.vertical_anchor = MSO_VERTICAL_ANCHOR.TOP
+
+def extract_slides(prs):
+    """Title (first non-empty text shape) and remaining text of every slide, through the object model."""
+    slides = []
+    for slide in prs.slides:
+        title = ""
+        content = []
+        for shape in slide.shapes:
+            if not shape.has_text_frame:
+                continue
+            text = shape.text.strip()
+            if not text:
+                continue
+            if not title:
+                title = text
+            else:
+                content.append(text)
+        slides.append({
+            "title": title,
+            "content": "\n".join(content)
+        })
+    return slides
@@ -0,0 +1,149 @@
+"""Local stand-in for the OpenAI chat completions API, for load tests.
+
+Answers POST /v1/chat/completions (plain and stream=true, with or without
+functions) with the same canned replies as LLM_BACKEND=stub, after a configurable delay, so the
+server's real OpenAI code path (openai + aiohttp, retries, pooling) is
+exercised without network access or cost. Point the server at it with
+OPENAI_API_BASE=http://127.0.0.1:<port>/v1 and any OPENAI_API_KEY.
+
+    python benchmarks/stub_openai.py [--port 8399] [--latency 0.2] [--jitter 0.05] [--token-delay 0]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm import stub_reply
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Set on the server: latency, jitter, token_delay, error_rate
+    server_version = 'stub-openai'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if self.path.rstrip('/') != '/v1/chat/completions':
+            self._send_json(404, {'error': {'message': f'unknown path {self.path}', 'type': 'invalid_request_error'}})
+            return
+        settings = self.server
+        time.sleep(settings.latency + random.uniform(0, settings.jitter))
+        if settings.error_rate and random.random() < settings.error_rate:
+            self._send_json(429, {'error': {'message': 'stub rate limit', 'type': 'rate_limit_error'}})
+            return
+        settings.count()
+        function = (request.get('functions') or [None])[0]
+        text = stub_reply(request.get('messages') or [{'content': ''}], request.get('max_tokens'), function)
+        completion_id = 'chatcmpl-' + uuid.uuid4().hex
+        model = request.get('model', 'gpt-3.5-turbo')
+        if not request.get('stream'):
+            time.sleep(settings.token_delay * (len(text) // 4))
+            prompt_tokens = sum(len(m.get('content', '')) for m in request.get('messages', [])) // 4
+            self._send_json(200, {
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'message': self._message(text, function), 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': len(text) // 4,
+                          'total_tokens': prompt_tokens + len(text) // 4},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        if function is not None:
+            # The first delta names the function, the rest carry its arguments
+            self._send_chunk(completion_id, model, {'role': 'assistant', 'content': None,
+                                                    'function_call': {'name': function['name'], 'arguments': ''}})
+        for start in range(0, len(text), 4):
+            piece = text[start:start + 4]
+            delta = {'function_call': {'arguments': piece}} if function is not None else {'content': piece}
+            self._send_chunk(completion_id, model, delta)
+            if settings.token_delay:
+                time.sleep(settings.token_delay)
+        self.wfile.write(b'data: [DONE]\n\n')
+
+    @staticmethod
+    def _message(text, function):
+        if function is None:
+            return {'role': 'assistant', 'content': text}
+        return {'role': 'assistant', 'content': None, 'function_call': {'name': function['name'], 'arguments': text}}
+
+    def _send_chunk(self, completion_id, model, delta):
+        chunk = {
+            'id': completion_id,
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}],
+        }
+        self.wfile.write(b'data: ' + json.dumps(chunk).encode('utf-8') + b'\n\n')
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.2, jitter=0.0, token_delay=0.0, error_rate=0.0):
+        super().__init__(('127.0.0.1', port), StubHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    @property
+    def api_base(self):
+        return 'http://127.0.0.1:%d/v1' % self.server_address[1]
+
+    def start(self):
+        """Serve on a daemon thread and return self."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8399)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds before the reply (or first token)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many extra seconds, uniformly random')
+    parser.add_argument('--token-delay', type=float, default=0.0, help='seconds per ~4 characters of reply')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with a 429')
+    args = parser.parse_args()
+    server = StubServer(args.port, args.latency, args.jitter, args.token_delay, args.error_rate)
+    print(f'stub OpenAI API at {server.api_base}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
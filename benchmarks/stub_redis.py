@@ -0,0 +1,292 @@
+"""Local stand-in for a Redis server, for running several app nodes on one machine.
+
+Speaks RESP and implements the commands storage.RedisStorage uses (GET,
+SET with EX/PX/NX/XX, DEL, EXISTS, INCRBY, APPEND, STRLEN, GETRANGE,
+RENAME/RENAMENX, PEXPIRE/EXPIRE, PERSIST, PTTL, DBSIZE, SELECT, AUTH, PING,
+FLUSHDB, and EVAL of the lock release script only), with key expiry, in
+memory and nothing else: no Lua, no persistence, no eviction, one lock
+around everything. Optional latency per command stands
+in for a network hop. Point the app at it with STORAGE_URL=redis://127.0.0.1:<port>/0.
+
+    python benchmarks/stub_redis.py [--port 6399] [--latency 0]
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+DATABASES = 16
+# The one script EVAL runs: storage.RELEASE_LOCK_SCRIPT
+RELEASE_LOCK_SCRIPT = b"if redis.call('get',KEYS[1])==ARGV[1] then return redis.call('del',KEYS[1]) else return 0 end"
+
+
+class Reply:
+    """Pre-encoded status or error reply."""
+
+    def __init__(self, data):
+        self.data = data
+
+
+OK = Reply(b'+OK\r\n')
+
+
+def error(message):
+    return Reply(b'-ERR ' + message.encode('utf-8') + b'\r\n')
+
+
+def encode(value):
+    if isinstance(value, Reply):
+        return value.data
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, list):
+        return b'*%d\r\n' % len(value) + b''.join(encode(item) for item in value)
+    return b'$%d\r\n' % len(value) + bytes(value) + b'\r\n'
+
+
+class Keyspace:
+    """One database: key -> bytearray, key -> expiry time."""
+
+    def __init__(self):
+        self.values = {}
+        self.expires = {}
+
+    def live(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.time():
+            self.values.pop(key, None)
+            del self.expires[key]
+        return key in self.values
+
+    def delete(self, key):
+        self.expires.pop(key, None)
+        return self.values.pop(key, None) is not None
+
+
+class StubRedisHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.db = 0
+
+    def handle(self):
+        while True:
+            try:
+                args = self._read_command()
+            except (ConnectionError, ValueError):
+                return
+            if args is None:
+                return
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            reply = self.server.execute(self, args)
+            try:
+                self.wfile.write(encode(reply))
+            except OSError:
+                return
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            # Inline command, as typed into telnet
+            return [part.encode('utf-8') for part in line.decode('utf-8').split()]
+        args = []
+        for _ in range(int(line[1:])):
+            header = self.rfile.readline()
+            if not header.startswith(b'$'):
+                raise ValueError('expected a bulk string')
+            size = int(header[1:])
+            data = self.rfile.read(size + 2)
+            if len(data) != size + 2:
+                raise ConnectionError('client went away')
+            args.append(data[:-2])
+        return args
+
+
+class StubRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0, latency=0.0):
+        super().__init__(('127.0.0.1', port), StubRedisHandler)
+        self.latency = latency
+        self.databases = [Keyspace() for _ in range(DATABASES)]
+        self.commands = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return 'redis://127.0.0.1:%d/0' % self.server_address[1]
+
+    def start(self):
+        """Serve on a daemon thread and return self."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def execute(self, handler, args):
+        if not args:
+            return error('empty command')
+        name = args[0].decode('ascii', 'replace').upper()
+        command = getattr(self, 'cmd_' + name.lower(), None)
+        if command is None:
+            return error(f"unknown command '{name}'")
+        with self._lock:
+            self.commands += 1
+            try:
+                return command(handler, self.databases[handler.db], *args[1:])
+            except TypeError:
+                return error(f"wrong number of arguments for '{name.lower()}' command")
+            except ValueError:
+                return error('value is not an integer or out of range')
+
+    # -- connection -------------------------------------------------------
+
+    def cmd_ping(self, handler, keys, message=None):
+        return Reply(b'+PONG\r\n') if message is None else message
+
+    def cmd_auth(self, handler, keys, *credentials):
+        return OK
+
+    def cmd_select(self, handler, keys, index):
+        index = int(index)
+        if not 0 <= index < DATABASES:
+            return error('DB index is out of range')
+        handler.db = index
+        return OK
+
+    # -- keys -------------------------------------------------------------
+
+    def cmd_get(self, handler, keys, key):
+        return bytes(keys.values[key]) if keys.live(key) else None
+
+    def cmd_set(self, handler, keys, key, value, *options):
+        options = [option.upper() for option in options]
+        expires = None
+        i = 0
+        while i < len(options):
+            if options[i] in (b'EX', b'PX') and i + 1 < len(options):
+                amount = int(options[i + 1])
+                expires = time.time() + (amount if options[i] == b'EX' else amount / 1000)
+                i += 2
+            elif options[i] in (b'NX', b'XX'):
+                i += 1
+            else:
+                return Reply(b'-ERR syntax error\r\n')
+        exists = keys.live(key)
+        if (b'NX' in options and exists) or (b'XX' in options and not exists):
+            return None
+        keys.values[key] = bytearray(value)
+        keys.expires.pop(key, None)
+        if expires is not None:
+            keys.expires[key] = expires
+        return OK
+
+    def cmd_del(self, handler, keys, *names):
+        return sum(1 for key in names if keys.live(key) and keys.delete(key))
+
+    def cmd_exists(self, handler, keys, *names):
+        return sum(1 for key in names if keys.live(key))
+
+    def cmd_incrby(self, handler, keys, key, amount):
+        value = int(keys.values[key]) if keys.live(key) else 0
+        value += int(amount)
+        keys.values[key] = bytearray(str(value).encode('ascii'))
+        return value
+
+    def cmd_incr(self, handler, keys, key):
+        return self.cmd_incrby(handler, keys, key, b'1')
+
+    def cmd_append(self, handler, keys, key, value):
+        if not keys.live(key):
+            keys.values[key] = bytearray()
+        keys.values[key] += value
+        return len(keys.values[key])
+
+    def cmd_strlen(self, handler, keys, key):
+        return len(keys.values[key]) if keys.live(key) else 0
+
+    def cmd_getrange(self, handler, keys, key, start, end):
+        if not keys.live(key):
+            return b''
+        value = keys.values[key]
+        start, end = int(start), int(end)
+        if start < 0:
+            start = max(0, len(value) + start)
+        if end < 0:
+            end = len(value) + end
+        return bytes(value[start:end + 1])
+
+    def cmd_rename(self, handler, keys, key, new_key):
+        if not keys.live(key):
+            return error('no such key')
+        keys.live(new_key)
+        keys.delete(new_key)
+        keys.values[new_key] = keys.values.pop(key)
+        if key in keys.expires:
+            keys.expires[new_key] = keys.expires.pop(key)
+        return OK
+
+    def cmd_renamenx(self, handler, keys, key, new_key):
+        if not keys.live(key):
+            return error('no such key')
+        if keys.live(new_key):
+            return 0
+        self.cmd_rename(handler, keys, key, new_key)
+        return 1
+
+    def cmd_pexpire(self, handler, keys, key, milliseconds):
+        if not keys.live(key):
+            return 0
+        keys.expires[key] = time.time() + int(milliseconds) / 1000
+        return 1
+
+    def cmd_expire(self, handler, keys, key, seconds):
+        return self.cmd_pexpire(handler, keys, key, int(seconds) * 1000)
+
+    def cmd_persist(self, handler, keys, key):
+        return 1 if keys.live(key) and keys.expires.pop(key, None) is not None else 0
+
+    def cmd_pttl(self, handler, keys, key):
+        if not keys.live(key):
+            return -2
+        expires = keys.expires.get(key)
+        return -1 if expires is None else int((expires - time.time()) * 1000)
+
+    def cmd_eval(self, handler, keys, script, numkeys, *args):
+        if script != RELEASE_LOCK_SCRIPT:
+            return error('only the lock release script is supported')
+        if int(numkeys) != 1 or len(args) != 2:
+            return error('the lock release script takes one key and one argument')
+        key, token = args
+        if keys.live(key) and keys.values[key] == token:
+            keys.delete(key)
+            return 1
+        return 0
+
+    def cmd_dbsize(self, handler, keys):
+        return sum(1 for key in list(keys.values) if keys.live(key))
+
+    def cmd_flushdb(self, handler, keys):
+        keys.values.clear()
+        keys.expires.clear()
+        return OK
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=6399)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every command')
+    args = parser.parse_args()
+    server = StubRedisServer(args.port, args.latency)
+    print(f'stub Redis at {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+"""Benchmark suite: layout and parser micro-benchmarks plus end-to-end load tests.
+
+Micro-benchmarks time each layout of the template renderer the app runs,
+the generation parsers and slide text extraction. The old setter-based
+layouts it replaced are not timed here, so every gated result covers
+shipped code; benchmarks/bench_render.py compares the two. The load tests run the Flask app on a local werkzeug server,
+with its OpenAI client pointed at benchmarks/stub_openai.py, and drive the
+endpoints with concurrent clients on synthetic decks of 1 to 1000 slides.
+
+Every result is a set of timings in seconds (lower is better), written as
+JSON so runs can be compared between commits with benchmarks/compare.py.
+Run from the repository root:
+
+    python benchmarks/suite.py [--quick] [--only micro|e2e] [--sizes 1,10,100,1000]
+        [--latency 0.2] [--concurrency 8] [--requests 20] [--output results.json]
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+from stub_openai import StubServer
+
+
+def summarize(timings, **extra):
+    timings = sorted(timings)
+    result = {
+        'n': len(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'min': timings[0],
+        'p95': timings[min(len(timings) - 1, int(0.95 * len(timings)))],
+    }
+    result.update(extra)
+    return result
+
+
+def time_calls(fn, args_list, repeat):
+    """Seconds per call of fn(*args) over args_list, one sample per round."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for args in args_list:
+            fn(*args)
+        samples.append((time.perf_counter() - start) / len(args_list))
+    return samples
+
+
+# -- micro-benchmarks ------------------------------------------------------
+
+def micro_benchmarks(sizes, repeat):
+    from bench_render import COLORS, new_presentation, synthetic_slides
+    from generation import (
+        SlideStreamParser, outline_messages, parse_outline, parse_points, parse_slides, presentation_messages,
+        slide_messages,
+    )
+    from layouts import SlideRenderer
+    from llm import stub_reply
+    from slide_text import SlideParts, extract_slide_texts
+
+    results = {}
+    calls = 50
+    content = synthetic_slides(5)[4]['content']
+    renderer = SlideRenderer(new_presentation(), *COLORS)
+    for layout_type in ('boxes', 'versus', 'brain'):
+        samples = time_calls(renderer.add_slide, [(layout_type, 'Title', content)] * calls, repeat)
+        results[f'micro.render.{layout_type}'] = summarize(samples)
+
+    topic = 'quarterly results'
+    for count in (10, 100):
+        text = stub_reply(presentation_messages(topic, count), 1000)
+        results[f'micro.parse_slides.{count}'] = summarize(time_calls(parse_slides, [(text,)] * 20, repeat))
+
+        def stream(text=text):
+            parser = SlideStreamParser()
+            for start in range(0, len(text), 4):
+                parser.feed(text[start:start + 4])
+            parser.close()
+        results[f'micro.stream_parser.{count}'] = summarize(time_calls(stream, [()] * 20, repeat))
+        outline = stub_reply(outline_messages(topic, count), 1000)
+        results[f'micro.parse_outline.{count}'] = summarize(time_calls(parse_outline, [(outline, count)] * 20, repeat))
+    points = stub_reply(slide_messages(topic, 'Intro', 1, 5), 200)
+    results['micro.parse_points'] = summarize(time_calls(parse_points, [(points,)] * 200, repeat))
+
+    for size in sizes:
+        package_bytes = deck_bytes(size)
+        samples = time_calls(lambda: extract_slide_texts(SlideParts(package_bytes)), [()], repeat)
+        results[f'micro.slide_text.{size}'] = summarize(samples, slides=size)
+    return results
+
+
+def deck_bytes(size):
+    import server
+    from bench_render import synthetic_slides
+    output = BytesIO()
+    server.build_presentation({'slides': synthetic_slides(size), 'filename': 'bench.pptx'}, use_upload=False).save(output)
+    return output.getvalue()
+
+
+# -- end-to-end load tests -------------------------------------------------
+
+class Client:
+    """One keep-alive HTTP connection per worker thread."""
+
+    def __init__(self, port):
+        self.port = port
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=300)
+        try:
+            conn.request(method, path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            self._local.conn = None
+            raise
+
+    def post_json(self, path, payload):
+        return self.request('POST', path, json.dumps(payload), {'Content-Type': 'application/json'})
+
+
+def load_test(make_request, requests, concurrency):
+    """Run make_request() requests times on concurrency threads; latency stats plus throughput."""
+    def one(_):
+        start = time.perf_counter()
+        try:
+            status = make_request()
+        except Exception:
+            status = None
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        outcomes = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for _, status in outcomes if status != 200)
+    return summarize([t for t, _ in outcomes], errors=errors, rps=requests / elapsed, concurrency=concurrency)
+
+
+def upload(client, package_bytes):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="bench.pptx"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n').encode() + package_bytes + f'\r\n--{boundary}--\r\n'.encode()
+    status, data = client.request('POST', '/api/upload', body, {'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    if status != 200:
+        raise RuntimeError(f'upload failed with {status}: {data[:200]!r}')
+    return json.loads(data)['uploadId']
+
+
+def e2e_benchmarks(sizes, stub, requests, concurrency):
+    import openai
+    from werkzeug.serving import make_server
+    import server
+    from bench_render import synthetic_slides
+
+    openai.api_base = stub.api_base
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    http_server = make_server('127.0.0.1', 0, server.app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    client = Client(http_server.server_port)
+    results = {}
+    try:
+        topics = iter(range(10 ** 9))
+
+        def generate(payload):
+            # A new topic every time, so no cache serves the completion
+            status, _ = client.post_json('/api/generate-presentation', {**payload, 'content': f'topic {next(topics)}'})
+            return status
+
+        results['e2e.generate.single'] = load_test(lambda: generate({'slideCount': 'brief', 'mode': 'single'}),
+                                                   requests, concurrency)
+        results['e2e.generate.parallel_10'] = load_test(lambda: generate({'slideCount': '10', 'mode': 'parallel'}),
+                                                        requests, concurrency)
+        for size in sizes:
+            # Big decks take seconds each; fewer requests keep the run bounded
+            count = requests if size <= 100 else max(3, requests // 5)
+            payload = {'slides': synthetic_slides(size), 'filename': 'bench.pptx'}
+            results[f'e2e.save.{size}'] = load_test(
+                lambda: client.post_json('/api/save-presentation', payload)[0], count, concurrency)
+            upload_id = upload(client, deck_bytes(size))
+            results[f'e2e.get_slides.{size}'] = load_test(
+                lambda: client.post_json('/api/get-slides', {'uploadId': upload_id})[0], count, concurrency)
+            client.request('DELETE', f'/api/uploads/{upload_id}')
+    finally:
+        http_server.shutdown()
+    results['e2e.stub_requests'] = {'n': stub.requests}
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help='small sizes and few requests, for a smoke run')
+    parser.add_argument('--only', choices=('micro', 'e2e'))
+    parser.add_argument('--sizes', default='1,10,100,1000')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.2, help='stub OpenAI latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.05)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=20, help='requests per load test')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args()
+    if args.quick:
+        args.sizes, args.repeat, args.requests, args.latency, args.jitter = '1,10', 2, 4, 0.02, 0.0
+    sizes = [int(x) for x in args.sizes.split(',')]
+
+    # Before server is imported: real OpenAI client code against the stub, and no cache
+    # answering repeated requests, so every run measures the same work
+    stub = StubServer(latency=args.latency, jitter=args.jitter).start()
+    scratch = tempfile.mkdtemp(prefix='sliding-bench-')
+    os.environ.update({
+        'LLM_BACKEND': 'openai',
+        'OPENAI_API_KEY': os.environ.get('OPENAI_API_KEY') or 'stub-key',
+        'OPENAI_API_BASE': stub.api_base,
+        'COMPLETION_CACHE_BYTES': '0',
+        'DECK_CACHE_BYTES': '0',
+        'UPLOAD_STORE_FOLDER': os.path.join(scratch, 'uploads'),
+        'CACHE_FOLDER': os.path.join(scratch, 'cache'),
+    })
+    os.chdir(ROOT)
+
+    results = {}
+    started = time.time()
+    if args.only in (None, 'micro'):
+        results.update(micro_benchmarks(sizes, args.repeat))
+    if args.only in (None, 'e2e'):
+        results.update(e2e_benchmarks(sizes, stub, args.requests, args.concurrency))
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': started,
+            'duration': time.time() - started,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': vars(args),
+        },
+        'results': results,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
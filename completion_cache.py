@@ -0,0 +1,244 @@
+"""Persistent cache of completions for the generation endpoints.
+
+Entries live in SQLite so they survive restarts and are shared by every
+worker on the host. Keys are built from the prompt, with only case and
+whitespace normalized, model, max_tokens and slide count; entries expire
+after a TTL and the oldest-used ones are evicted once the stored text
+exceeds a byte budget. Optionally a miss can fall back to a near-duplicate
+topic (token-set Jaccard similarity, which ignores punctuation).
+
+SharedCompletionCache offers the same lookups on a remote storage backend
+(storage.py), so the hosts sharing it reuse each other's completions.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from storage import StorageError
+
+_WORD_RE = re.compile(r'[^\w]+', re.UNICODE)
+
+# How many recent same-shape entries a fuzzy lookup compares against
+FUZZY_CANDIDATES = 500
+
+
+def normalize_prompt(text):
+    """Lower-case and collapse whitespace; punctuation stays, so "C++" and "C#" differ."""
+    return ' '.join(text.lower().split())
+
+
+def _tokens(text):
+    # Only for the fuzzy lookup, where "C++ basics" and "C basics" are meant to be near
+    return set(_WORD_RE.sub(' ', text.lower()).split())
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class CompletionCache:
+    def __init__(self, path, ttl=7 * 24 * 3600, max_bytes=64 * 1024 * 1024, fuzzy_threshold=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.fuzzy_threshold = fuzzy_threshold
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        db = self._connect()
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS completions ('
+            ' key TEXT PRIMARY KEY, shape TEXT NOT NULL, topic TEXT NOT NULL,'
+            ' value TEXT NOT NULL, size INTEGER NOT NULL,'
+            ' created REAL NOT NULL, accessed REAL NOT NULL)')
+        db.execute('CREATE INDEX IF NOT EXISTS completions_shape ON completions (shape, accessed)')
+        db.execute('CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed)')
+
+    def _connect(self):
+        # One connection per thread, and never one inherited across a fork
+        if getattr(self._local, 'pid', None) != os.getpid():
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return self._local.db
+
+    @staticmethod
+    def _shape(kind, system_prompt, model, max_tokens, slide_count):
+        # Everything except the topic: entries with the same shape are interchangeable up to topic
+        raw = json.dumps([kind, normalize_prompt(system_prompt), model, max_tokens, str(slide_count)])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _key(self, shape, prompt):
+        return hashlib.sha256((shape + '\0' + normalize_prompt(prompt)).encode('utf-8')).hexdigest()
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, kind, messages, model, max_tokens, slide_count='', topic=''):
+        """Return the cached completion text for this request, or None."""
+        shape = self._shape(kind, messages[0]['content'], model, max_tokens, slide_count)
+        key = self._key(shape, messages[-1]['content'])
+        now = time.time()
+        db = self._connect()
+        row = db.execute('SELECT value, created FROM completions WHERE key = ?', (key,)).fetchone()
+        if row is not None and now - row[1] <= self.ttl:
+            db.execute('UPDATE completions SET accessed = ? WHERE key = ?', (now, key))
+            self._count('hits')
+            return row[0]
+
+        if self.fuzzy_threshold and topic:
+            wanted = _tokens(topic)
+            candidates = db.execute(
+                'SELECT key, topic, value FROM completions WHERE shape = ? AND created >= ?'
+                ' ORDER BY accessed DESC LIMIT ?', (shape, now - self.ttl, FUZZY_CANDIDATES)).fetchall()
+            best = max(candidates, key=lambda c: _jaccard(wanted, _tokens(c[1])), default=None)
+            if best is not None and _jaccard(wanted, _tokens(best[1])) >= self.fuzzy_threshold:
+                db.execute('UPDATE completions SET accessed = ? WHERE key = ?', (now, best[0]))
+                self._count('fuzzy_hits')
+                return best[2]
+
+        self._count('misses')
+        return None
+
+    def put(self, kind, messages, model, max_tokens, value, slide_count='', topic=''):
+        shape = self._shape(kind, messages[0]['content'], model, max_tokens, slide_count)
+        key = self._key(shape, messages[-1]['content'])
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        db = self._connect()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute(
+                'INSERT OR REPLACE INTO completions (key, shape, topic, value, size, created, accessed)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?)', (key, shape, normalize_prompt(topic), value, size, now, now))
+            db.execute('DELETE FROM completions WHERE created < ?', (now - self.ttl,))
+            self._evict(db)
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+
+    def _evict(self, db):
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM completions').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk from least recently used until we are back under budget
+        doomed = []
+        for key, size in db.execute('SELECT key, size FROM completions ORDER BY accessed'):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        db.executemany('DELETE FROM completions WHERE key = ?', doomed)
+
+    def stats(self):
+        entries, stored = self._connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions').fetchone()
+        with self._lock:
+            hits = self.hits + self.fuzzy_hits
+            lookups = hits + self.misses
+            return {
+                'entries': entries,
+                'bytes': stored,
+                'hits': self.hits,
+                'fuzzy_hits': self.fuzzy_hits,
+                'misses': self.misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+            }
+
+
+class SharedCompletionCache(CompletionCache):
+    """CompletionCache kept in a storage backend instead of a local SQLite file.
+
+    Entries expire with the backend's TTL; evicting by size is left to the
+    backend (Redis maxmemory). For fuzzy lookups every shape keeps an index
+    of its most recent topics; it is updated without a lock, so a topic
+    written by two hosts at once may drop out of it, which only costs a
+    fuzzy hit.
+    """
+
+    def __init__(self, storage, ttl=7 * 24 * 3600, fuzzy_threshold=None):
+        self.storage = storage
+        self.ttl = ttl
+        self.fuzzy_threshold = fuzzy_threshold
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+
+    def _entry(self, key):
+        value = self.storage.get('completion:' + key)
+        return value.decode('utf-8') if value is not None else None
+
+    def get(self, kind, messages, model, max_tokens, slide_count='', topic=''):
+        """Return the cached completion text for this request, or None; a backend failure is a miss."""
+        try:
+            value = self._lookup(kind, messages, model, max_tokens, slide_count, topic)
+        except StorageError as e:
+            print(f"Error reading completion cache: {str(e)}")
+            value = None
+        if value is None:
+            self._count('misses')
+        return value
+
+    def _lookup(self, kind, messages, model, max_tokens, slide_count, topic):
+        shape = self._shape(kind, messages[0]['content'], model, max_tokens, slide_count)
+        value = self._entry(self._key(shape, messages[-1]['content']))
+        if value is not None:
+            self._count('hits')
+            return value
+
+        if self.fuzzy_threshold and topic:
+            wanted = _tokens(topic)
+            index = self.storage.get('completion-shape:' + shape)
+            candidates = json.loads(index) if index is not None else []
+            best = max(candidates, key=lambda c: _jaccard(wanted, _tokens(c[0])), default=None)
+            if best is not None and _jaccard(wanted, _tokens(best[0])) >= self.fuzzy_threshold:
+                value = self._entry(best[1])
+                if value is not None:
+                    self._count('fuzzy_hits')
+                    return value
+        return None
+
+    def put(self, kind, messages, model, max_tokens, value, slide_count='', topic=''):
+        try:
+            self._store(kind, messages, model, max_tokens, value, slide_count, topic)
+        except StorageError as e:
+            print(f"Error writing completion cache: {str(e)}")
+
+    def _store(self, kind, messages, model, max_tokens, value, slide_count, topic):
+        shape = self._shape(kind, messages[0]['content'], model, max_tokens, slide_count)
+        key = self._key(shape, messages[-1]['content'])
+        self.storage.set('completion:' + key, value.encode('utf-8'), ttl=self.ttl)
+        if self.fuzzy_threshold and topic:
+            index_key = 'completion-shape:' + shape
+            index = self.storage.get(index_key)
+            candidates = [c for c in (json.loads(index) if index is not None else []) if c[1] != key]
+            candidates.insert(0, [normalize_prompt(topic), key])
+            self.storage.set(index_key, json.dumps(candidates[:FUZZY_CANDIDATES]).encode('utf-8'), ttl=self.ttl)
+
+    def stats(self):
+        with self._lock:
+            hits = self.hits + self.fuzzy_hits
+            lookups = hits + self.misses
+            return {
+                'entries': None,
+                'bytes': None,
+                'hits': self.hits,
+                'fuzzy_hits': self.fuzzy_hits,
+                'misses': self.misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+            }
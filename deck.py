@@ -0,0 +1,139 @@
+"""Building decks with python-pptx: new presentations and slide rendering.
+
+Kept out of server.py so the app can start and answer requests that never
+touch a deck without importing python-pptx; routes import this module when
+they first need it.
+"""
+import os
+import queue
+import re
+import threading
+from pptx import Presentation
+from pptx.util import Inches
+from assets import asset_from_data_url
+from layouts import SlideRenderer
+import metrics
+
+BLANK_LAYOUT_INDEX = 6
+
+class PresentationPool:
+    """Empty 16:9 decks on the default template, parsed ahead of time.
+
+    Presentation() unzips and parses the default template on every call.
+    get() hands out one prepared earlier, or builds it on the spot when the
+    pool has run dry, and wakes a background thread to top the pool up. The
+    thread is started on first use in each process, so a pool filled before
+    fork() is inherited warm by every worker.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._ready = queue.Queue()
+        self._lock = threading.Lock()
+        self._wanted = None
+        self._pid = None
+
+    @staticmethod
+    def build():
+        prs = Presentation()
+        prs.slide_width = Inches(16)
+        prs.slide_height = Inches(9)
+        # Resolve the blank layout and the slide list now instead of on the first add_slide
+        prs.slide_layouts[BLANK_LAYOUT_INDEX]
+        prs.slides
+        return prs
+
+    def fill(self):
+        """Build presentations until the pool is full."""
+        while self._ready.qsize() < self.size:
+            self._ready.put(self.build())
+
+    def _refill(self, wanted):
+        while True:
+            wanted.wait()
+            wanted.clear()
+            try:
+                self.fill()
+            except Exception as e:
+                print(f"Error preparing presentations: {e}")
+
+    def _wake(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._wanted = threading.Event()
+                threading.Thread(target=self._refill, args=(self._wanted,), name='presentation-pool',
+                                 daemon=True).start()
+            self._wanted.set()
+
+    def get(self):
+        """An empty 16:9 presentation nobody else holds."""
+        if not self.size:
+            return self.build()
+        try:
+            prs = self._ready.get_nowait()
+            self.hits += 1
+        except queue.Empty:
+            prs = self.build()
+            self.misses += 1
+        self._wake()
+        return prs
+
+    def stats(self):
+        return {'size': self.size, 'ready': self._ready.qsize(), 'hits': self.hits, 'misses': self.misses}
+
+# PRESENTATION_POOL_SIZE=0 builds every presentation on demand
+presentation_pool = PresentationPool(int(os.getenv('PRESENTATION_POOL_SIZE', '4')))
+
+def new_presentation():
+    """An empty 16:9 presentation on the default template, from the pool."""
+    return presentation_pool.get()
+
+def rgb_string_to_tuple(rgb_str, fallback):
+    try:
+        parts = [int(x.strip()) for x in re.split('[, ]+', rgb_str) if x.strip()]
+        if len(parts) == 3:
+            return tuple(parts)
+    except Exception:
+        pass
+    return fallback
+
+def load_logo(logo_data_url):
+    """Decode the logo data URL once per request; the asset cache keeps it across requests."""
+    if not logo_data_url:
+        return None
+    try:
+        return asset_from_data_url(logo_data_url)
+    except Exception as e:
+        print(f"Error decoding logo: {e}")
+        return None
+
+def parse_slide_content(content):
+    """Turn 'Title: Content' lines into the list of points the layouts expect."""
+    if isinstance(content, str):
+        content = [line.strip() for line in content.split('\n') if line.strip()]
+        # Only the first colon separates title from content: 'Q3: revenue up 10:1' keeps its ratio
+        content = [line.split(':', 1) for line in content]
+        content = [{'title': parts[0].strip(), 'content': parts[1].strip() if len(parts) > 1 else ''} for parts in content]
+        content = content[:5]
+    return content
+
+def deck_renderer(prs, styleColors, logoSettings):
+    """A SlideRenderer for prs with the payload's colours (or the defaults) and logo."""
+    logo = load_logo(logoSettings.get('logoDataUrl'))
+    logo_position = logoSettings.get('logoPosition')
+    # Parse colors or use defaults
+    content_text_rgb = rgb_string_to_tuple(styleColors.get('contentTextColorRGB', ''), (34,34,34))
+    highlight_rgb = rgb_string_to_tuple(styleColors.get('highlightColorRGB', ''), (220,53,69))
+    forms_bg_rgb = rgb_string_to_tuple(styleColors.get('formsBgColorRGB', ''), (244,246,251))
+    return SlideRenderer(prs, content_text_rgb, highlight_rgb, forms_bg_rgb, logo, logo_position)
+
+def render_slide(renderer, slide_data):
+    """Append one slide of a save-presentation payload to the renderer's deck."""
+    layout_type = slide_data.get('layoutType', 'boxes')
+    title_text = slide_data.get('title', '').title()
+    content = parse_slide_content(slide_data.get('content', []))
+    metrics.SLIDES_RENDERED.inc()
+    return renderer.add_slide(layout_type, title_text, content)
@@ -0,0 +1,189 @@
+"""Append slides to an uploaded deck without loading the deck.
+
+Saving on top of an upload through python-pptx reads every part of the
+package, embedded media included, into memory and compresses all of it
+again. Appending does not need that: the new slides are rendered into a
+scratch Presentation whose blank layout is the upload's own, and the output
+is the upload's ZIP members copied through still compressed, with only
+presentation.xml, its rels and [Content_Types].xml rewritten, plus the new
+slide and media parts. Memory use depends on the new slides, not on the
+size of the upload.
+"""
+import posixpath
+import re
+import zipfile
+from lxml import etree
+from pptx import Presentation
+from pptx.opc.constants import CONTENT_TYPE as CT, RELATIONSHIP_TYPE as RT
+from pptx.opc.oxml import serialize_part_xml
+from pptx.opc.packuri import PackURI
+from pptx.oxml import parse_xml
+from layouts import SLIDE_HEIGHT, SLIDE_WIDTH
+from slide_text import SlideParts, part_rels
+from zipwriter import ZipTooLarge, ZipWriter, check_fits, deflate
+
+_P = '{http://schemas.openxmlformats.org/presentationml/2006/main}'
+_R = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_PKG_RELS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_CT_NS = 'http://schemas.openxmlformats.org/package/2006/content-types'
+CONTENT_TYPES_MEMBER = '[Content_Types].xml'
+# Index of the layout SlideRenderer adds its slides with
+BLANK_LAYOUT_INDEX = 6
+
+
+class AppendNotSupported(Exception):
+    """The package is not laid out in a way append_slides() can handle; build it in memory instead."""
+
+
+def _next_number(names, pattern):
+    numbers = [int(m.group(1)) for m in map(pattern.match, names) if m]
+    return max(numbers, default=0) + 1
+
+
+def _blank_layout(zf, presentation, presentation_rels):
+    """Member name of the layout python-pptx's prs.slide_layouts[BLANK_LAYOUT_INDEX] would be."""
+    root = etree.fromstring(zf.read(presentation))
+    master_id = root.find(f'{_P}sldMasterIdLst/{_P}sldMasterId')
+    if master_id is None or master_id.get(_R + 'id') not in presentation_rels:
+        raise AppendNotSupported('deck has no slide master')
+    master = presentation_rels[master_id.get(_R + 'id')][1]
+    layout_ids = etree.fromstring(zf.read(master)).findall(f'{_P}sldLayoutIdLst/{_P}sldLayoutId')
+    if len(layout_ids) <= BLANK_LAYOUT_INDEX:
+        raise AppendNotSupported(f'slide master has only {len(layout_ids)} layouts')
+    master_rels = part_rels(zf, master)
+    rel = master_rels.get(layout_ids[BLANK_LAYOUT_INDEX].get(_R + 'id'))
+    if rel is None or rel[1] not in zf.NameToInfo:
+        raise AppendNotSupported('blank layout is missing')
+    return rel[1]
+
+
+def _scratch_presentation(layout_xml, layout_member):
+    """A new Presentation whose blank layout is a copy of the deck's, under the deck's partname."""
+    prs = Presentation()
+    prs.slide_width = SLIDE_WIDTH
+    prs.slide_height = SLIDE_HEIGHT
+    master = prs.slide_master
+    layout_part = master.part.related_part(master._element.get_or_add_sldLayoutIdLst()[BLANK_LAYOUT_INDEX].rId)
+    # Nothing has looked at the layout yet, so swapping its XML is enough for add_slide()
+    # to clone the deck's placeholders; the partname makes the slides' layout rels point
+    # at the deck's layout part
+    layout_part._element = parse_xml(layout_xml)
+    layout_part.partname = PackURI('/' + layout_member)
+    return prs
+
+
+def _rels_root(zf, member):
+    rels_member = posixpath.join(posixpath.dirname(member), '_rels', posixpath.basename(member) + '.rels')
+    try:
+        return rels_member, etree.fromstring(zf.read(rels_member))
+    except KeyError:
+        return rels_member, etree.Element(f'{{{_PKG_RELS}}}Relationships', nsmap={None: _PKG_RELS})
+
+
+def _next_rId(used):
+    n = 1
+    while f'rId{n}' in used:
+        n += 1
+    used.add(f'rId{n}')
+    return f'rId{n}'
+
+
+def _xml(root):
+    return etree.tostring(root, encoding='UTF-8', xml_declaration=True, standalone=True)
+
+
+def append_slides(source_path, out, render):
+    """Write the deck at source_path with new slides appended to the binary file out.
+
+    render(prs, num_existing_slides) adds the new slides to the scratch
+    Presentation prs. Returns the number of slides appended. Raises
+    AppendNotSupported, before anything is written, for packages it cannot
+    append to.
+    """
+    with zipfile.ZipFile(source_path) as zf:
+        try:
+            parts = SlideParts(zf)
+        except (StopIteration, KeyError, etree.XMLSyntaxError) as e:
+            raise AppendNotSupported(f'cannot read slide list: {e!r}')
+        presentation = parts.presentation
+        presentation_rels = part_rels(zf, presentation)
+        layout = _blank_layout(zf, presentation, presentation_rels)
+
+        prs = _scratch_presentation(zf.read(layout), layout)
+        render(prs, len(parts))
+
+        names = zf.namelist()
+        next_slide = _next_number(names, re.compile(r'ppt/slides/slide(\d+)\.xml$'))
+        next_image = _next_number(names, re.compile(r'ppt/media/image(\d+)\.'))
+        new_members = []
+        media = {}
+        for slide in prs.slides:
+            part = slide.part
+            part.partname = PackURI(f'/ppt/slides/slide{next_slide}.xml')
+            next_slide += 1
+            for rel in part.rels:
+                if rel.is_external or rel.reltype == RT.SLIDE_LAYOUT:
+                    continue
+                if rel.reltype != RT.IMAGE:
+                    raise AppendNotSupported(f'new slide relates to a {rel.reltype} part')
+                image = rel.target_part
+                if image not in media:
+                    image.partname = PackURI(f'/ppt/media/image{next_image}.{image.partname.ext}')
+                    next_image += 1
+                    media[image] = image.partname.membername
+                    new_members.append((image.partname.membername, image.blob))
+            new_members.append((part.partname.membername, part.blob))
+            new_members.append((part.partname.rels_uri.membername, part.rels.xml))
+
+        # presentation.xml: the new slides go at the end of the slide list, the size becomes 16:9
+        root = parse_xml(zf.read(presentation))
+        rels_member, rels_root = _rels_root(zf, presentation)
+        used = {rel.get('Id') for rel in rels_root}
+        sld_ids = root.get_or_add_sldIdLst()
+        for slide in prs.slides:
+            rId = _next_rId(used)
+            etree.SubElement(rels_root, f'{{{_PKG_RELS}}}Relationship', Id=rId, Type=RT.SLIDE,
+                             Target=slide.part.partname.relative_ref(PackURI('/' + presentation).baseURI))
+            sld_ids.add_sldId(rId)
+        sld_sz = root.get_or_add_sldSz()
+        sld_sz.cx = prs.slide_width
+        sld_sz.cy = prs.slide_height
+
+        content_types = etree.fromstring(zf.read(CONTENT_TYPES_MEMBER))
+        defaults = {default.get('Extension').lower() for default in content_types.iter(f'{{{_CT_NS}}}Default')}
+        for image in media:
+            if image.partname.ext.lower() not in defaults:
+                etree.SubElement(content_types, f'{{{_CT_NS}}}Default', Extension=image.partname.ext,
+                                 ContentType=image.content_type)
+                defaults.add(image.partname.ext.lower())
+        for slide in prs.slides:
+            etree.SubElement(content_types, f'{{{_CT_NS}}}Override', PartName=slide.part.partname,
+                             ContentType=CT.PML_SLIDE)
+
+        replaced = {
+            presentation: deflate(serialize_part_xml(root)),
+            rels_member: deflate(_xml(rels_root)),
+            CONTENT_TYPES_MEMBER: deflate(_xml(content_types)),
+        }
+        # presentation.xml had no rels member before
+        added = [(name, replaced[name]) for name in replaced if name not in names]
+        added += [(name, deflate(blob)) for name, blob in new_members]
+        # Every size is known now, so an archive that would need ZIP64 is refused before it is started
+        try:
+            check_fits([(info.filename, len(replaced[info.filename][0]), replaced[info.filename][2])
+                        if info.filename in replaced else (info.filename, info.compress_size, info.file_size)
+                        for info in zf.infolist()] + [(name, len(data), size) for name, (data, _, size) in added])
+        except ZipTooLarge as e:
+            raise AppendNotSupported(str(e))
+
+        writer = ZipWriter(out)
+        with open(source_path, 'rb') as source:
+            for info in zf.infolist():
+                if info.filename in replaced:
+                    writer.add(info.filename, *replaced[info.filename])
+                else:
+                    writer.copy(source, info)
+        for name, deflated in added:
+            writer.add(name, *deflated)
+        writer.close()
+        return len(prs.slides)
@@ -0,0 +1,467 @@
+"""Prompts and parsers that turn a topic into slide content.
+
+Two ways of generating a deck share these helpers: the original single
+completion for the whole deck, parsed line by line by parse_slides, and a
+two-phase mode that asks for an outline first and then for each slide's
+bullet points separately, so those calls can run concurrently.
+
+Both modes ask for structured output by default: the model calls a function
+whose arguments are JSON slides (SLIDES_FUNCTION, SLIDE_FUNCTION), parsed
+incrementally by JsonSlideStreamParser and checked against SLIDE_SCHEMA.
+A slide that fails the check can be repaired (repair_slide) or asked for
+again on its own, so one bad slide does not cost the whole deck. The
+'Title: Content' line format and its parsers remain for GENERATION_FORMAT=text
+and for replies that ignore the function.
+"""
+import json
+import re
+
+PRESENTATION_SYSTEM_PROMPT = "You are a presentation content generator. Create structured content for slides based on the given topic. Each slide should have a title and 3-5 bullet points. Format each point as 'Title: Content'."
+OUTLINE_SYSTEM_PROMPT = "You are a presentation outline generator. Reply with one short slide title per line and nothing else: no numbering, no bullet points, no extra text."
+SLIDE_SYSTEM_PROMPT = "You are a helpful assistant that creates concise bullet points for presentations. Each bullet point should have a short title and brief content (maximum 2 lines) separated by a colon. Never generate more than 5 bullet points."
+
+SLIDE_MAX_TOKENS = 200
+
+PRESENTATION_JSON_SYSTEM_PROMPT = "You are a presentation content generator. Create structured content for slides based on the given topic. Each slide has a short title and 3-5 bullet points, each with a short title and brief content. Call emit_slides with all the slides, in order."
+SLIDE_JSON_SYSTEM_PROMPT = "You are a helpful assistant that creates concise slides for presentations. A slide has a short title and 3-5 bullet points, each with a short title and brief content (maximum 2 lines). Call emit_slide with the slide."
+
+# JSON punctuation and keys cost about a third more tokens than 'Title: Content' lines
+PRESENTATION_JSON_MAX_TOKENS = 1400
+SLIDE_JSON_MAX_TOKENS = 300
+
+POINTS_SCHEMA = {
+    'type': 'array',
+    'minItems': 1,
+    'maxItems': 5,
+    'items': {
+        'type': 'object',
+        'properties': {'title': {'type': 'string'}, 'content': {'type': 'string'}},
+        'required': ['title', 'content'],
+    },
+}
+SLIDE_SCHEMA = {
+    'type': 'object',
+    'properties': {'title': {'type': 'string'}, 'points': POINTS_SCHEMA},
+    'required': ['title', 'points'],
+}
+SLIDES_FUNCTION = {
+    'name': 'emit_slides',
+    'description': 'Emit every slide of the presentation, in order.',
+    'parameters': {
+        'type': 'object',
+        'properties': {'slides': {'type': 'array', 'items': SLIDE_SCHEMA}},
+        'required': ['slides'],
+    },
+}
+SLIDE_FUNCTION = {
+    'name': 'emit_slide',
+    'description': 'Emit one slide of the presentation.',
+    'parameters': SLIDE_SCHEMA,
+}
+
+_LIST_MARKER_RE = re.compile(r'^(?:slide\s*\d+\s*[:.)-]?|#+|[-*•]|\d+\s*[.)])\s*', re.IGNORECASE)
+
+
+def presentation_messages(content, slide_count):
+    return [
+        {"role": "system", "content": PRESENTATION_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Create content for a {slide_count} presentation about: {content}. Include {slide_count} slides with 3-5 bullet points each."}
+    ]
+
+
+class SlideStreamParser:
+    """Line parser for whole-deck completions that can be fed text as it streams in.
+
+    feed() returns the slides completed by the new text: a slide is complete
+    once the next 'Slide'/'#' heading arrives. close() flushes the last one.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._current = {"title": "", "content": []}
+
+    def feed(self, text):
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split('\n')
+        return [slide for slide in map(self._line, lines) if slide is not None]
+
+    def close(self):
+        slides = []
+        if self._buffer:
+            slide = self._line(self._buffer)
+            self._buffer = ''
+            if slide is not None:
+                slides.append(slide)
+        if self._current["title"]:
+            slides.append(self._current)
+        self._current = {"title": "", "content": []}
+        return slides
+
+    def _line(self, line):
+        line = line.strip()
+        if not line:
+            return None
+
+        if line.startswith('Slide') or line.startswith('#'):
+            finished = self._current if self._current["title"] else None
+            self._current = {"title": line, "content": []}
+            return finished
+        elif ':' in line:
+            title, content = line.split(':', 1)
+            self._current["content"].append({
+                "title": title.strip(),
+                "content": content.strip()
+            })
+        return None
+
+
+def parse_slides(generated_content):
+    """Split a whole-deck completion into slides on 'Slide'/'#' lines and 'Title: Content' points."""
+    parser = SlideStreamParser()
+    return parser.feed(generated_content) + parser.close()
+
+
+def requested_slide_count(slide_count):
+    """The slideCount as an int, or None for descriptive values such as 'brief'."""
+    try:
+        count = int(str(slide_count).strip())
+    except ValueError:
+        return None
+    return count if count > 0 else None
+
+
+def outline_messages(topic, count):
+    return [
+        {"role": "system", "content": OUTLINE_SYSTEM_PROMPT},
+        {"role": "user", "content": f"List {count} slide titles for a presentation about: {topic}."}
+    ]
+
+
+def outline_max_tokens(count):
+    return 40 + 20 * count
+
+
+def parse_outline(text, count):
+    """Slide titles from an outline completion, numbering and bullets removed, at most count."""
+    titles = []
+    for line in text.split('\n'):
+        title = _LIST_MARKER_RE.sub('', line.strip()).strip().strip('"').strip()
+        if title:
+            titles.append(title)
+    return titles[:count]
+
+
+def slide_messages(topic, title, index, count):
+    return [
+        {"role": "system", "content": SLIDE_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Create 3-5 brief bullet points for slide {index} of {count}, titled '{title}', in a presentation about: {topic}. Format each point as 'Title: Content'. Keep content concise and to the point."}
+    ]
+
+
+def parse_points(text):
+    """'Title: Content' points of a single slide completion."""
+    points = []
+    for line in text.split('\n'):
+        line = _LIST_MARKER_RE.sub('', line.strip()).strip()
+        if ':' not in line:
+            continue
+        title, content = line.split(':', 1)
+        points.append({"title": title.strip().strip('*').strip(), "content": content.strip()})
+    return points[:5]
+
+
+def slide_title(index, title):
+    # Same 'Slide N: ...' titles the single-completion mode usually produces
+    return f"Slide {index}: {title}"
+
+
+def presentation_json_messages(content, slide_count):
+    return [
+        {"role": "system", "content": PRESENTATION_JSON_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Create content for a {slide_count} presentation about: {content}. Include {slide_count} slides with 3-5 bullet points each."}
+    ]
+
+
+def slide_json_messages(topic, title, index, count):
+    """Messages for one slide; title None lets the model choose it (a slide missing from a deck)."""
+    titled = f", titled '{title}'," if title else ''
+    return [
+        {"role": "system", "content": SLIDE_JSON_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Create slide {index} of {count}{titled} with 3-5 brief bullet points, in a presentation about: {topic}."}
+    ]
+
+
+_TYPES = {'object': dict, 'array': list, 'string': str}
+
+
+def validate(value, schema, path='$'):
+    """Errors for value against the subset of JSON Schema used here (type, properties, required, items, min/maxItems)."""
+    expected = _TYPES.get(schema.get('type'))
+    if expected is not None and not isinstance(value, expected):
+        return [f"{path}: expected {schema['type']}"]
+    errors = []
+    if isinstance(value, dict):
+        for name in schema.get('required', ()):
+            if name not in value:
+                errors.append(f"{path}: missing {name}")
+        for name, subschema in schema.get('properties', {}).items():
+            if name in value:
+                errors.extend(validate(value[name], subschema, f"{path}.{name}"))
+    elif isinstance(value, list):
+        if len(value) < schema.get('minItems', 0):
+            errors.append(f"{path}: fewer than {schema['minItems']} items")
+        if 'maxItems' in schema and len(value) > schema['maxItems']:
+            errors.append(f"{path}: more than {schema['maxItems']} items")
+        if 'items' in schema:
+            for i, item in enumerate(value):
+                errors.extend(validate(item, schema['items'], f"{path}[{i}]"))
+    return errors
+
+
+def _coerce_point(point):
+    # A 'Title: Content' string, or an object with both halves in its title
+    if isinstance(point, str) and ':' in point:
+        title, content = point.split(':', 1)
+        return {'title': title, 'content': content}
+    if isinstance(point, dict) and 'content' not in point and ':' in str(point.get('title', '')):
+        title, content = point['title'].split(':', 1)
+        return dict(point, title=title, content=content)
+    return point
+
+
+def slide_from_json(value, index, title=None):
+    """(slide, None) for one emitted slide object, or (None, reason) when it does not fit SLIDE_SCHEMA.
+
+    Near misses are accepted: points written as 'Title: Content' strings and
+    more than five points (the rest are dropped). title, when known, replaces
+    the slide's own.
+    """
+    if isinstance(value, dict) and isinstance(value.get('points'), list):
+        value = dict(value, points=[_coerce_point(point) for point in value['points']][:5])
+    errors = validate(value, SLIDE_SCHEMA)
+    if errors:
+        return None, errors[0]
+    title = title or value['title'].strip()
+    if not title:
+        return None, '$.title: empty'
+    points = [{"title": point['title'].strip().strip('*').strip(), "content": point['content'].strip()}
+              for point in value['points']]
+    return {"title": slide_title(index + 1, title), "content": points}, None
+
+
+class ParsedSlide:
+    """One element of an emit_slides array: slide is None when it was malformed, raw is its JSON text."""
+    __slots__ = ('index', 'slide', 'raw', 'error')
+
+    def __init__(self, index, slide, raw, error=None):
+        self.index = index
+        self.slide = slide
+        self.raw = raw
+        self.error = error
+
+
+class JsonSlideStreamParser:
+    """Incremental parser for emit_slides arguments, {"slides": [{...}, ...]}, as they stream in.
+
+    feed() returns a ParsedSlide for every element of the slides array whose
+    closing brace arrived with the new text, validated on its own, so one
+    malformed slide does not hide the others. close() reports an element cut
+    off by the end of the reply. The array is the value of the top-level
+    "slides" key (or the whole reply, if that is an array); a reply that is
+    a single slide object is taken as a deck of that one slide, once it has
+    all arrived. found is False when the reply had neither, e.g. the model
+    answered in plain text.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self._scanned = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # The last string that closed in the top-level object, and the key it turned out to be
+        self._string_start = None
+        self._last_string = None
+        self._key = None
+        # Nesting depth of the slides array's elements, once it has opened
+        self._array_depth = None
+        self._item_start = None
+        self._index = 0
+        self._finished = False
+        self._bare = False
+
+    @property
+    def found(self):
+        return self._array_depth is not None or self._bare
+
+    @property
+    def elements(self):
+        """Slide objects seen so far, malformed ones included."""
+        return self._index
+
+    def feed(self, text):
+        self.text += text
+        parsed = []
+        pos = self._scanned
+        while pos < len(self.text) and not self._finished:
+            ch = self.text[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = self.text[self._string_start:pos + 1]
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif ch == ':' and self._depth == 1:
+                self._key = self._last_string
+            elif ch == ',' and self._depth == 1:
+                self._key = None
+            elif ch in '{[':
+                # Not any list: a slide's points are an array at depth 1 too
+                if ch == '[' and self._array_depth is None and (self._depth == 0 or self._key == '"slides"'):
+                    self._array_depth = self._depth + 1
+                elif ch == '{' and self._depth == self._array_depth:
+                    self._item_start = pos
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._array_depth is not None and self._depth < self._array_depth:
+                    self._finished = True
+                elif self._depth == self._array_depth and self._item_start is not None:
+                    parsed.append(self._item(self.text[self._item_start:pos + 1]))
+                    self._item_start = None
+            pos += 1
+        self._scanned = pos
+        return parsed
+
+    def close(self):
+        if self._array_depth is None:
+            return self._bare_slide()
+        if self._item_start is None or self._finished:
+            return []
+        raw = self.text[self._item_start:]
+        self._item_start = None
+        self._index += 1
+        return [ParsedSlide(self._index - 1, None, raw, 'cut off')]
+
+    def _bare_slide(self):
+        start = self.text.find('{')
+        if start < 0:
+            return []
+        try:
+            value = json.loads(self.text[start:])
+        except ValueError:
+            return []
+        if not isinstance(value, dict) or 'points' not in value:
+            return []
+        self._bare = True
+        return [self._item(self.text[start:].strip())]
+
+    def _item(self, raw):
+        index = self._index
+        self._index += 1
+        try:
+            value = json.loads(raw)
+        except ValueError as e:
+            return ParsedSlide(index, None, raw, f'invalid JSON: {e}')
+        slide, error = slide_from_json(value, index)
+        return ParsedSlide(index, slide, raw, error)
+
+
+def parse_json_slides(text):
+    """ParsedSlides for a whole emit_slides reply; a reply without a slides array is parsed as text."""
+    parser = JsonSlideStreamParser()
+    parsed = parser.feed(text) + parser.close()
+    if not parser.found:
+        return [ParsedSlide(i, slide, None) for i, slide in enumerate(parse_slides(text))]
+    return parsed
+
+
+def _drop_trailing_comma(out):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ',':
+        out.pop()
+
+
+def _close_json(text):
+    """text with commas before closing brackets dropped and open strings and brackets closed."""
+    out = []
+    closers = []
+    in_string = escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in '{[':
+            closers.append('}' if ch == '{' else ']')
+        elif ch in '}]':
+            _drop_trailing_comma(out)
+            if closers:
+                closers.pop()
+        out.append(ch)
+    if in_string:
+        if escape:
+            out.pop()
+        out.append('"')
+    _drop_trailing_comma(out)
+    out.extend(reversed(closers))
+    return ''.join(out)
+
+
+_TITLE_RE = re.compile(r'"title"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def repair_slide(raw, index, title=None):
+    """The slide in a malformed or cut-off slide object if enough of it survives, else None.
+
+    Trailing commas are dropped and open strings and brackets closed. A slide
+    cut off mid-point is cut back to the end of the last whole point first,
+    rather than keep half a sentence; so is one that closing alone cannot fix.
+    """
+    cuts = [i + 1 for i in range(len(raw) - 1, 0, -1) if raw[i] == '}'][:20]
+    cuts = [len(raw)] + cuts if raw.rstrip().endswith('}') else cuts + [len(raw)]
+    for cut in cuts:
+        try:
+            value = json.loads(_close_json(raw[:cut]))
+        except ValueError:
+            continue
+        slide, _ = slide_from_json(value, index, title)
+        if slide is not None:
+            return slide
+    return None
+
+
+def title_hint(raw):
+    """The slide title in a malformed slide object, if it got that far."""
+    match = _TITLE_RE.search(raw or '')
+    if match is None:
+        return None
+    try:
+        return json.loads(f'"{match.group(1)}"').strip() or None
+    except ValueError:
+        return None
+
+
+def parse_json_slide(text, index, title=None):
+    """The slide in an emit_slide reply, repaired if need be, or None. A plain-text reply is read as points."""
+    start = text.find('{')
+    if start < 0:
+        points = parse_points(text)
+        return {"title": slide_title(index + 1, title), "content": points} if title and points else None
+    try:
+        slide, _ = slide_from_json(json.loads(text[start:]), index, title)
+    except ValueError:
+        slide = None
+    return slide or repair_slide(text[start:], index, title)
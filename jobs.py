@@ -0,0 +1,222 @@
+"""Background deck builds on a local process pool.
+
+A job is submitted with a save-presentation payload and runs the worker
+function in a separate process, so large decks use other cores instead of
+blocking a request thread. The number of unfinished jobs is bounded; when
+the queue is full, submit() raises JobQueueFull and the caller answers 429.
+Finished results are kept in memory for result_ttl seconds. No broker is
+involved: jobs run in the process that accepted them. With a storage
+backend (storage.py) each job's status and result are also published there,
+so any process sharing it can answer status and result requests; only the
+owner sees a job as running rather than queued.
+"""
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+FINISHED = (DONE, FAILED)
+# Published records of unfinished jobs outlive a process that dies before finishing them by this much
+PENDING_TTL = 24 * 3600
+# How often a job owned by another process is checked while waiting for it
+REMOTE_POLL_INTERVAL = 0.25
+
+
+class JobQueueFull(Exception):
+    """Too many unfinished jobs; try again later."""
+
+
+class Job:
+    __slots__ = ('id', 'status', 'submitted_at', 'finished_at', 'error', 'result', 'metrics', 'future')
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = QUEUED
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.error = None
+        self.result = None
+        self.metrics = {}
+        self.future = None
+
+    def current_status(self):
+        if self.status == QUEUED and self.future is not None and self.future.running():
+            return RUNNING
+        return self.status
+
+    def to_dict(self):
+        info = {
+            'jobId': self.id,
+            'status': self.current_status(),
+            'submittedAt': self.submitted_at,
+            'finishedAt': self.finished_at,
+        }
+        started_at = self.metrics.get('started_at')
+        if started_at is not None:
+            info['queueSeconds'] = round(started_at - self.submitted_at, 4)
+        for name, key in (('build_seconds', 'buildSeconds'), ('save_seconds', 'saveSeconds'),
+                          ('media_bytes_saved', 'mediaBytesSaved')):
+            if name in self.metrics:
+                info[key] = round(self.metrics[name], 4)
+        if self.finished_at is not None:
+            info['totalSeconds'] = round(self.finished_at - self.submitted_at, 4)
+        if self.result is not None:
+            info['bytes'] = len(self.result)
+        if self.error:
+            info['error'] = self.error
+        return info
+
+
+class StoredJob:
+    """A job published by another process: its to_dict() record, with the result fetched on demand."""
+
+    def __init__(self, record, storage):
+        self.record = record
+        self.storage = storage
+        self.id = record['jobId']
+        self.status = record['status']
+        self.error = record.get('error')
+
+    @property
+    def result(self):
+        return self.storage.get('job-result:' + self.id) if self.status == DONE else None
+
+    def to_dict(self):
+        return dict(self.record)
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class JobManager:
+    def __init__(self, worker, max_workers=None, max_pending=32, result_ttl=600, start_method=None, storage=None):
+        self.worker = worker
+        self.storage = storage
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.start_method = start_method
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self._executor = None
+        self._executor_pid = None
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._durations = []
+
+    def _get_executor(self):
+        # Created lazily (and again after a fork or a crashed worker) so that
+        # importing the server never starts processes
+        if self._executor is None or self._executor_pid != os.getpid():
+            context = multiprocessing.get_context(self.start_method) if self.start_method else None
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def _pending(self):
+        return sum(1 for job in self._jobs.values() if job.status not in FINISHED)
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at is not None and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def submit(self, payload):
+        with self._cond:
+            self._expire()
+            if self._pending() >= self.max_pending:
+                self.rejected += 1
+                raise JobQueueFull(f'{self.max_pending} jobs already queued or running')
+            job = Job()
+            self._jobs[job.id] = job
+            try:
+                job.future = self._get_executor().submit(self.worker, payload)
+            except BrokenProcessPool:
+                self._executor = None
+                job.future = self._get_executor().submit(self.worker, payload)
+        self._publish(job)
+        job.future.add_done_callback(lambda future: self._finish(job, future))
+        return job
+
+    def _publish(self, job):
+        if self.storage is None:
+            return
+        try:
+            if job.status == DONE:
+                self.storage.set('job-result:' + job.id, job.result, ttl=self.result_ttl)
+            ttl = self.result_ttl if job.status in FINISHED else PENDING_TTL
+            self.storage.set('job:' + job.id, json.dumps(job.to_dict()).encode('utf-8'), ttl=ttl)
+        except Exception as e:
+            # The job itself is fine; only other processes will not see it
+            print(f"Error publishing job {job.id}: {str(e)}")
+
+    def _finish(self, job, future):
+        with self._cond:
+            job.finished_at = time.time()
+            try:
+                job.result, job.metrics = future.result()
+                job.status = DONE
+                self.completed += 1
+                self._durations.append(job.finished_at - job.submitted_at)
+                del self._durations[:-1000]
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    self._executor = None
+                job.status = FAILED
+                job.error = str(e) or e.__class__.__name__
+                self.failed += 1
+            self._cond.notify_all()
+        self._publish(job)
+
+    def get(self, job_id, wait=0):
+        """Return the job, first waiting up to wait seconds for it to finish.
+
+        A job this process does not know is looked up in the storage backend, as a StoredJob.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None and wait:
+                self._cond.wait_for(lambda: job.status in FINISHED, timeout=wait)
+            if job is not None or self.storage is None:
+                return job
+        deadline = time.time() + wait
+        while True:
+            record = self.storage.get('job:' + job_id)
+            if record is None:
+                return None
+            job = StoredJob(json.loads(record), self.storage)
+            if job.status in FINISHED or time.time() >= deadline:
+                return job
+            time.sleep(min(REMOTE_POLL_INTERVAL, max(0.0, deadline - time.time())))
+
+    def stats(self):
+        with self._cond:
+            self._expire()
+            by_status = {}
+            for job in self._jobs.values():
+                status = job.current_status()
+                by_status[status] = by_status.get(status, 0) + 1
+            return {
+                'workers': self.max_workers,
+                'capacity': self.max_pending,
+                'pending': self._pending(),
+                'jobs': by_status,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'p50_seconds': _percentile(self._durations, 0.5),
+                'p95_seconds': _percentile(self._durations, 0.95),
+            }
@@ -0,0 +1,298 @@
+"""Template-compiled slide rendering.
+
+Every layout is built once per colour scheme with the same python-pptx calls
+the original create_* helpers (benchmarks/legacy_layouts.py) make, and the
+resulting XML is kept as detached fragments. Rendering a slide deep-copies
+those fragments into its shape tree and only fills in text, shape ids, box
+geometry and image relationships, so no font/colour/shadow property setter
+runs per slide.
+"""
+import copy
+import os
+from pptx import Presentation
+from pptx.util import Inches, Pt
+from pptx.enum.text import PP_ALIGN, MSO_VERTICAL_ANCHOR
+from pptx.dml.color import RGBColor
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.oxml.ns import qn
+from assets import asset_from_path
+from cache import LRUCache
+from metrics import stage
+
+FONT_NAME = 'Frutiger 45 Light'
+ICONS_DIR = os.path.join('sliding', 'icons')
+
+SLIDE_WIDTH = Inches(16)
+SLIDE_HEIGHT = Inches(9)
+
+
+def _clear_paragraphs(text_frame):
+    for paragraph in text_frame.paragraphs:
+        p = paragraph._element
+        p.getparent().remove(p)
+
+
+def _style_run(run, size, rgb, bold=None):
+    run.font.name = FONT_NAME
+    run.font.size = Pt(size)
+    run.font.color.rgb = RGBColor(*rgb)
+    if bold is not None:
+        run.font.bold = bold
+
+
+def _text_shape(shapes, left, top, width, height, size):
+    """Unfilled, borderless rectangle holding one left-aligned black run."""
+    shape = shapes.add_shape(1, left, top, width, height)
+    shape.fill.background()
+    shape.line.fill.background()
+    shape.shadow.inherit = False
+    text_frame = shape.text_frame
+    text_frame.word_wrap = True
+    paragraph = text_frame.paragraphs[0]
+    paragraph.alignment = PP_ALIGN.LEFT
+    _style_run(paragraph.add_run(), size, (0, 0, 0))
+    return shape
+
+
+def _box_shape(shapes, forms_bg_rgb, anchor):
+    """Filled content box with its default paragraph removed."""
+    box = shapes.add_shape(1, 0, 0, 0, 0)
+    box.fill.solid()
+    box.fill.fore_color.rgb = RGBColor(*forms_bg_rgb)
+    box.line.fill.background()
+    box.shadow.inherit = False
+    text_frame = box.text_frame
+    text_frame.word_wrap = True
+    text_frame.margin_left = Inches(0.2)
+    text_frame.margin_right = Inches(0.2)
+    text_frame.margin_top = Inches(0.2)
+    text_frame.margin_bottom = Inches(0.2)
+    _clear_paragraphs(text_frame)
+    if anchor:
+        text_frame.vertical_anchor = MSO_VERTICAL_ANCHOR.TOP
+    return box
+
+
+def _paragraph(text_frame, size, rgb, align=True, bold=None, styled=True):
+    p = text_frame.add_paragraph()
+    if align:
+        p.alignment = PP_ALIGN.LEFT
+    run = p.add_run()
+    if styled:
+        _style_run(run, size, rgb, bold)
+    return p
+
+
+def _detach(element):
+    return copy.deepcopy(element)
+
+
+class LayoutTemplates:
+    """Prebuilt XML fragments for one (content text, highlight, forms background) scheme."""
+
+    def __init__(self, content_text_rgb, highlight_rgb, forms_bg_rgb):
+        prs = Presentation()
+        slide = prs.slides.add_slide(prs.slide_layouts[6])
+        shapes = slide.shapes
+
+        self.cover_title = _detach(_text_shape(shapes, Inches(0.61), Inches(2.16), Inches(8.7), Inches(1.46), 40)._element)
+        self.cover_presenter = _detach(_text_shape(shapes, Inches(0.61), Inches(4.72), Inches(7.48), Inches(0.3), 16)._element)
+        self.title = _detach(_text_shape(shapes, Inches(1), Inches(0.5), Inches(14), Inches(1), 44)._element)
+
+        # The original layouts differ in where they anchor the text: 'boxes'
+        # always anchors to the top, 'versus' never does and 'brain' only
+        # when the box receives a point.
+        self.box_anchored = _detach(_box_shape(shapes, forms_bg_rgb, True)._element)
+        self.box_plain = _detach(_box_shape(shapes, forms_bg_rgb, False)._element)
+
+        scratch = shapes.add_shape(1, 0, 0, 0, 0).text_frame
+        _clear_paragraphs(scratch)
+        self.heading = _detach(_paragraph(scratch, 16, highlight_rgb, bold=False)._element)
+        self.heading_bold = _detach(_paragraph(scratch, 16, highlight_rgb, bold=True)._element)
+        self.spacer = _detach(_paragraph(scratch, 0, None, styled=False)._element)
+        self.body = _detach(_paragraph(scratch, 14, content_text_rgb)._element)
+        self.body_unaligned = _detach(_paragraph(scratch, 14, content_text_rgb, align=False)._element)
+
+        self.icons = {}
+        for name in ('versus', 'brain'):
+            img_path = os.path.join(ICONS_DIR, name + '.png')
+            if os.path.exists(img_path):
+                img_width = Inches(1.5)
+                center_x = (SLIDE_WIDTH - img_width) / 2
+                pic = shapes.add_picture(img_path, center_x, Inches(3.5), img_width, Inches(1.5))
+                self.icons[name] = (img_path, _detach(pic._element))
+
+
+_templates = LRUCache(max_entries=32)
+
+
+def get_templates(content_text_rgb, highlight_rgb, forms_bg_rgb):
+    key = (tuple(content_text_rgb), tuple(highlight_rgb), tuple(forms_bg_rgb))
+    templates = _templates.get(key)
+    if templates is None:
+        templates = _templates.put(key, LayoutTemplates(*key))
+    return templates
+
+
+def _set_text(p, text):
+    p.find(qn('a:r')).text = text
+
+
+def _set_geometry(sp, left, top, width, height):
+    xfrm = sp.find(qn('p:spPr')).find(qn('a:xfrm'))
+    off = xfrm.find(qn('a:off'))
+    ext = xfrm.find(qn('a:ext'))
+    off.set('x', '%d' % left)
+    off.set('y', '%d' % top)
+    ext.set('cx', '%d' % width)
+    ext.set('cy', '%d' % height)
+
+
+class SlideRenderer:
+    """Adds slides to one presentation by cloning prebuilt layout templates."""
+
+    def __init__(self, prs, content_text_rgb, highlight_rgb, forms_bg_rgb, logo=None, logo_position=None):
+        self.prs = prs
+        self.templates = get_templates(content_text_rgb, highlight_rgb, forms_bg_rgb)
+        self.blank_layout = prs.slide_layouts[6]
+        self.logo = logo
+        self.logo_position = logo_position
+        # Image parts are resolved once per deck instead of SHA1-matching
+        # every add_picture call against all parts in the package
+        self._image_parts = {}
+
+    # -- shape tree helpers -------------------------------------------------
+
+    def _append(self, slide, element, basename):
+        spTree = slide.shapes._spTree
+        shape_id = spTree.max_shape_id + 1
+        c_nv_pr = element.find('.//' + qn('p:cNvPr'))
+        c_nv_pr.set('id', str(shape_id))
+        c_nv_pr.set('name', '%s %d' % (basename, shape_id - 1))
+        spTree.append(element)
+        return element
+
+    def _image_rId(self, slide, key, image_file):
+        image_part = self._image_parts.get(key)
+        if image_part is None:
+            image_part = self.prs.part.package.get_or_add_image_part(image_file)
+            self._image_parts[key] = image_part
+        return slide.part.relate_to(image_part, RT.IMAGE)
+
+    def _add_icon(self, slide, name):
+        icon = self.templates.icons.get(name)
+        if icon is None:
+            return
+        img_path, pic_template = icon
+        asset = asset_from_path(img_path)
+        pic = copy.deepcopy(pic_template)
+        pic.find('.//' + qn('a:blip')).set(qn('r:embed'), self._image_rId(slide, asset.digest, img_path))
+        self._append(slide, pic, 'Picture')
+
+    def _add_text_shape(self, slide, template, text):
+        sp = copy.deepcopy(template)
+        _set_text(sp.find('.//' + qn('a:p')), text)
+        self._append(slide, sp, 'Rectangle')
+
+    def _add_box(self, slide, template, left, top, width, height):
+        sp = copy.deepcopy(template)
+        _set_geometry(sp, left, top, width, height)
+        self._append(slide, sp, 'Rectangle')
+        return sp.find(qn('p:txBody'))
+
+    def _add_paragraph(self, tx_body, template, text):
+        p = copy.deepcopy(template)
+        _set_text(p, text)
+        tx_body.append(p)
+
+    # -- slides -------------------------------------------------------------
+
+    def add_title_slide(self, title_text):
+        slide = self.prs.slides.add_slide(self.blank_layout)
+        self._add_text_shape(slide, self.templates.cover_title, title_text)
+        self._add_text_shape(slide, self.templates.cover_presenter, "Presenter")
+        return slide
+
+    def add_slide(self, layout_type, title_text, content):
+        slide = self.prs.slides.add_slide(self.blank_layout)
+        self._add_text_shape(slide, self.templates.title, title_text)
+        if layout_type == 'versus':
+            self._render_pair(slide, content, 'versus', [
+                (Inches(1.2), Inches(2.5), Inches(5.5), Inches(3)),
+                (Inches(9.3), Inches(2.5), Inches(5.5), Inches(3)),
+            ])
+        elif layout_type == 'brain':
+            self._render_pair(slide, content, 'brain', [
+                (Inches(5.5), Inches(1.5), Inches(5), Inches(2.2)),
+                (Inches(5.5), Inches(5.2), Inches(5), Inches(2.2)),
+            ])
+        else:
+            self._render_boxes(slide, content)
+        if self.logo:
+            with stage('logo'):
+                self._add_logo(slide)
+        return slide
+
+    def _render_boxes(self, slide, content):
+        t = self.templates
+        content = [item for item in content if item and (isinstance(item, dict) and (item.get('title') or item.get('content')) or isinstance(item, str) and item.strip())]
+        num_points = len(content)
+        if num_points == 0:
+            return
+        slide_margin = Inches(1)
+        available_width = SLIDE_WIDTH - (2 * slide_margin)
+        box_margin = Inches(0.3)
+        box_width = (available_width - box_margin * (num_points - 1)) / num_points
+        for i, point in enumerate(content):
+            left = slide_margin + (i * (box_width + box_margin))
+            tx_body = self._add_box(slide, t.box_anchored, left, Inches(3), box_width, Inches(2.5))
+            if isinstance(point, dict):
+                content_val = point.get('content', '')
+                self._add_paragraph(tx_body, t.heading, point.get('title', '').title())
+                if content_val:
+                    self._add_paragraph(tx_body, t.spacer, '')
+                    self._add_paragraph(tx_body, t.body_unaligned, content_val)
+            else:
+                self._add_paragraph(tx_body, t.body_unaligned, point)
+
+    def _render_pair(self, slide, content, icon, boxes):
+        t = self.templates
+        self._add_icon(slide, icon)
+        # Both boxes are added before either is filled, matching the original shape order
+        anchored = icon == 'brain'
+        bodies = []
+        for idx, geometry in enumerate(boxes):
+            template = t.box_anchored if anchored and idx < len(content) else t.box_plain
+            bodies.append(self._add_box(slide, template, *geometry))
+        for idx, tx_body in enumerate(bodies):
+            if idx >= len(content):
+                continue
+            point = content[idx]
+            if isinstance(point, dict):
+                self._add_paragraph(tx_body, t.heading_bold, point.get('title', '').title())
+                box_content = point.get('content', '')
+                if box_content:
+                    self._add_paragraph(tx_body, t.body, box_content)
+            else:
+                self._add_paragraph(tx_body, t.body, str(point))
+
+    def _add_logo(self, slide):
+        logo = self.logo
+        if not logo or not self.logo_position:
+            return
+        logo_height = Inches(0.5)
+        logo_width = Inches(0.5) * logo.aspect
+        margin = Inches(0.3)
+        left, top = margin, margin
+        if self.logo_position in ('top-right', 'bottom-right'):
+            left = SLIDE_WIDTH - logo_width - margin
+        if self.logo_position in ('bottom-left', 'bottom-right'):
+            top = SLIDE_HEIGHT - logo_height - margin
+        image_part = self._image_parts.get(logo.digest)
+        if image_part is None:
+            image_part = self.prs.part.package.get_or_add_image_part(logo.stream())
+            self._image_parts[logo.digest] = image_part
+        rId = slide.part.relate_to(image_part, RT.IMAGE)
+        # The logo geometry depends on the deck, not the template, so let
+        # python-pptx build the (single, small) pic element directly
+        slide.shapes._add_pic_from_image_part(image_part, rId, left, top, logo_width, logo_height)
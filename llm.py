@@ -0,0 +1,485 @@
+"""Completion client shared by the generation endpoints.
+
+Every call runs on one background asyncio loop. A Flask worker thread
+submits a coroutine and waits for its result, while the loop multiplexes any
+number of in-flight completions over a single pooled aiohttp session.
+Each attempt waits for its turn in the fair-share scheduler (scheduler.py),
+which caps concurrency and the token and request rates per client and
+overall; each attempt has a timeout, and rate limit / server errors are
+retried with jittered exponential backoff. Identical completions requested
+while one is already in flight share its result. A call may pass a function
+(an OpenAI function definition) that the model is made to call; the text is
+then the function's JSON arguments.
+
+LLM_BACKEND=stub swaps OpenAI for a local canned backend with configurable
+latency, so the endpoints can be load-tested offline.
+
+openai and aiohttp are imported on the first completion rather than with
+this module; together they are most of the server's import time.
+"""
+import asyncio
+import hashlib
+import os
+import queue
+import random
+import re
+import sys
+import json
+import threading
+from contextlib import asynccontextmanager
+from scheduler import BULK, FairScheduler, SchedulerBusy, estimate_tokens
+import metrics
+
+DEFAULT_MODEL = 'gpt-3.5-turbo'
+
+
+class LLMError(Exception):
+    """A completion failed after all retries."""
+
+
+class LLMTimeout(LLMError):
+    """A completion attempt did not finish within its timeout."""
+
+
+class LLMBusy(LLMError):
+    """The rate budgets kept a completion queued for longer than the queue timeout."""
+
+
+class Completion:
+    __slots__ = ('text', 'total_tokens')
+
+    def __init__(self, text, total_tokens=0):
+        self.text = text
+        self.total_tokens = total_tokens
+
+
+def _is_openai_error(error):
+    # Nothing can have raised one if openai was never imported
+    openai = sys.modules.get('openai')
+    return openai is not None and isinstance(error, openai.error.OpenAIError)
+
+
+def _is_retryable(error):
+    import openai
+    if isinstance(error, (openai.error.RateLimitError, openai.error.ServiceUnavailableError,
+                          openai.error.Timeout, openai.error.APIConnectionError, openai.error.TryAgain)):
+        return True
+    if isinstance(error, openai.error.APIError):
+        return error.http_status is None or error.http_status >= 500
+    return False
+
+
+def _retry_after(error):
+    headers = getattr(error, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after') or headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_llm_error(error):
+    if isinstance(error, LLMError):
+        return error
+    wrapped = LLMError(str(error))
+    wrapped.__cause__ = error
+    return wrapped
+
+
+class OpenAIBackend:
+    name = 'openai'
+
+    def __init__(self, pool_size=16):
+        self.pool_size = pool_size
+        self._session = None
+
+    @property
+    def configured(self):
+        import openai
+        return bool(openai.api_key)
+
+    def _get_session(self):
+        import aiohttp
+        # Created lazily so it belongs to the loop that uses it
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def aclose(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    @staticmethod
+    def _function_options(function):
+        if function is None:
+            return {}
+        return {'functions': [function], 'function_call': {'name': function['name']}}
+
+    async def acomplete(self, model, messages, max_tokens, timeout, function=None):
+        import openai
+        openai.aiosession.set(self._get_session())
+        response = await openai.ChatCompletion.acreate(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            request_timeout=timeout,
+            **self._function_options(function),
+        )
+        usage = response.get('usage') or {}
+        message = response.choices[0].message
+        call = message.get('function_call')
+        text = call.get('arguments', '') if call else message.get('content')
+        return Completion(text, usage.get('total_tokens', 0))
+
+    async def astream(self, model, messages, max_tokens, timeout, function=None):
+        import openai
+        openai.aiosession.set(self._get_session())
+        response = await openai.ChatCompletion.acreate(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            request_timeout=timeout,
+            stream=True,
+            **self._function_options(function),
+        )
+        async for chunk in response:
+            delta = chunk.choices[0].get('delta', {})
+            text = (delta.get('function_call') or {}).get('arguments') or delta.get('content')
+            if text:
+                yield text
+
+
+def stub_reply(messages, max_tokens, function=None):
+    """Deterministic stand-in for a completion, shaped like what the prompts ask for.
+
+    With a function the reply is its JSON arguments, as the real API returns them.
+    """
+    prompt = messages[-1]['content']
+    system = messages[0]['content'] if len(messages) > 1 else ''
+    rng = random.Random(hashlib.sha1(prompt.encode('utf-8')).hexdigest())
+    match = re.search(r'about: (.+?)(?:\.\s|\.?$)', prompt, re.S)
+    topic = match.group(1).strip() if match else 'the topic'
+    if function is not None:
+        return json.dumps(_stub_arguments(function['name'], prompt, topic, rng))
+    if 'outline generator' in system:
+        match = re.search(r'List (\d+) slide titles', prompt)
+        slide_count = int(match.group(1)) if match else 5
+        return '\n'.join(f"{topic} part {i}" for i in range(1, slide_count + 1))
+    if 'presentation content generator' in system:
+        match = re.search(r'Include (\d+) slides', prompt)
+        slide_count = int(match.group(1)) if match else 5
+        lines = []
+        for i in range(1, slide_count + 1):
+            lines.append(f"Slide {i}: {topic} part {i}")
+            for j in range(rng.randint(3, 5)):
+                lines.append(f"Point {j + 1}: Detail {j + 1} about {topic}, part {i}.")
+            lines.append('')
+        return '\n'.join(lines)
+    return '\n'.join(f"Point {j + 1}: Short note {j + 1} about {topic}." for j in range(rng.randint(3, 5)))
+
+
+def _stub_arguments(name, prompt, topic, rng):
+    if name == 'emit_slides':
+        match = re.search(r'Include (\d+) slides', prompt)
+        slide_count = int(match.group(1)) if match else 5
+        return {'slides': [
+            {'title': f"{topic} part {i}",
+             'points': [{'title': f"Point {j + 1}", 'content': f"Detail {j + 1} about {topic}, part {i}."}
+                        for j in range(rng.randint(3, 5))]}
+            for i in range(1, slide_count + 1)
+        ]}
+    match = re.search(r"slide (\d+) of \d+(?:, titled '(.+?)',)?", prompt)
+    index, title = (int(match.group(1)), match.group(2)) if match else (1, None)
+    return {'title': title or f"{topic} part {index}",
+            'points': [{'title': f"Point {j + 1}", 'content': f"Short note {j + 1} about {topic}."}
+                       for j in range(rng.randint(3, 5))]}
+
+
+class StubBackend:
+    name = 'stub'
+    configured = True
+
+    def __init__(self, latency=0.2, jitter=0.0, error_rate=0.0, token_delay=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.token_delay = token_delay
+
+    async def aclose(self):
+        pass
+
+    async def acomplete(self, model, messages, max_tokens, timeout, function=None):
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        if self.error_rate and random.random() < self.error_rate:
+            import openai
+            raise openai.error.RateLimitError('stub backend rate limit')
+        text = stub_reply(messages, max_tokens, function)
+        await asyncio.sleep(self.token_delay * (len(text) // 4))
+        return Completion(text, len(text) // 4)
+
+    async def astream(self, model, messages, max_tokens, timeout, function=None):
+        # latency is time to first token, then roughly one token (4 chars) per token_delay
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        if self.error_rate and random.random() < self.error_rate:
+            import openai
+            raise openai.error.RateLimitError('stub backend rate limit')
+        text = stub_reply(messages, max_tokens, function)
+        for start in range(0, len(text), 4):
+            yield text[start:start + 4]
+            await asyncio.sleep(self.token_delay)
+
+
+class _LoopThread:
+    """A daemon thread running an event loop; restarted after fork."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._pid = None
+
+    def get(self):
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._pid = os.getpid()
+                threading.Thread(target=self._loop.run_forever, name='llm-loop', daemon=True).start()
+            return self._loop
+
+    @property
+    def running(self):
+        return self._loop is not None and self._pid == os.getpid()
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.get()).result()
+
+
+class LLMClient:
+    def __init__(self, backend, model=DEFAULT_MODEL, timeout=30.0, max_concurrency=8,
+                 max_retries=3, backoff_base=0.5, backoff_cap=8.0, tpm=0, rpm=0, client_tpm=0,
+                 queue_timeout=60.0):
+        self.backend = backend
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.budgets = {'tpm': tpm, 'rpm': rpm, 'client_tpm': client_tpm, 'queue_timeout': queue_timeout}
+        self.coalesced = 0
+        self._loop_thread = _LoopThread()
+        self._scheduler_state = (os.getpid(), FairScheduler(max_concurrency, **self.budgets))
+        self._in_flight = {}
+
+    @property
+    def configured(self):
+        return self.backend.configured
+
+    def _scheduler(self):
+        # A forked child runs a new loop: fresh budgets and nothing in flight
+        pid, scheduler = self._scheduler_state
+        if pid != os.getpid():
+            scheduler = FairScheduler(self.max_concurrency, **self.budgets)
+            self._scheduler_state = (os.getpid(), scheduler)
+            self._in_flight = {}
+        return scheduler
+
+    def stats(self):
+        """Scheduler queue depths, wait times and budgets, plus coalescing counts."""
+        stats = self._scheduler().stats()
+        stats['in_flight'] = len(self._in_flight)
+        stats['coalesced'] = self.coalesced
+        return stats
+
+    def _backoff(self, attempt, error):
+        # Full jitter, but never earlier than the server asked us to wait
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_cap))
+        return delay
+
+    async def acomplete(self, messages, max_tokens, timeout=None, model=None, client=None, priority=BULK,
+                        function=None):
+        """A Completion; concurrent calls with the same model, messages, max_tokens and function share one upstream call.
+
+        client names whose budget the call is charged to; priority is scheduler.INTERACTIVE or BULK.
+        """
+        model = model or self.model
+        key = hashlib.sha256(json.dumps([model, messages, max_tokens, function],
+                                        sort_keys=True).encode('utf-8')).digest()
+        self._scheduler()  # drops a table inherited through fork
+        flight = self._in_flight.get(key)
+        if flight is None:
+            task = asyncio.ensure_future(
+                self._acomplete(messages, max_tokens, timeout, model, client, priority, function))
+            flight = self._in_flight[key] = [task, 0]
+            task.add_done_callback(lambda _, flight=flight: self._land(key, flight))
+        else:
+            self.coalesced += 1
+            metrics.LLM_COALESCED.inc()
+        flight[1] += 1
+        try:
+            return await asyncio.shield(flight[0])
+        finally:
+            flight[1] -= 1
+            if not flight[1] and not flight[0].done():
+                # Every caller is gone
+                self._land(key, flight)
+                flight[0].cancel()
+
+    def _land(self, key, flight):
+        if self._in_flight.get(key) is flight:
+            del self._in_flight[key]
+
+    async def _acomplete(self, messages, max_tokens, timeout, model, client, priority, function):
+        timeout = timeout or self.timeout
+        cost = estimate_tokens(messages, max_tokens, function)
+        for attempt in range(self.max_retries + 1):
+            async with self._slot(client, priority, cost) as ticket:
+                try:
+                    completion = await asyncio.wait_for(
+                        self.backend.acomplete(model, messages, max_tokens, timeout, function), timeout)
+                    self._scheduler().settle(ticket, completion.total_tokens)
+                    return completion
+                except asyncio.TimeoutError:
+                    error = LLMTimeout(f'completion timed out after {timeout:g}s')
+                except Exception as e:
+                    if not _is_openai_error(e):
+                        raise
+                    if not _is_retryable(e):
+                        raise LLMError(str(e)) from e
+                    error = e
+            if attempt == self.max_retries:
+                raise _as_llm_error(error)
+            await asyncio.sleep(self._backoff(attempt, error))
+
+    @asynccontextmanager
+    async def _slot(self, client, priority, cost):
+        try:
+            async with self._scheduler().slot(client or 'anonymous', priority, cost) as ticket:
+                yield ticket
+        except SchedulerBusy as e:
+            raise LLMBusy(str(e)) from e
+
+    async def astream(self, messages, max_tokens, timeout=None, model=None, client=None, priority=BULK,
+                      function=None):
+        """Yield completion text as it arrives.
+
+        timeout bounds the wait for each chunk. Failures before the first
+        chunk are retried like acomplete; once text has been yielded a
+        failure is raised, since a retry would repeat it. Streams are not
+        shared between callers.
+        """
+        timeout = timeout or self.timeout
+        model = model or self.model
+        cost = estimate_tokens(messages, max_tokens, function)
+        for attempt in range(self.max_retries + 1):
+            started = False
+            async with self._slot(client, priority, cost):
+                stream = self.backend.astream(model, messages, max_tokens, timeout, function)
+                try:
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(stream.__anext__(), timeout)
+                        except StopAsyncIteration:
+                            return
+                        started = True
+                        yield chunk
+                except asyncio.TimeoutError:
+                    error = LLMTimeout(f'completion stream stalled for {timeout:g}s')
+                except Exception as e:
+                    if not _is_openai_error(e):
+                        raise
+                    if not _is_retryable(e):
+                        raise LLMError(str(e)) from e
+                    error = e
+                finally:
+                    await stream.aclose()
+            if started or attempt == self.max_retries:
+                raise _as_llm_error(error)
+            await asyncio.sleep(self._backoff(attempt, error))
+
+    def stream(self, messages, max_tokens, timeout=None, model=None, client=None, priority=BULK, function=None):
+        """Blocking generator over astream for request handlers.
+
+        Closing the generator early (e.g. the HTTP client went away) cancels
+        the upstream completion.
+        """
+        chunks = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for chunk in self.astream(messages, max_tokens, timeout, model, client, priority, function):
+                    chunks.put(chunk)
+                chunks.put(done)
+            except BaseException as e:
+                chunks.put(e)
+                raise
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop_thread.get())
+        try:
+            while True:
+                item = chunks.get()
+                if item is done:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def complete(self, messages, max_tokens, timeout=None, model=None, client=None, priority=BULK, function=None):
+        """Blocking wrapper for request handlers; the call itself runs on the shared loop."""
+        return self._loop_thread.run(
+            self.acomplete(messages, max_tokens, timeout, model, client, priority, function))
+
+    def close(self):
+        """Close the pooled HTTP session, if this process ever opened one."""
+        if self._loop_thread.running:
+            self._loop_thread.run(self.backend.aclose())
+
+    def complete_many(self, calls, limit=None, client=None, priority=BULK, function=None):
+        """Run several (messages, max_tokens) calls concurrently, at most limit at a time, all with function.
+
+        Returns results in input order; a failed call yields its exception
+        instead of a Completion so one bad call does not sink the rest.
+        """
+        async def gather():
+            gate = asyncio.Semaphore(limit) if limit else None
+
+            async def one(messages, max_tokens):
+                if gate is None:
+                    return await self.acomplete(messages, max_tokens, client=client, priority=priority,
+                                                function=function)
+                async with gate:
+                    return await self.acomplete(messages, max_tokens, client=client, priority=priority,
+                                                function=function)
+
+            return await asyncio.gather(
+                *(one(messages, max_tokens) for messages, max_tokens in calls),
+                return_exceptions=True)
+        return self._loop_thread.run(gather())
+
+
+def client_from_env():
+    if os.getenv('LLM_BACKEND', 'openai') == 'stub':
+        backend = StubBackend(
+            latency=float(os.getenv('STUB_LATENCY', '0.2')),
+            jitter=float(os.getenv('STUB_JITTER', '0')),
+            error_rate=float(os.getenv('STUB_ERROR_RATE', '0')),
+            token_delay=float(os.getenv('STUB_TOKEN_DELAY', '0')),
+        )
+    else:
+        backend = OpenAIBackend(pool_size=int(os.getenv('LLM_POOL_SIZE', '16')))
+    return LLMClient(
+        backend,
+        timeout=float(os.getenv('LLM_TIMEOUT', '30')),
+        max_concurrency=int(os.getenv('LLM_MAX_CONCURRENCY', '8')),
+        max_retries=int(os.getenv('LLM_MAX_RETRIES', '3')),
+        # Per process; 0 leaves a budget unlimited
+        tpm=int(os.getenv('LLM_TPM', '90000')),
+        rpm=int(os.getenv('LLM_RPM', '3500')),
+        client_tpm=int(os.getenv('LLM_CLIENT_TPM', '30000')),
+        queue_timeout=float(os.getenv('LLM_QUEUE_TIMEOUT', '60')),
+    )
@@ -0,0 +1,166 @@
+"""Shrinking the images of a built deck before it is saved.
+
+Pictures are usually drawn far smaller than their pixel size; the logo is
+half an inch high whatever resolution it was uploaded in. optimize() finds
+the largest size each image part is drawn at, in any slide, layout or
+master, downsamples images with more pixels than that needs at the target
+DPI, recompresses PNG and JPEG images, and makes parts with identical bytes
+share one part. Images it cannot measure (picture fills, placeholders that
+inherit their size) are recompressed but not resized; other formats are
+left alone.
+"""
+import hashlib
+import math
+import os
+from io import BytesIO
+from PIL import Image
+from pptx.oxml.ns import qn
+from cache import LRUCache
+
+EMU_PER_INCH = 914400
+FORMATS = {'image/png': 'PNG', 'image/jpeg': 'JPEG'}
+# Resampling an image by less than this is not worth the quality loss
+MIN_SCALE = 0.9
+
+# The same logo is optimized for every deck it goes into; keep the results
+_optimized = LRUCache(
+    max_entries=int(os.getenv('MEDIA_CACHE_ENTRIES', '64')),
+    max_bytes=int(os.getenv('MEDIA_CACHE_BYTES', str(32 * 1024 * 1024))),
+    sizeof=len,
+)
+
+
+def _drawn_size(blip):
+    """(cx, cy) in EMU of the whole image where blip is drawn, or None if the drawing has no size of its own."""
+    blip_fill = blip.getparent()
+    pic = blip_fill.getparent()
+    if pic.tag != qn('p:pic'):
+        return None
+    ext = pic.find(f"{qn('p:spPr')}/{qn('a:xfrm')}/{qn('a:ext')}")
+    if ext is None:
+        return None
+    cx, cy = int(ext.get('cx')), int(ext.get('cy'))
+    # A cropped picture only shows part of the image, so the whole image is drawn bigger
+    crop = blip_fill.find(qn('a:srcRect'))
+    if crop is not None:
+        shown_x = 1 - (int(crop.get('l', 0)) + int(crop.get('r', 0))) / 100000
+        shown_y = 1 - (int(crop.get('t', 0)) + int(crop.get('b', 0))) / 100000
+        if shown_x <= 0 or shown_y <= 0:
+            return None
+        cx, cy = cx / shown_x, cy / shown_y
+    # Groups scale their children by ext / chExt
+    for group in pic.iterancestors(qn('p:grpSp')):
+        xfrm = group.find(f"{qn('p:grpSpPr')}/{qn('a:xfrm')}")
+        ext = xfrm.find(qn('a:ext')) if xfrm is not None else None
+        child_ext = xfrm.find(qn('a:chExt')) if xfrm is not None else None
+        if ext is None or child_ext is None or not int(child_ext.get('cx')) or not int(child_ext.get('cy')):
+            return None
+        cx *= int(ext.get('cx')) / int(child_ext.get('cx'))
+        cy *= int(ext.get('cy')) / int(child_ext.get('cy'))
+    return cx, cy
+
+
+def _image_uses(package):
+    """Image part -> largest (cx, cy) it is drawn at, or None when some use of it has no size."""
+    uses = {}
+    for part in package.iter_parts():
+        element = getattr(part, '_element', None)
+        if element is None:
+            continue
+        for blip in element.iter(qn('a:blip')):
+            rId = blip.get(qn('r:embed'))
+            if not rId or rId not in part.rels:
+                continue
+            image_part = part.related_part(rId)
+            size = _drawn_size(blip)
+            if image_part not in uses:
+                uses[image_part] = size
+            elif uses[image_part] is not None:
+                uses[image_part] = None if size is None else (max(uses[image_part][0], size[0]),
+                                                              max(uses[image_part][1], size[1]))
+    return uses
+
+
+def _pixels_needed(size, dpi):
+    if size is None:
+        return None
+    return math.ceil(size[0] / EMU_PER_INCH * dpi), math.ceil(size[1] / EMU_PER_INCH * dpi)
+
+
+def optimize_image(blob, image_format, needed, jpeg_quality=85):
+    """blob downsampled to at least needed=(width, height) pixels and recompressed; blob itself if that is no smaller."""
+    key = (hashlib.sha1(blob).digest(), image_format, needed, jpeg_quality)
+    cached = _optimized.get(key)
+    if cached is not None:
+        return cached
+    with Image.open(BytesIO(blob)) as img:
+        img.load()
+        info = img.info
+        if needed is not None:
+            scale = max(needed[0] / img.width, needed[1] / img.height)
+            if scale < MIN_SCALE:
+                if img.mode == 'P':
+                    img = img.convert('RGBA')
+                img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+                                 Image.LANCZOS)
+        options = {}
+        if info.get('icc_profile'):
+            options['icc_profile'] = info['icc_profile']
+        if image_format == 'JPEG':
+            options.update(quality=jpeg_quality, optimize=True)
+            if info.get('exif'):
+                options['exif'] = info['exif']
+        else:
+            options['optimize'] = True
+        output = BytesIO()
+        img.save(output, image_format, **options)
+    result = output.getvalue()
+    if len(result) >= len(blob):
+        result = blob
+    return _optimized.put(key, result)
+
+
+def _deduplicate(package, images):
+    """Point every relationship at one part per distinct image; returns the number of parts dropped."""
+    canonical = {}
+    duplicates = {}
+    for part in images:
+        first = canonical.setdefault(hashlib.sha1(part.blob).digest(), part)
+        if first is not part:
+            duplicates[part] = first
+    if not duplicates:
+        return 0
+    for part in list(package.iter_parts()):
+        for rel in part.rels:
+            if not rel.is_external and rel.target_part in duplicates:
+                rel._target = duplicates[rel.target_part]
+                # Cached from the old target
+                for name in ('target_part', 'target_partname', 'target_ref'):
+                    rel.__dict__.pop(name, None)
+    return len(duplicates)
+
+
+def optimize(prs, dpi=150, jpeg_quality=85):
+    """Shrink prs's images in place for drawing at dpi; returns what was done and the bytes saved."""
+    package = prs.part.package
+    uses = _image_uses(package)
+    report = {'images': len(uses), 'resized': 0, 'recompressed': 0,
+              'bytes_before': sum(len(part.blob) for part in uses)}
+    for part, size in uses.items():
+        image_format = FORMATS.get(part.content_type)
+        if image_format is not None:
+            needed = _pixels_needed(size, dpi)
+            try:
+                blob = optimize_image(part.blob, image_format, needed, jpeg_quality)
+            except (OSError, ValueError) as e:
+                print(f"Error optimizing {part.partname}: {str(e)}")
+                blob = part.blob
+            if len(blob) < len(part.blob):
+                with Image.open(BytesIO(part.blob)) as before, Image.open(BytesIO(blob)) as after:
+                    report['resized' if after.size != before.size else 'recompressed'] += 1
+                part._blob = blob
+    report['deduplicated'] = _deduplicate(package, uses)
+    kept = set(package.iter_parts())
+    report['bytes_after'] = sum(len(part.blob) for part in uses if part in kept)
+    report['bytes_saved'] = report['bytes_before'] - report['bytes_after']
+    return report
@@ -0,0 +1,246 @@
+"""Counters, histograms and stage timers, exposed in the Prometheus text format.
+
+Metrics live in the memory of one process. With several server processes
+each one answers /metrics for itself, and work done in the job pool's worker
+processes is not counted here (job-stats covers those).
+
+    with stage('save'):
+        prs.save(out)
+
+records the block's wall time in stage_duration_seconds{stage="save"}.
+Stages may nest, so an outer stage includes the time of the ones inside it.
+"""
+import cProfile
+import hmac
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; wide enough for a cache hit and for a minute-long LLM call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} takes labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._sample_lines(items))
+        return lines
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _sample_lines(self, items):
+        for key, value in items:
+            yield f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _sample_lines(self, items):
+        for key, value in items:
+            yield f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket (not cumulative) counts, then sum and count
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return entry[2] if entry else 0
+
+    def _sample_lines(self, items):
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            yield f'{self.name}_bucket{_format_labels(self.labelnames, key, [("le", "+Inf")])} {count}'
+            yield f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}'
+            yield f'{self.name}_count{_format_labels(self.labelnames, key)} {count}'
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'metric {metric.name} already registered')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+REQUESTS = REGISTRY.counter('http_requests_total', 'HTTP requests handled.', ('method', 'route', 'status'))
+REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_duration_seconds',
+    'Time to produce a response; streamed bodies are sent after this.',
+    ('method', 'route'))
+STAGE_SECONDS = REGISTRY.histogram('stage_duration_seconds', 'Time spent in one stage of a request.', ('stage',))
+SLIDES_RENDERED = REGISTRY.counter('slides_rendered_total', 'Slides added to decks by this process.')
+LLM_REQUESTS = REGISTRY.counter('llm_requests_total', 'Completions requested from the LLM backend.', ('kind',))
+LLM_TOKENS = REGISTRY.counter('llm_tokens_total', 'Tokens used by completions, as reported by the backend.',
+                              ('kind',))
+LLM_QUEUE_DEPTH = REGISTRY.gauge('llm_queue_depth', 'Completions waiting for the LLM scheduler.', ('priority',))
+LLM_QUEUE_SECONDS = REGISTRY.histogram('llm_queue_wait_seconds', 'Time a completion waited for the LLM scheduler.',
+                                       ('priority',))
+LLM_COALESCED = REGISTRY.counter('llm_coalesced_total', 'Completions answered by an identical call already in flight.')
+MALFORMED_SLIDES = REGISTRY.counter('generation_malformed_slides_total',
+                                    'Generated slides that were malformed or missing, by how they were fixed.',
+                                    ('outcome',))
+MEDIA_BYTES_SAVED = REGISTRY.counter('media_bytes_saved_total', 'Image bytes removed from saved decks by media optimization.')
+CACHE_LOOKUPS = REGISTRY.counter('cache_lookups_total', 'Cache lookups by cache and result.', ('cache', 'result'))
+
+
+def stage(name):
+    """Context manager timing a block into stage_duration_seconds{stage=name}."""
+    return STAGE_SECONDS.time(stage=name)
+
+
+def cache_lookup(cache, hit):
+    CACHE_LOOKUPS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def render():
+    return REGISTRY.render()
+
+
+class RequestProfiler:
+    """Opt-in cProfile dumps of single requests.
+
+    A request whose profile header equals token is run under cProfile and
+    its stats are written to folder as a .prof file (load it with pstats or
+    snakeviz). Without a token nothing is ever profiled. Only one request is
+    profiled at a time; others asking meanwhile run normally.
+    """
+
+    def __init__(self, folder, token):
+        self.folder = folder
+        self.token = token
+        self._busy = threading.Lock()
+
+    def start(self, header_value):
+        """A running cProfile.Profile if this request should be profiled, else None."""
+        if not self.token or not header_value or not hmac.compare_digest(header_value.encode(), self.token.encode()):
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def finish(self, profiler, label):
+        """Stop profiler and write its stats; returns the file name."""
+        try:
+            profiler.disable()
+            os.makedirs(self.folder, exist_ok=True)
+            name = '%d-%s-%d.prof' % (time.time() * 1000, re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_'), os.getpid())
+            profiler.dump_stats(os.path.join(self.folder, name))
+            return name
+        finally:
+            self._busy.release()
@@ -0,0 +1,267 @@
+"""Fair-share scheduling of completion calls under the OpenAI rate limits.
+
+Every call asks the scheduler for a slot before it goes upstream. A slot is
+granted when a concurrency slot is free and the call's estimated tokens fit
+in three token buckets: the global tokens-per-minute and requests-per-minute
+budgets and the budget of the client that made the call. Waiting calls are
+queued per priority (interactive before bulk) and, within a priority, per
+client; clients take turns, so one client with a hundred queued slide calls
+does not hold up another client's single call. A client that has used its
+own budget waits while other clients go ahead.
+
+The scheduler runs on the LLM client's event loop and is not thread safe,
+except for stats(). Budgets are per process: with several server processes
+divide the account's limits between them.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+import metrics
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+PRIORITIES = (INTERACTIVE, BULK)
+
+
+class SchedulerBusy(Exception):
+    """A call waited longer than the scheduler's queue timeout."""
+
+
+def estimate_tokens(messages, max_tokens, function=None):
+    """Rough cost of a completion: about four characters per prompt token, plus the whole reply budget.
+
+    A function definition is sent with the prompt and counts as prompt text.
+    """
+    prompt = sum(len(message.get('content') or '') for message in messages)
+    if function is not None:
+        prompt += len(json.dumps(function))
+    return prompt // 4 + (max_tokens or 0)
+
+
+class TokenBucket:
+    """per_minute units, refilled continuously; a full minute's worth can be spent at once."""
+
+    def __init__(self, per_minute, now):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = now
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount, now):
+        """Seconds until amount is available; amounts above capacity only need a full bucket."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def give(self, amount):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class Ticket:
+    __slots__ = ('client', 'priority', 'cost', 'future', 'enqueued', 'charged')
+
+    def __init__(self, client, priority, cost, future, enqueued):
+        self.client = client
+        self.priority = priority
+        self.cost = cost
+        self.future = future
+        self.enqueued = enqueued
+        self.charged = 0
+
+
+class FairScheduler:
+    def __init__(self, max_concurrency, tpm=0, rpm=0, client_tpm=0, queue_timeout=60.0, clock=time.monotonic):
+        """tpm, rpm and client_tpm of 0 leave that budget unlimited."""
+        self.max_concurrency = max_concurrency
+        self.client_tpm = client_tpm
+        self.queue_timeout = queue_timeout
+        self.clock = clock
+        now = clock()
+        self._tpm = TokenBucket(tpm, now) if tpm else None
+        self._rpm = TokenBucket(rpm, now) if rpm else None
+        self._clients = {}
+        # priority -> client -> deque of waiting tickets; client order is the round-robin order
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}
+        self._running = 0
+        self._timer = None
+        self._lock = threading.Lock()
+        self.granted = 0
+        self.timed_out = 0
+        self._waits = {priority: [0, 0.0, 0.0] for priority in PRIORITIES}
+
+    def _client_bucket(self, client, now):
+        if not self.client_tpm:
+            return None
+        bucket = self._clients.get(client)
+        if bucket is None:
+            bucket = self._clients[client] = TokenBucket(self.client_tpm, now)
+        return bucket
+
+    def _forget_idle_clients(self, now):
+        # A full bucket is the same as no bucket
+        for client, bucket in list(self._clients.items()):
+            bucket._refill(now)
+            if bucket.level >= bucket.capacity:
+                del self._clients[client]
+
+    def _next(self, now):
+        """(ticket, 0) for the next call to start, or (None, seconds until one might)."""
+        wait = None
+        for priority in PRIORITIES:
+            for client, tickets in self._queues[priority].items():
+                ticket = tickets[0]
+                bucket = self._client_bucket(client, now)
+                delay = bucket.delay(ticket.cost, now) if bucket is not None else 0.0
+                if delay > 0:
+                    # Out of its own budget: the next client's turn
+                    wait = delay if wait is None else min(wait, delay)
+                    continue
+                delay = max(self._tpm.delay(ticket.cost, now) if self._tpm is not None else 0.0,
+                            self._rpm.delay(1, now) if self._rpm is not None else 0.0)
+                if delay > 0:
+                    # Global budget: nobody else may overtake, or big calls would starve
+                    return None, delay
+                return ticket, 0.0
+        return None, wait
+
+    def _pop(self, ticket):
+        queue = self._queues[ticket.priority]
+        tickets = queue[ticket.client]
+        tickets.popleft()
+        if tickets:
+            queue.move_to_end(ticket.client)
+        else:
+            del queue[ticket.client]
+
+    def _dispatch(self):
+        self._timer = None
+        now = self.clock()
+        with self._lock:
+            while self._running < self.max_concurrency:
+                ticket, wait = self._next(now)
+                if ticket is None:
+                    if wait is not None:
+                        self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                    break
+                self._pop(ticket)
+                self._grant(ticket, now)
+            self._forget_idle_clients(now)
+            self._publish_depth()
+
+    def _grant(self, ticket, now):
+        for bucket in (self._tpm, self._client_bucket(ticket.client, now)):
+            if bucket is not None:
+                bucket.take(ticket.cost, now)
+        if self._rpm is not None:
+            self._rpm.take(1, now)
+        ticket.charged = ticket.cost
+        self._running += 1
+        self.granted += 1
+        waited = now - ticket.enqueued
+        entry = self._waits[ticket.priority]
+        entry[0] += 1
+        entry[1] += waited
+        entry[2] = max(entry[2], waited)
+        metrics.LLM_QUEUE_SECONDS.observe(waited, priority=ticket.priority)
+        ticket.future.set_result(None)
+
+    def _publish_depth(self):
+        for priority, queue in self._queues.items():
+            metrics.LLM_QUEUE_DEPTH.set(sum(len(tickets) for tickets in queue.values()), priority=priority)
+
+    def _wake(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._dispatch()
+
+    def _withdraw(self, ticket):
+        with self._lock:
+            tickets = self._queues[ticket.priority].get(ticket.client)
+            if tickets is not None and ticket in tickets:
+                tickets.remove(ticket)
+                if not tickets:
+                    del self._queues[ticket.priority][ticket.client]
+                self._publish_depth()
+
+    def settle(self, ticket, tokens):
+        """Give back what a finished call was charged beyond the tokens it really used."""
+        refund = ticket.charged - tokens
+        if tokens <= 0 or refund <= 0:
+            return
+        ticket.charged = tokens
+        for bucket in (self._tpm, self._clients.get(ticket.client)):
+            if bucket is not None:
+                bucket.give(refund)
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, client, priority, cost):
+        """Wait for a turn; the body runs while holding one concurrency slot and cost tokens.
+
+        Raises SchedulerBusy after queue_timeout seconds in the queue.
+        """
+        if priority not in self._queues:
+            raise ValueError(f'unknown priority {priority!r}')
+        loop = asyncio.get_running_loop()
+        ticket = Ticket(client, priority, cost, loop.create_future(), self.clock())
+        with self._lock:
+            self._queues[priority].setdefault(client, deque()).append(ticket)
+        self._wake()
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), self.queue_timeout or None)
+        except asyncio.TimeoutError:
+            self._withdraw(ticket)
+            # Granted just as the wait ran out: take the slot after all
+            if not ticket.future.done():
+                ticket.future.cancel()
+                self.timed_out += 1
+                raise SchedulerBusy(f'no LLM capacity within {self.queue_timeout:g}s')
+        except BaseException:
+            self._withdraw(ticket)
+            if ticket.future.done():
+                self._release()
+            else:
+                ticket.future.cancel()
+            raise
+        try:
+            yield ticket
+        finally:
+            self._release()
+
+    def _release(self):
+        with self._lock:
+            self._running -= 1
+        self._wake()
+
+    def stats(self):
+        with self._lock:
+            queued = {priority: sum(len(tickets) for tickets in queue.values())
+                      for priority, queue in self._queues.items()}
+            return {
+                'running': self._running,
+                'concurrency': self.max_concurrency,
+                'queued': queued,
+                'waiting_clients': len({client for queue in self._queues.values() for client in queue}),
+                'granted': self.granted,
+                'timed_out': self.timed_out,
+                'wait_seconds': {
+                    priority: {'count': count, 'mean': total / count if count else 0.0, 'max': longest}
+                    for priority, (count, total, longest) in self._waits.items()
+                },
+                'budgets': {
+                    'tpm': self._tpm.capacity if self._tpm is not None else None,
+                    'rpm': self._rpm.capacity if self._rpm is not None else None,
+                    'client_tpm': self.client_tpm or None,
+                },
+            }
@@ -0,0 +1,135 @@
+"""Production server: pre-forked werkzeug workers sharing one listening socket.
+
+The parent imports the app and the modules it otherwise loads on first use
+(python-pptx, lxml, PIL, openai), builds the default slide templates, the
+static assets and a pool of blank presentations, opens the socket and only
+then forks, so every worker starts warm and shares those pages with the
+parent. Each worker serves requests on threads. Workers that die are
+replaced; SIGTERM or Ctrl-C stops them all.
+
+    python serve.py [--host 0.0.0.0] [--port 5001] [--workers 4] [--no-threads]
+
+Platforms without fork() get a single threaded server. Uploads, deck
+session state, job status and results, and the completion cache are shared
+by all workers through the storage backend, which STORAGE_URL picks (see
+storage.py): on this host by default, across hosts with Redis, where
+built decks and slide text are shared too. Still per worker: the
+in-process LRU layers in front of it (decks, upload text, assets, slide
+templates), the live copy of each deck session, LLM rate budgets, and
+/metrics.
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+
+RESTART_DELAY = 1.0
+
+
+def preload():
+    """Import and warm everything a request would otherwise pay for first."""
+    from PIL import Image
+    # Imported by the app on first use; here they are loaded once and shared by the workers
+    import aiohttp
+    import openai
+    import deck
+    import deck_append
+    import server
+    Image.init()
+    # Templates for the default colour scheme; other schemes are built on first use
+    deck.deck_renderer(deck.PresentationPool.build(), {}, {})
+    deck.presentation_pool.fill()
+    return server.app
+
+
+def listen(host, port, backlog=1024):
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, host, sock, threaded):
+    from werkzeug.serving import make_server
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    httpd = make_server(host, 0, app, threaded=threaded, fd=sock.fileno())
+    try:
+        httpd.serve_forever()
+    finally:
+        os._exit(0)
+
+
+class Supervisor:
+    def __init__(self, app, host, sock, workers, threaded):
+        self.app = app
+        self.host = host
+        self.sock = sock
+        self.workers = workers
+        self.threaded = threaded
+        self.children = set()
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(self.app, self.host, self.sock, self.threaded)
+        self.children.add(pid)
+
+    def stop(self, signum=None, frame=None):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            self.children.discard(pid)
+            if not self.stopping:
+                print(f"Worker {pid} exited with status {status}, starting a new one")
+                time.sleep(RESTART_DELAY)
+                self.spawn()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default=os.getenv('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', '5001')))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_WORKERS', '0')) or os.cpu_count() or 1)
+    parser.add_argument('--no-threads', dest='threaded', action='store_false',
+                        help='one request at a time per worker')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    app = preload()
+    print(f"Preloaded in {time.perf_counter() - started:.2f}s")
+    if not hasattr(os, 'fork'):
+        from werkzeug.serving import run_simple
+        print(f"Serving on http://{args.host}:{args.port} (no fork on this platform, one process)")
+        run_simple(args.host, args.port, app, threaded=True)
+        return
+    sock = listen(args.host, args.port)
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} worker(s)")
+    Supervisor(app, args.host, sock, args.workers, args.threaded).run()
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,35 @@
-from flask import Flask, request, jsonify, send_file, send_from_directory
+from flask import Flask, Request, Response, g, has_request_context, request, jsonify, send_file, send_from_directory
 from flask_cors import CORS
 import os
 from dotenv import load_dotenv
-import openai
-from pptx import Presentation
-from pptx.util import Inches, Pt
-from pptx.enum.text import PP_ALIGN
-from pptx.dml.color import RGBColor
-import tempfile
-import shutil
+import atexit
+import hashlib
 import json
+import multiprocessing
 import re
-import base64
+import tempfile
+import time
 from io import BytesIO
-from PIL import Image
-from pptx.enum.text import MSO_VERTICAL_ANCHOR
+from assets import asset_cache_stats
+from cache import LRUCache
+from upload_cache import UploadCache
+from upload_store import UnknownUpload, UploadStore, UploadTooLarge
+from llm import LLMBusy, LLMTimeout, client_from_env
+from scheduler import BULK, INTERACTIVE
+from completion_cache import CompletionCache, SharedCompletionCache
+from jobs import DONE, FAILED, JobManager, JobQueueFull
+from batch import run_pipeline, stream_zip
+from sessions import DeckSession, SessionError, SessionStore
+import metrics
+from metrics import RequestProfiler, cache_lookup, stage
+from static_assets import StaticAssets
+from storage import StorageError, storage_from_env
+from generation import (
+    PRESENTATION_JSON_MAX_TOKENS, SLIDE_FUNCTION, SLIDE_JSON_MAX_TOKENS, SLIDE_MAX_TOKENS, SLIDES_FUNCTION,
+    JsonSlideStreamParser, SlideStreamParser, outline_max_tokens, outline_messages, parse_json_slide, parse_outline,
+    parse_points, parse_slides, presentation_json_messages, presentation_messages, repair_slide,
+    requested_slide_count, slide_json_messages, slide_messages, slide_title, title_hint,
+)
 
 # Load environment variables
 load_dotenv()
@@ -22,60 +37,407 @@ load_dotenv()
 app = Flask(__name__, static_folder='sliding')
 CORS(app)
 
-# Configure OpenAI
-openai.api_key = os.getenv('OPENAI_API_KEY')
-if not openai.api_key:
+# Requests sent with "X-Profile: <PROFILE_TOKEN>" are run under cProfile and dumped to PROFILE_FOLDER;
+# unset PROFILE_TOKEN (the default) turns profiling off
+request_profiler = RequestProfiler(os.getenv('PROFILE_FOLDER', 'profiles'), os.getenv('PROFILE_TOKEN'))
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.profiler = request_profiler.start(request.headers.get('X-Profile'))
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, method=request.method, route=route)
+    metrics.REQUESTS.inc(method=request.method, route=route, status=response.status_code)
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        response.headers['X-Profile-File'] = request_profiler.finish(profiler, f'{request.method} {route}')
+    return response
+
+@app.teardown_request
+def stop_request_profiler(error=None):
+    # Only still set when after_request never ran (an unhandled exception)
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        request_profiler.finish(profiler, 'failed ' + request.path)
+
+# python-pptx (deck.py, deck_append.py) and openai (llm.py) are imported by the code that first
+# needs them, so the app starts without them and serve.py loads them before forking
+if not os.getenv('OPENAI_API_KEY'):
     print("Warning: OPENAI_API_KEY not found in environment variables")
 
+# Pooled, rate-limit aware completion client (LLM_BACKEND=stub for offline use). Calls are
+# scheduled fairly between clients within the LLM_TPM / LLM_RPM / LLM_CLIENT_TPM budgets
+llm_client = client_from_env()
+atexit.register(llm_client.close)
+# Clients are told apart by address; behind a proxy name the header carrying the real one
+LLM_CLIENT_HEADER = os.getenv('LLM_CLIENT_HEADER')
+
 UPLOAD_FOLDER = 'uploads'
+UPLOAD_STORE_FOLDER = os.getenv('UPLOAD_STORE_FOLDER', os.path.join(UPLOAD_FOLDER, 'store'))
+# Uploads, deck sessions, job results and the shared caches below live in a storage backend: by
+# default SQLite and files in UPLOAD_STORE_FOLDER, shared by the processes of this host.
+# STORAGE_URL=redis://host:port/db shares them between hosts, so any node can serve any request
+storage = storage_from_env(UPLOAD_STORE_FOLDER)
+# Built decks and slide text are also kept in the storage backend for SHARED_CACHE_TTL seconds,
+# where other nodes find them; on by default only when the backend is remote (0 turns it off)
+SHARED_CACHE_TTL = float(os.getenv('SHARED_CACHE_TTL', '3600' if storage.remote else '0'))
+
+# Completions for repeated topics, shared by all workers on the host (or, with a remote storage
+# backend, by every host). COMPLETION_CACHE_BYTES=0 disables it; COMPLETION_CACHE_FUZZY=0.8 also
+# serves near-duplicate topics
+CACHE_FOLDER = os.getenv('CACHE_FOLDER', 'cache')
+COMPLETION_CACHE_BYTES = int(os.getenv('COMPLETION_CACHE_BYTES', str(64 * 1024 * 1024)))
+COMPLETION_CACHE_TTL = float(os.getenv('COMPLETION_CACHE_TTL', str(7 * 24 * 3600)))
+COMPLETION_CACHE_FUZZY = float(os.getenv('COMPLETION_CACHE_FUZZY', '0')) or None
+completion_cache = None
+if COMPLETION_CACHE_BYTES and storage.remote:
+    # Sized by the server's maxmemory instead of COMPLETION_CACHE_BYTES
+    completion_cache = SharedCompletionCache(storage, ttl=COMPLETION_CACHE_TTL, fuzzy_threshold=COMPLETION_CACHE_FUZZY)
+elif COMPLETION_CACHE_BYTES:
+    completion_cache = CompletionCache(
+        os.path.join(CACHE_FOLDER, 'completions.sqlite3'),
+        ttl=COMPLETION_CACHE_TTL,
+        max_bytes=COMPLETION_CACHE_BYTES,
+        fuzzy_threshold=COMPLETION_CACHE_FUZZY,
+    )
+
+# Uploads are stored by content hash and addressed by opaque ids; filenames only label them
+UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', str(512 * 1024 * 1024)))
+upload_store = UploadStore(UPLOAD_STORE_FOLDER, storage, max_bytes=UPLOAD_MAX_BYTES)
+
+class UploadRequest(Request):
+    """Request whose multipart file parts stream straight into the upload store, hashed as they arrive."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return upload_store.temp_file()
+
+app.request_class = UploadRequest
+
+# Two-phase generation: decks of at least PARALLEL_MIN_SLIDES numeric slides (or
+# requests with mode='parallel') get an outline call followed by per-slide calls,
+# GENERATION_FANOUT of them in flight at once
+PARALLEL_MIN_SLIDES = int(os.getenv('PARALLEL_MIN_SLIDES', '8'))
+GENERATION_FANOUT = int(os.getenv('GENERATION_FANOUT', '6'))
+# Slides are requested as JSON function arguments checked against a schema, so a malformed
+# slide is repaired or re-requested on its own; GENERATION_FORMAT=text (or "outputFormat":
+# "text" in a request) asks for the older 'Title: Content' lines
+GENERATION_FORMAT = os.getenv('GENERATION_FORMAT', 'json')
+# Batch generation: decks in flight at once, and how many of them may render concurrently
+BATCH_MAX_DECKS = int(os.getenv('BATCH_MAX_DECKS', '100'))
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', '8'))
+BATCH_RENDER_WORKERS = int(os.getenv('BATCH_RENDER_WORKERS', '2'))
+
+PPTX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
+# Decks up to STREAM_THRESHOLD are sent in one piece with a Content-Length,
+# bigger ones are streamed from the spool in STREAM_CHUNK_SIZE chunks
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_THRESHOLD = int(os.getenv('DECK_STREAM_THRESHOLD', str(8 * 1024 * 1024)))
+SPOOL_MAX_MEMORY = int(os.getenv('DECK_SPOOL_MAX_MEMORY', str(32 * 1024 * 1024)))
+# Content-addressed cache of built decks, set DECK_CACHE_BYTES=0 to disable
+DECK_CACHE_BYTES = int(os.getenv('DECK_CACHE_BYTES', str(64 * 1024 * 1024)))
+# Uploaded decks of at least APPEND_STREAM_MIN_BYTES are not loaded to save on top of them:
+# their ZIP members are copied through and only the new slides are written (0 = always)
+APPEND_STREAM_MIN_BYTES = int(os.getenv('APPEND_STREAM_MIN_BYTES', str(16 * 1024 * 1024)))
+# Images of a saved deck can be downsampled to MEDIA_DPI at their drawn size, recompressed and
+# deduplicated: smaller files for a slower save. Per request with "optimizeMedia": true, or for
+# every save with MEDIA_OPTIMIZE=1
+MEDIA_OPTIMIZE = os.getenv('MEDIA_OPTIMIZE', '0') == '1'
+MEDIA_DPI = int(os.getenv('MEDIA_DPI', '150'))
+MEDIA_JPEG_QUALITY = int(os.getenv('MEDIA_JPEG_QUALITY', '85'))
+deck_output_cache = LRUCache(max_entries=256, max_bytes=DECK_CACHE_BYTES, sizeof=len)
+# Decks held in memory for incremental edits, dropped after DECK_SESSION_TTL idle seconds. Their
+# state is kept in the storage backend, so another process can rebuild one it does not hold
+deck_sessions = SessionStore(
+    max_sessions=int(os.getenv('DECK_SESSION_MAX', '64')),
+    idle_ttl=float(os.getenv('DECK_SESSION_TTL', '3600')),
+    storage=storage,
+    restore=lambda state: restore_session(state),
+)
+
+# The front end is served from memory with ETags, gzip/brotli variants and versioned URLs
+static_assets = StaticAssets(app.static_folder, reload=os.getenv('STATIC_RELOAD', '0') == '1')
 
 @app.route('/')
 def serve_index():
-    return send_from_directory(app.static_folder, 'index.html')
+    return static_assets.response('index.html', request) or send_from_directory(app.static_folder, 'index.html')
 
 @app.route('/<path:path>')
 def serve_static(path):
-    return send_from_directory(app.static_folder, path)
+    return static_assets.response(path, request) or send_from_directory(app.static_folder, path)
 
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
-    if 'file' not in request.files:
+    # Refuse oversized bodies before reading them; chunked ones are cut off while streaming
+    if request.content_length and request.content_length > UPLOAD_MAX_BYTES:
+        return jsonify({'error': f'File too large (max {UPLOAD_MAX_BYTES} bytes)'}), 413
+    try:
+        files = request.files
+    except UploadTooLarge:
+        return jsonify({'error': f'File too large (max {UPLOAD_MAX_BYTES} bytes)'}), 413
+
+    if 'file' not in files:
         return jsonify({'error': 'No file part'}), 400
     
-    file = request.files['file']
+    file = files['file']
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
     
     if file and file.filename.endswith(('.ppt', '.pptx')):
-        filename = os.path.join(UPLOAD_FOLDER, file.filename)
-        file.save(filename)
-        return jsonify({'message': 'File uploaded successfully', 'filename': file.filename})
+        record = upload_store.commit(file.stream, file.filename)
+        return jsonify({
+            'message': 'File uploaded successfully',
+            'filename': file.filename,
+            'uploadId': record['uploadId'],
+            'size': record['size'],
+            'deduplicated': record['deduplicated'],
+        })
     
     return jsonify({'error': 'Invalid file type'}), 400
 
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def release_upload(upload_id):
+    """Drop an upload id; the stored deck goes once no other id refers to it."""
+    try:
+        removed_path = upload_store.release(upload_id)
+    except UnknownUpload:
+        return jsonify({'error': 'Upload not found'}), 404
+    if removed_path:
+        upload_cache.invalidate(removed_path)
+    return '', 204
+
+def uploaded_deck_path(data):
+    """Path of the uploaded deck a payload builds on, or None for a new deck.
+
+    That is the deck of its uploadId, or else a file of the same name in UPLOAD_FOLDER
+    (uploads made before the upload store existed). Raises UnknownUpload for unknown ids.
+    """
+    upload_id = data.get('uploadId')
+    if upload_id:
+        path = upload_store.path(upload_id)
+        if path is None:
+            raise UnknownUpload(upload_id)
+        return path
+    path = os.path.join(UPLOAD_FOLDER, data.get('filename') or 'presentation.pptx')
+    return path if os.path.isfile(path) else None
+
+def cache_bypassed(data):
+    """True when the caller asked for a fresh completion via header or JSON flag."""
+    header = request.headers.get('X-Cache-Bypass', '').lower()
+    return header in ('1', 'true', 'yes') or bool((data or {}).get('noCache'))
+
+def llm_client_id():
+    """Who the current request's completions are charged to in the scheduler."""
+    if LLM_CLIENT_HEADER:
+        value = request.headers.get(LLM_CLIENT_HEADER, '').split(',')[0].strip()
+        if value:
+            return value
+    return request.remote_addr or 'local'
+
+def llm_busy_response(e, message):
+    print(f"{message}: {str(e)}")
+    response = jsonify({'error': f'{message}: the service is busy, try again shortly'})
+    response.headers['Retry-After'] = '10'
+    return response, 429
+
+def cached_completion(kind, messages, max_tokens, topic, slide_count='', bypass=False, client=None, priority=BULK,
+                      function=None):
+    """Completion text for messages, served from the completion cache when possible.
+
+    A bypassed request skips the lookup but still stores its fresh result. client and
+    priority place the call in the LLM scheduler; with a function the text is its JSON arguments.
+    """
+    model = llm_client.model
+    if completion_cache is not None and not bypass:
+        cached = completion_cache.get(kind, messages, model, max_tokens, slide_count, topic)
+        cache_lookup('completion', cached is not None)
+        if cached is not None:
+            return cached
+    with stage('llm'):
+        result = llm_client.complete(messages, max_tokens, client=client, priority=priority, function=function)
+    metrics.LLM_REQUESTS.inc(kind=kind)
+    metrics.LLM_TOKENS.inc(result.total_tokens, kind=kind)
+    text = result.text
+    if completion_cache is not None:
+        completion_cache.put(kind, messages, model, max_tokens, text, slide_count, topic)
+    return text
+
 @app.route('/api/generate-content', methods=['POST'])
 def generate_content():
-    if not openai.api_key:
+    if not llm_client.configured:
         return jsonify({'error': 'OpenAI API key not configured'}), 500
 
     data = request.json
     title = data.get('title', '')
     
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
+        content = cached_completion(
+            'content',
             messages=[
                 {"role": "system", "content": "You are a helpful assistant that creates concise bullet points for presentations. Each bullet point should have a short title and brief content (maximum 2 lines) separated by a colon. Never generate more than 5 bullet points."},
                 {"role": "user", "content": f"Create 3-5 brief bullet points for a presentation about: {title}. Format each point as 'Title: Content'. Keep content concise and to the point."}
             ],
-            max_tokens=150  # Limit response length
+            max_tokens=150,  # Limit response length
+            topic=title,
+            bypass=cache_bypassed(data),
+            client=llm_client_id(),
+            # Short and someone is waiting on it: ahead of deck generation
+            priority=INTERACTIVE
         )
-        content = response.choices[0].message.content
         return jsonify({'content': content})
+    except LLMBusy as e:
+        return llm_busy_response(e, 'Failed to generate content')
+    except LLMTimeout as e:
+        print(f"Error generating content: {str(e)}")
+        return jsonify({'error': 'Content generation timed out'}), 504
     except Exception as e:
         print(f"Error generating content: {str(e)}")
         return jsonify({'error': 'Failed to generate content'}), 500
 
+def cached_completions(kind, calls, max_tokens, bypass=False, limit=None, client=None, function=None):
+    """Texts for several (messages, topic) calls; cache misses run concurrently, limit at a time.
+
+    A call that still fails after the client's retries yields None.
+    """
+    model = llm_client.model
+    texts = [None] * len(calls)
+    missing = []
+    for i, (messages, topic) in enumerate(calls):
+        if completion_cache is not None and not bypass:
+            texts[i] = completion_cache.get(kind, messages, model, max_tokens, '', topic)
+            cache_lookup('completion', texts[i] is not None)
+        if texts[i] is None:
+            missing.append(i)
+    with stage('llm'):
+        results = llm_client.complete_many([(calls[i][0], max_tokens) for i in missing], limit=limit, client=client,
+                                           function=function)
+    metrics.LLM_REQUESTS.inc(len(missing), kind=kind)
+    for i, result in zip(missing, results):
+        if isinstance(result, Exception):
+            print(f"Error generating {kind} {i + 1}: {str(result)}")
+            continue
+        metrics.LLM_TOKENS.inc(result.total_tokens, kind=kind)
+        texts[i] = result.text
+        if completion_cache is not None:
+            completion_cache.put(kind, calls[i][0], model, max_tokens, result.text, '', calls[i][1])
+    return texts
+
+def use_parallel_generation(mode, slide_count):
+    """Two-phase generation for explicit requests, or automatically for long numeric decks."""
+    count = requested_slide_count(slide_count)
+    if count is None or mode == 'single':
+        return False
+    return mode == 'parallel' or count >= PARALLEL_MIN_SLIDES
+
+def structured_output(data):
+    """True unless the payload or GENERATION_FORMAT asks for the 'Title: Content' line format."""
+    return (data or {}).get('outputFormat', GENERATION_FORMAT) != 'text'
+
+def rerequest_slides(wanted, topic, count, bypass=False, client=None):
+    """{index: slide} for (index, title or None) slides asked for again one by one, concurrently.
+
+    A slide that is still malformed after its re-request is left out.
+    """
+    calls = [(slide_json_messages(topic, title, index + 1, count), '') for index, title in wanted]
+    texts = cached_completions('slide', calls, SLIDE_JSON_MAX_TOKENS, bypass=bypass, limit=GENERATION_FANOUT,
+                               client=client, function=SLIDE_FUNCTION)
+    slides = {}
+    with stage('parse'):
+        for (index, title), text in zip(wanted, texts):
+            slide = parse_json_slide(text or '', index, title)
+            metrics.MALFORMED_SLIDES.inc(outcome='rerequested' if slide is not None else 'dropped')
+            if slide is None:
+                print(f"Dropping slide {index + 1} about {topic!r}: still malformed after a re-request")
+            else:
+                slides[index] = slide
+    return slides
+
+def structured_slides(chunks, topic, slide_count, bypass=False, client=None):
+    """Slides, in order, from an emit_slides reply arriving in chunks.
+
+    A slide is yielded as soon as its object closes. One that is malformed or
+    cut off is repaired if possible, else re-requested on its own before the
+    stream moves on; slides missing from the end of a numeric deck are
+    requested together at the end. A reply that is a single slide object
+    counts as its first slide; one without any JSON slides is parsed as
+    'Title: Content' text.
+    """
+    parser = JsonSlideStreamParser()
+    count = requested_slide_count(slide_count)
+
+    def resolve(item):
+        if item.slide is not None:
+            return item.slide
+        slide = repair_slide(item.raw, item.index)
+        if slide is not None:
+            metrics.MALFORMED_SLIDES.inc(outcome='repaired')
+            return slide
+        print(f"Slide {item.index + 1} about {topic!r} is malformed ({item.error}), asking for it again")
+        total = max(count or 0, item.index + 1)
+        return rerequest_slides([(item.index, title_hint(item.raw))], topic, total, bypass, client).get(item.index)
+
+    for chunk in chunks:
+        for item in parser.feed(chunk):
+            slide = resolve(item)
+            if slide is not None:
+                yield slide
+    for item in parser.close():
+        slide = resolve(item)
+        if slide is not None:
+            yield slide
+    if not parser.found:
+        yield from parse_slides(parser.text)
+        return
+    missing = [(index, None) for index in range(parser.elements, count or 0)]
+    if missing:
+        slides = rerequest_slides(missing, topic, count, bypass, client)
+        for index, _ in missing:
+            if index in slides:
+                yield slides[index]
+
+def generate_slides_single(topic, slide_count, bypass=False, client=None, structured=True):
+    """The whole deck from one completion."""
+    if not structured:
+        text = cached_completion('presentation', presentation_messages(topic, slide_count), 1000, topic=topic,
+                                 slide_count=slide_count, bypass=bypass, client=client)
+        with stage('parse'):
+            return parse_slides(text)
+    text = cached_completion('presentation', presentation_json_messages(topic, slide_count),
+                             PRESENTATION_JSON_MAX_TOKENS, topic=topic, slide_count=slide_count, bypass=bypass,
+                             client=client, function=SLIDES_FUNCTION)
+    return list(structured_slides([text], topic, slide_count, bypass, client))
+
+def generate_slides_parallel(topic, count, bypass=False, client=None, structured=True):
+    """Outline first, then every slide's bullet points concurrently, assembled in outline order."""
+    outline = cached_completion('outline', outline_messages(topic, count), outline_max_tokens(count),
+                                topic=topic, slide_count=count, bypass=bypass, client=client)
+    with stage('parse'):
+        titles = parse_outline(outline, count)
+    if not structured:
+        # Per-slide entries are exact-match only: near-duplicate slide titles are not interchangeable
+        calls = [(slide_messages(topic, title, i + 1, len(titles)), '') for i, title in enumerate(titles)]
+        texts = cached_completions('slide', calls, SLIDE_MAX_TOKENS, bypass=bypass, limit=GENERATION_FANOUT,
+                                   client=client)
+        with stage('parse'):
+            return [
+                {"title": slide_title(i + 1, title), "content": parse_points(text or '')}
+                for i, (title, text) in enumerate(zip(titles, texts))
+            ]
+    calls = [(slide_json_messages(topic, title, i + 1, len(titles)), '') for i, title in enumerate(titles)]
+    texts = cached_completions('slide', calls, SLIDE_JSON_MAX_TOKENS, bypass=bypass, limit=GENERATION_FANOUT,
+                               client=client, function=SLIDE_FUNCTION)
+    with stage('parse'):
+        slides = [parse_json_slide(text or '', i, title) for i, (title, text) in enumerate(zip(titles, texts))]
+    # Only the malformed ones again, past the cache that may hold them
+    retry = [(i, titles[i]) for i, slide in enumerate(slides) if slide is None]
+    fixed = rerequest_slides(retry, topic, len(titles), True, client) if retry else {}
+    return [
+        slide or fixed.get(i) or {"title": slide_title(i + 1, titles[i]), "content": []}
+        for i, slide in enumerate(slides)
+    ]
+
 @app.route('/api/generate-presentation', methods=['POST'])
 def generate_presentation():
     try:
@@ -83,480 +445,634 @@ def generate_presentation():
         content = data.get('content', '')
         slide_count = data.get('slideCount', 'brief')
         
-        # Generate content using OpenAI
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a presentation content generator. Create structured content for slides based on the given topic. Each slide should have a title and 3-5 bullet points. Format each point as 'Title: Content'."},
-                {"role": "user", "content": f"Create content for a {slide_count} presentation about: {content}. Include {slide_count} slides with 3-5 bullet points each."}
-            ],
-            max_tokens=1000
-        )
-        
-        generated_content = response.choices[0].message.content
-        
-        # Process the generated content into slides
-        slides = []
-        current_slide = {"title": "", "content": []}
-        
-        for line in generated_content.split('\n'):
-            line = line.strip()
-            if not line:
-                continue
-                
-            if line.startswith('Slide') or line.startswith('#'):
-                if current_slide["title"]:
-                    slides.append(current_slide)
-                current_slide = {"title": line, "content": []}
-            elif ':' in line:
-                title, content = line.split(':', 1)
-                current_slide["content"].append({
-                    "title": title.strip(),
-                    "content": content.strip()
-                })
-        
-        if current_slide["title"]:
-            slides.append(current_slide)
+        if use_parallel_generation(data.get('mode', 'auto'), slide_count):
+            slides = generate_slides_parallel(content, requested_slide_count(slide_count), cache_bypassed(data),
+                                              llm_client_id(), structured_output(data))
+        else:
+            # Generate content using OpenAI
+            slides = generate_slides_single(content, slide_count, cache_bypassed(data), llm_client_id(),
+                                            structured_output(data))
         
         return jsonify({"slides": slides})
         
+    except LLMBusy as e:
+        return llm_busy_response(e, 'Failed to generate presentation')
+    except LLMTimeout as e:
+        print(f"Error generating presentation: {str(e)}")
+        return jsonify({'error': f'Failed to generate presentation: {str(e)}'}), 504
     except Exception as e:
         print(f"Error generating presentation: {str(e)}")
         return jsonify({'error': f'Failed to generate presentation: {str(e)}'}), 500
 
-def rgb_string_to_tuple(rgb_str, fallback):
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@app.route('/api/generate-presentation/stream', methods=['POST'])
+def generate_presentation_stream():
+    """Server-Sent Events variant of generate-presentation.
+
+    Emits one 'slide' event per slide as soon as the streamed completion has
+    moved past it, then 'done' (or 'error'). A cached completion is replayed
+    immediately. With structured output a malformed slide is repaired or
+    re-requested before the slides after it are sent, so slides still arrive
+    in order.
+    """
+    if not llm_client.configured:
+        return jsonify({'error': 'OpenAI API key not configured'}), 500
+
+    data = request.json or {}
+    content = data.get('content', '')
+    slide_count = data.get('slideCount', 'brief')
+    structured = structured_output(data)
+    bypass = cache_bypassed(data)
+    if structured:
+        messages, max_tokens, function = (presentation_json_messages(content, slide_count),
+                                          PRESENTATION_JSON_MAX_TOKENS, SLIDES_FUNCTION)
+    else:
+        messages, max_tokens, function = presentation_messages(content, slide_count), 1000, None
+    model = llm_client.model
+    client = llm_client_id()
+    cached = None
+    if completion_cache is not None and not bypass:
+        cached = completion_cache.get('presentation', messages, model, max_tokens, slide_count, content)
+        cache_lookup('completion', cached is not None)
+
+    def text_slides(chunks):
+        parser = SlideStreamParser()
+        for chunk in chunks:
+            yield from parser.feed(chunk)
+        yield from parser.close()
+
+    def events():
+        received = []
+        index = 0
+        # Sent straight away so proxies and the browser see the stream open
+        yield ': generating\n\n'
+        try:
+            if cached is None:
+                metrics.LLM_REQUESTS.inc(kind='presentation')
+            chunks = [cached] if cached is not None else llm_client.stream(messages, max_tokens, client=client,
+                                                                           function=function)
+
+            def recorded():
+                for chunk in chunks:
+                    received.append(chunk)
+                    yield chunk
+
+            if structured:
+                slides = structured_slides(recorded(), content, slide_count, bypass, client)
+            else:
+                slides = text_slides(recorded())
+            for slide in slides:
+                yield sse_event('slide', {'index': index, 'slide': slide})
+                index += 1
+            if cached is None and completion_cache is not None:
+                completion_cache.put('presentation', messages, model, max_tokens, ''.join(received), slide_count,
+                                     content)
+            yield sse_event('done', {'slides': index})
+        except Exception as e:
+            print(f"Error streaming presentation: {str(e)}")
+            yield sse_event('error', {'error': f'Failed to generate presentation: {str(e)}'})
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+def start_presentation(data, use_upload=True):
+    """The base deck for a payload and a renderer for it.
+
+    Returns (prs, renderer, num_existing_slides): either the uploaded deck of the same
+    filename, or a new deck that already has its title slide (num_existing_slides=0).
+    """
+    import deck
+    filename = data.get('filename', 'presentation.pptx')
+    uploaded_path = uploaded_deck_path(data) if use_upload else None
+    
+    if uploaded_path:
+        parsed = upload_cache.get(uploaded_path)
+        prs = parsed.open()
+        prs.slide_width = deck.Inches(16)
+        prs.slide_height = deck.Inches(9)
+        needs_title_slide = False
+        # Get number of existing slides in the uploaded file
+        num_existing_slides = parsed.slide_count
+    else:
+        # Already 16:9, from the pool of pre-parsed blank decks
+        prs = deck.new_presentation()
+        needs_title_slide = True
+        num_existing_slides = 0
+    
+    renderer = deck.deck_renderer(prs, data.get('styleColors', {}), data.get('logoSettings', {}))
+    if needs_title_slide:
+        renderer.add_title_slide(filename.replace('.pptx', '').title())  # Capitalize every word
+    return prs, renderer, num_existing_slides
+
+def build_presentation(data, use_upload=True):
+    """Build the deck described by a save-presentation payload and return the Presentation.
+
+    With use_upload=False an uploaded deck of the same filename is ignored and a new deck is built.
+    """
+    import deck
+    with stage('load'):
+        prs, renderer, num_existing_slides = start_presentation(data, use_upload)
+    # Only add new slides that are not already present in the uploaded file
+    with stage('render'):
+        for slide_data in data.get('slides', [])[num_existing_slides:]:
+            deck.render_slide(renderer, slide_data)
+    return prs
+
+def media_optimization_requested(data):
+    return bool(data.get('optimizeMedia', MEDIA_OPTIMIZE))
+
+def optimize_deck_media(prs, data):
+    """Shrink prs's images if the payload (or MEDIA_OPTIMIZE) asks for it; returns the report or None.
+
+    During a request the report is also left in g.media_report for the response headers.
+    """
+    if not media_optimization_requested(data):
+        return None
+    import media
+    with stage('optimize_media'):
+        report = media.optimize(prs, MEDIA_DPI, MEDIA_JPEG_QUALITY)
+    metrics.MEDIA_BYTES_SAVED.inc(report['bytes_saved'])
+    if has_request_context():
+        g.media_report = report
+    return report
+
+def render_deck(data, use_upload=True):
+    """Build and serialize a deck; the unit of work the background job pool runs."""
+    started_at = time.time()
+    prs = build_presentation(data, use_upload)
+    media_report = optimize_deck_media(prs, data)
+    built_at = time.time()
+    output = BytesIO()
+    prs.save(output)
+    timings = {
+        'started_at': started_at,
+        'build_seconds': built_at - started_at,
+        'save_seconds': time.time() - built_at,
+    }
+    if media_report is not None:
+        timings['media_bytes_saved'] = media_report['bytes_saved']
+    return output.getvalue(), timings
+
+def append_to_upload(data, out):
+    """Write the uploaded deck plus the payload's new slides to out without loading the deck.
+
+    Returns False, with nothing written, when the deck should be built in memory instead:
+    no upload, an upload below APPEND_STREAM_MIN_BYTES, or a package append_slides() can't handle.
+    """
+    uploaded_path = uploaded_deck_path(data)
+    if not uploaded_path or os.path.getsize(uploaded_path) < APPEND_STREAM_MIN_BYTES:
+        return False
+    import deck
+    from deck_append import AppendNotSupported, append_slides
+
+    def render_new_slides(prs, num_existing_slides):
+        renderer = deck.deck_renderer(prs, data.get('styleColors', {}), data.get('logoSettings', {}))
+        for slide_data in data.get('slides', [])[num_existing_slides:]:
+            deck.render_slide(renderer, slide_data)
+        # Only the new slides' images: the uploaded deck's media is copied through as it is
+        optimize_deck_media(prs, data)
+
     try:
-        parts = [int(x.strip()) for x in re.split('[, ]+', rgb_str) if x.strip()]
-        if len(parts) == 3:
-            return tuple(parts)
-    except Exception:
-        pass
-    return fallback
-
-def add_logo_to_slide(slide, logo_data_url, logo_position):
-    if not logo_data_url or not logo_position:
-        return
+        with stage('append'):
+            append_slides(uploaded_path, out, render_new_slides)
+    except AppendNotSupported as e:
+        print(f"Appending to {uploaded_path} in memory: {str(e)}")
+        return False
+    return True
+
+def deck_cache_key(data):
+    """Content address of a save request: the payload plus the identity of any uploaded base deck.
+
+    Stored uploads are identified by their hash, which is the same on every node.
+    """
+    filename = data.get('filename', 'presentation.pptx')
+    upload_stamp = None
+    if data.get('uploadId'):
+        record = upload_store.get(data['uploadId'])
+        if record is None:
+            raise UnknownUpload(data['uploadId'])
+        upload_stamp = record['sha256']
+    else:
+        uploaded_path = uploaded_deck_path(data)
+        if uploaded_path:
+            st = os.stat(uploaded_path)
+            upload_stamp = [uploaded_path, st.st_mtime_ns, st.st_size]
+    key_data = {
+        'slides': data.get('slides', []),
+        'filename': filename,
+        'styleColors': data.get('styleColors', {}),
+        'logoSettings': data.get('logoSettings', {}),
+        'upload': upload_stamp,
+        'optimizeMedia': media_optimization_requested(data),
+    }
+    encoded = json.dumps(key_data, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+def shared_cache_get(key):
+    """A value from the shared cache in the storage backend, or None; a backend failure is a miss."""
     try:
-        # Parse base64 data
-        if ',' in logo_data_url:
-            header, b64data = logo_data_url.split(',', 1)
-        else:
-            b64data = logo_data_url
-        img_bytes = base64.b64decode(b64data)
-        # Save to temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp:
-            tmp.write(img_bytes)
-            tmp.flush()
-            tmp_path = tmp.name
-        # Get image size for aspect ratio
-        with Image.open(tmp_path) as img:
-            width, height = img.size
-            aspect = width / height
-        logo_height = Inches(0.5)
-        logo_width = Inches(0.5) * aspect
-        slide_width = Inches(16)
-        slide_height = Inches(9)
-        # Position
-        if logo_position == 'top-left':
-            left = Inches(0.3)
-            top = Inches(0.3)
-        elif logo_position == 'top-right':
-            left = slide_width - logo_width - Inches(0.3)
-            top = Inches(0.3)
-        elif logo_position == 'bottom-left':
-            left = Inches(0.3)
-            top = slide_height - logo_height - Inches(0.3)
-        elif logo_position == 'bottom-right':
-            left = slide_width - logo_width - Inches(0.3)
-            top = slide_height - logo_height - Inches(0.3)
-        else:
-            left = Inches(0.3)
-            top = Inches(0.3)
-        slide.shapes.add_picture(tmp_path, left, top, logo_width, logo_height)
-        os.remove(tmp_path)
-    except Exception as e:
-        print(f"Error adding logo: {e}")
+        return storage.get(key)
+    except StorageError as e:
+        print(f"Error reading shared cache: {str(e)}")
+        return None
+
+def shared_cache_put(key, value):
+    try:
+        storage.set(key, value, ttl=SHARED_CACHE_TTL)
+    except StorageError as e:
+        print(f"Error writing shared cache: {str(e)}")
+
+def send_deck(body, etag, cache_status):
+    """Send a built deck, either bytes or a spooled file, as the presentation_edited.pptx download."""
+    headers = {
+        'Content-Disposition': 'attachment; filename=presentation_edited.pptx',
+        'ETag': f'"{etag}"',
+        'X-Deck-Cache': cache_status,
+    }
+    if isinstance(body, bytes):
+        headers['Content-Length'] = str(len(body))
+        return Response(body, mimetype=PPTX_MIMETYPE, headers=headers)
+
+    def generate():
+        try:
+            while True:
+                chunk = body.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+    # No Content-Length: HTTP/1.1 servers send this with chunked transfer encoding
+    return Response(generate(), mimetype=PPTX_MIMETYPE, headers=headers, direct_passthrough=True)
 
 @app.route('/api/save-presentation', methods=['POST'])
 def save_presentation():
     try:
         data = request.json
-        slides = data.get('slides', [])
-        filename = data.get('filename', 'presentation.pptx')
-        styleColors = data.get('styleColors', {})
-        logoSettings = data.get('logoSettings', {})
-        logo_data_url = logoSettings.get('logoDataUrl')
-        logo_position = logoSettings.get('logoPosition')
-        # Parse colors or use defaults
-        content_text_rgb = rgb_string_to_tuple(styleColors.get('contentTextColorRGB', ''), (34,34,34))
-        highlight_rgb = rgb_string_to_tuple(styleColors.get('highlightColorRGB', ''), (220,53,69))
-        forms_bg_rgb = rgb_string_to_tuple(styleColors.get('formsBgColorRGB', ''), (244,246,251))
-        uploaded_path = os.path.join(UPLOAD_FOLDER, filename)
-        
-        if os.path.exists(uploaded_path):
-            prs = Presentation(uploaded_path)
-            prs.slide_width = Inches(16)
-            prs.slide_height = Inches(9)
-            add_title_slide = False
-            # Get number of existing slides in the uploaded file
-            num_existing_slides = len(prs.slides)
+        key = deck_cache_key(data)
+        cached = None
+        if DECK_CACHE_BYTES:
+            cached = deck_output_cache.get(key)
+            cache_lookup('deck', cached is not None)
+        if cached is not None:
+            return send_deck(cached, key, 'HIT')
+        if SHARED_CACHE_TTL:
+            # Built by another node (or worker)
+            cached = shared_cache_get('deck:' + key)
+            cache_lookup('shared_deck', cached is not None)
+            if cached is not None:
+                if DECK_CACHE_BYTES:
+                    deck_output_cache.put(key, cached)
+                return send_deck(cached, key, 'SHARED')
+
+        # Serialize in memory, only spilling to an anonymous temp file for very large decks
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        if not append_to_upload(data, spool):
+            prs = build_presentation(data)
+            optimize_deck_media(prs, data)
+            with stage('save'):
+                prs.save(spool)
+        size = spool.tell()
+        spool.seek(0)
+        if size <= STREAM_THRESHOLD:
+            body = spool.read()
+            spool.close()
+            if DECK_CACHE_BYTES:
+                deck_output_cache.put(key, body)
+            if SHARED_CACHE_TTL:
+                shared_cache_put('deck:' + key, body)
+            response = send_deck(body, key, 'MISS')
         else:
-            prs = Presentation()
-            prs.slide_width = Inches(16)
-            prs.slide_height = Inches(9)
-            add_title_slide = True
-            num_existing_slides = 0
-        
-        if add_title_slide:
-            title_slide_layout = prs.slide_layouts[6]  # Blank layout
-            title_slide = prs.slides.add_slide(title_slide_layout)
-            title_box = title_slide.shapes.add_shape(
-                1,  # Rectangle shape
-                Inches(0.61),  # Left position
-                Inches(2.16),  # Top position
-                Inches(8.7),   # Width
-                Inches(1.46)   # Height
-            )
-            title_box.fill.background()  # No fill
-            title_box.line.fill.background()  # No border
-            title_box.shadow.inherit = False  # Remove shadow
-            title_frame = title_box.text_frame
-            title_frame.word_wrap = True
-            title_paragraph = title_frame.paragraphs[0]
-            title_paragraph.alignment = PP_ALIGN.LEFT
-            title_run = title_paragraph.add_run()
-            title_run.text = filename.replace('.pptx', '').title()  # Capitalize every word
-            title_run.font.name = 'Frutiger 45 Light'
-            title_run.font.size = Pt(40)
-            title_run.font.color.rgb = RGBColor(0, 0, 0)
-            title_run.font.shadow = None  # Remove shadow
-            presenter_box = title_slide.shapes.add_shape(
-                1,  # Rectangle shape
-                Inches(0.61),  # Left position
-                Inches(4.72),  # Top position
-                Inches(7.48),  # Width
-                Inches(0.3)    # Height
-            )
-            presenter_box.fill.background()  # No fill
-            presenter_box.line.fill.background()  # No border
-            presenter_box.shadow.inherit = False  # Remove shadow
-            presenter_frame = presenter_box.text_frame
-            presenter_frame.word_wrap = True
-            presenter_paragraph = presenter_frame.paragraphs[0]
-            presenter_paragraph.alignment = PP_ALIGN.LEFT
-            presenter_run = presenter_paragraph.add_run()
-            presenter_run.text = "Presenter"
-            presenter_run.font.name = 'Frutiger 45 Light'
-            presenter_run.font.size = Pt(16)
-            presenter_run.font.color.rgb = RGBColor(0, 0, 0)
-            presenter_run.font.shadow = None  # Remove shadow
-        
-        # Only add new slides that are not already present in the uploaded file
-        for idx, slide_data in enumerate(slides[num_existing_slides:]):
-            slide_layout = prs.slide_layouts[6]
-            slide = prs.slides.add_slide(slide_layout)
-            layout_type = slide_data.get('layoutType', 'boxes')
-            title_text = slide_data.get('title', '').title()
-            content = slide_data.get('content', [])
-            if isinstance(content, str):
-                content = [line.strip() for line in content.split('\n') if line.strip()]
-                content = [{'title': line.split(':')[0].strip(), 'content': line.split(':')[1].strip() if ':' in line else ''} for line in content]
-                content = content[:5]
-
-            # Add title at the top for all layouts
-            title_shape = slide.shapes.add_shape(
-                1,  # Rectangle shape
-                Inches(1),  # Left position
-                Inches(0.5),  # Top position
-                Inches(14),  # Width
-                Inches(1)  # Height
-            )
-            title_shape.fill.background()  # No fill
-            title_shape.line.fill.background()  # No border
-            title_shape.shadow.inherit = False  # Remove shadow
-            title_frame = title_shape.text_frame
-            title_frame.word_wrap = True
-            title_paragraph = title_frame.paragraphs[0]
-            title_paragraph.alignment = PP_ALIGN.LEFT
-            title_run = title_paragraph.add_run()
-            title_run.text = title_text
-            title_run.font.name = 'Frutiger 45 Light'
-            title_run.font.size = Pt(44)
-            title_run.font.color.rgb = RGBColor(0,0,0)
-            title_run.font.shadow = None  # Remove shadow
-
-            if layout_type == 'boxes':
-                create_list_boxes(slide, content, content_text_rgb, highlight_rgb, forms_bg_rgb)
-            elif layout_type == 'versus':
-                create_versus_layout(slide, content, content_text_rgb, highlight_rgb, forms_bg_rgb)
-            elif layout_type == 'brain':
-                create_brain_layout(slide, content, content_text_rgb, highlight_rgb, forms_bg_rgb)
-            else:
-                create_list_boxes(slide, content, content_text_rgb, highlight_rgb, forms_bg_rgb)
-            # Add logo to all slides except the first
-            add_logo_to_slide(slide, logo_data_url, logo_position)
-        
-        if not os.path.exists(UPLOAD_FOLDER):
-            os.makedirs(UPLOAD_FOLDER)
-        output_path = os.path.join(UPLOAD_FOLDER, 'presentation_edited.pptx')
-        prs.save(output_path)
-        if not os.path.exists(output_path):
-            raise Exception("Failed to create presentation file")
-        return send_from_directory(UPLOAD_FOLDER, 'presentation_edited.pptx', as_attachment=True)
+            response = send_deck(spool, key, 'MISS')
+        media_report = g.pop('media_report', None)
+        if media_report is not None:
+            response.headers['X-Media-Bytes-Saved'] = str(media_report['bytes_saved'])
+        return response
+    except UnknownUpload:
+        return jsonify({'error': 'Upload not found'}), 404
     except Exception as e:
         print(f"Error saving presentation: {str(e)}")
         return jsonify({'error': f'Failed to save presentation: {str(e)}'}), 500
 
-def create_list_boxes(slide, content, content_text_rgb, highlight_rgb, forms_bg_rgb):
-    """Create boxes for list items."""
-    # Filter out any empty content items
-    content = [item for item in content if item and (isinstance(item, dict) and (item.get('title') or item.get('content')) or isinstance(item, str) and item.strip())]
-    
-    num_points = len(content)
-    if num_points > 0:
-        # Get the actual slide width from the presentation
-        slide_width = Inches(16)  # Standard 16:9 slide width
-        slide_margin = Inches(1)  # Margin from edges
-        
-        # Calculate available width for boxes
-        available_width = slide_width - (2 * slide_margin)
-        
-        # Calculate box dimensions
-        box_margin = Inches(0.3)  # Margin between boxes
-        total_margins = box_margin * (num_points - 1)  # Total space needed for margins
-        box_width = (available_width - total_margins) / num_points
-        
-        # Calculate starting position to center the boxes
-        start_x = slide_margin
-        start_y = Inches(3)  # Position below title
-        
-        for i, point in enumerate(content):
-            # Calculate box position
-            left = start_x + (i * (box_width + box_margin))
-            top = start_y
-            
-            # Create box shape
-            box = slide.shapes.add_shape(1, left, top, box_width, Inches(2.5))
-            box.fill.solid()
-            box.fill.fore_color.rgb = RGBColor(*forms_bg_rgb)
-            box.line.fill.background()
-            box.shadow.inherit = False  # Remove shadow
-            
-            # Configure text frame
-            text_frame = box.text_frame
-            text_frame.word_wrap = True
-            text_frame.margin_left = Inches(0.2)
-            text_frame.margin_right = Inches(0.2)
-            text_frame.margin_top = Inches(0.2)
-            text_frame.margin_bottom = Inches(0.2)
-            
-            # Clear any default paragraphs
-            for paragraph in text_frame.paragraphs:
-                p = paragraph._element
-                p.getparent().remove(p)
-            
-            if isinstance(point, dict):
-                title = point.get('title', '')
-                content_val = point.get('content', '')
-                
-                # Add title
-                p = text_frame.add_paragraph()
-                p.alignment = PP_ALIGN.LEFT
-                run = p.add_run()
-                run.text = title.title()
-                run.font.name = 'Frutiger 45 Light'
-                run.font.size = Pt(16)
-                run.font.color.rgb = RGBColor(*highlight_rgb)
-                run.font.bold = False
-                run.font.shadow = None
-                # Add line break (empty paragraph)
-                if content_val:
-                    p = text_frame.add_paragraph()
-                    p.alignment = PP_ALIGN.LEFT
-                    p.add_run().text = ''
-                # Add content
-                if content_val:
-                    p = text_frame.add_paragraph()
-                    run = p.add_run()
-                    run.text = content_val
-                    run.font.name = 'Frutiger 45 Light'
-                    run.font.size = Pt(14)
-                    run.font.color.rgb = RGBColor(*content_text_rgb)
-                    run.font.shadow = None
-            else:
-                # Add simple text
-                p = text_frame.add_paragraph()
-                run = p.add_run()
-                run.text = point
-                run.font.name = 'Frutiger 45 Light'
-                run.font.size = Pt(14)
-                run.font.color.rgb = RGBColor(*content_text_rgb)
-                run.font.shadow = None
-
-            text_frame.vertical_anchor = MSO_VERTICAL_ANCHOR.TOP
-
-def create_versus_layout(slide, content, content_text_rgb, highlight_rgb, forms_bg_rgb):
-    # Add versus image in the center
-    img_path = os.path.join('sliding', 'icons', 'versus.png')
-    img_width = Inches(1.5)
-    img_height = Inches(1.5)
-    slide_width = Inches(16)
-    center_x = (slide_width - img_width) / 2
-    center_y = Inches(3.5)
-    if os.path.exists(img_path):
-        slide.shapes.add_picture(img_path, center_x, center_y, img_width, img_height)
-    # Two side boxes
-    left_box = slide.shapes.add_shape(1, Inches(1.2), Inches(2.5), Inches(5.5), Inches(3))
-    right_box = slide.shapes.add_shape(1, Inches(9.3), Inches(2.5), Inches(5.5), Inches(3))
-    for box, idx in zip([left_box, right_box], range(2)):
-        box.fill.solid()
-        box.fill.fore_color.rgb = RGBColor(*forms_bg_rgb)
-        box.line.fill.background()
-        box.shadow.inherit = False
-        text_frame = box.text_frame
-        text_frame.word_wrap = True
-        text_frame.margin_left = Inches(0.2)
-        text_frame.margin_right = Inches(0.2)
-        text_frame.margin_top = Inches(0.2)
-        text_frame.margin_bottom = Inches(0.2)
-        for paragraph in text_frame.paragraphs:
-            p = paragraph._element
-            p.getparent().remove(p)
-        if idx < len(content):
-            point = content[idx]
-            if isinstance(point, dict):
-                title = point.get('title', '')
-                box_p = text_frame.add_paragraph()
-                box_p.alignment = PP_ALIGN.LEFT
-                run = box_p.add_run()
-                run.text = title.title()
-                run.font.name = 'Frutiger 45 Light'
-                run.font.size = Pt(16)
-                run.font.color.rgb = RGBColor(*highlight_rgb)
-                run.font.bold = True
-                run.font.shadow = None
-                box_content = point.get('content', '')
-                if box_content:
-                    box_p = text_frame.add_paragraph()
-                    box_p.alignment = PP_ALIGN.LEFT
-                    run = box_p.add_run()
-                    run.text = box_content
-                    run.font.name = 'Frutiger 45 Light'
-                    run.font.size = Pt(14)
-                    run.font.color.rgb = RGBColor(*content_text_rgb)
-                    run.font.shadow = None
-            else:
-                box_p = text_frame.add_paragraph()
-                box_p.alignment = PP_ALIGN.LEFT
-                run = box_p.add_run()
-                run.text = str(point)
-                run.font.name = 'Frutiger 45 Light'
-                run.font.size = Pt(14)
-                run.font.color.rgb = RGBColor(*content_text_rgb)
-                run.font.shadow = None
-
-def create_brain_layout(slide, content, content_text_rgb, highlight_rgb, forms_bg_rgb):
-    # Add brain image in the center
-    img_path = os.path.join('sliding', 'icons', 'brain.png')
-    img_width = Inches(1.5)
-    img_height = Inches(1.5)
-    slide_width = Inches(16)
-    center_x = (slide_width - img_width) / 2
-    center_y = Inches(3.5)
-    if os.path.exists(img_path):
-        slide.shapes.add_picture(img_path, center_x, center_y, img_width, img_height)
-    # Two vertical boxes
-    top_box = slide.shapes.add_shape(1, Inches(5.5), Inches(1.5), Inches(5), Inches(2.2))
-    bottom_box = slide.shapes.add_shape(1, Inches(5.5), Inches(5.2), Inches(5), Inches(2.2))
-    for box, idx in zip([top_box, bottom_box], range(2)):
-        box.fill.solid()
-        box.fill.fore_color.rgb = RGBColor(*forms_bg_rgb)
-        box.line.fill.background()
-        box.shadow.inherit = False
-        text_frame = box.text_frame
-        text_frame.word_wrap = True
-        text_frame.margin_left = Inches(0.2)
-        text_frame.margin_right = Inches(0.2)
-        text_frame.margin_top = Inches(0.2)
-        text_frame.margin_bottom = Inches(0.2)
-        for paragraph in text_frame.paragraphs:
-            p = paragraph._element
-            p.getparent().remove(p)
-        if idx < len(content):
-            point = content[idx]
-            if isinstance(point, dict):
-                title = point.get('title', '')
-                box_p = text_frame.add_paragraph()
-                box_p.alignment = PP_ALIGN.LEFT
-                run = box_p.add_run()
-                run.text = title.title()
-                run.font.name = 'Frutiger 45 Light'
-                run.font.size = Pt(16)
-                run.font.color.rgb = RGBColor(*highlight_rgb)
-                run.font.bold = True
-                run.font.shadow = None
-                box_content = point.get('content', '')
-                if box_content:
-                    box_p = text_frame.add_paragraph()
-                    box_p.alignment = PP_ALIGN.LEFT
-                    run = box_p.add_run()
-                    run.text = box_content
-                    run.font.name = 'Frutiger 45 Light'
-                    run.font.size = Pt(14)
-                    run.font.color.rgb = RGBColor(*content_text_rgb)
-                    run.font.shadow = None
-            else:
-                box_p = text_frame.add_paragraph()
-                box_p.alignment = PP_ALIGN.LEFT
-                run = box_p.add_run()
-                run.text = str(point)
-                run.font.name = 'Frutiger 45 Light'
-                run.font.size = Pt(14)
-                run.font.color.rgb = RGBColor(*content_text_rgb)
-                run.font.shadow = None
+# Slide lists and text of uploads shared by get-slides and save-presentation, read from the files
+# themselves and dropped when /api/upload replaces one; UPLOAD_CACHE_BYTES bounds the text kept
+upload_cache = UploadCache(max_bytes=int(os.getenv('UPLOAD_CACHE_BYTES', str(256 * 1024 * 1024))))
+# Worker processes for reading slide text of large decks, 0 keeps it in the request thread
+TEXT_EXTRACT_PROCESSES = int(os.getenv('TEXT_EXTRACT_PROCESSES', '0'))
 
-            text_frame.vertical_anchor = MSO_VERTICAL_ANCHOR.TOP
+@app.route('/api/get-slides', methods=['POST'])
+def get_slides():
+    data = request.json
+    if not data.get('uploadId') and not data.get('filename'):
+        return jsonify({'error': 'No uploadId or filename provided'}), 400
 
-def create_flow_chart(slide, content):
-    pass
+    # Optional range: {"start": 20, "limit": 10} returns slides 20-29 plus the total count
+    start = data.get('start')
+    limit = data.get('limit')
+    try:
+        start = int(start or 0)
+        limit = int(limit) if limit is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'start and limit must be integers'}), 400
+    if start < 0 or (limit is not None and limit < 0):
+        return jsonify({'error': 'start and limit must not be negative'}), 400
 
-def create_data_visualization(slide, content):
-    pass
+    # Slide text of stored uploads is shared by hash: a hit needs neither the deck nor a parse
+    record = upload_store.get(data['uploadId']) if data.get('uploadId') else None
+    shared_key = f"slides:{record['sha256']}:{start}:{limit}" if record is not None and SHARED_CACHE_TTL else None
+    cached = shared_cache_get(shared_key) if shared_key else None
+    if shared_key:
+        cache_lookup('shared_slides', cached is not None)
+    if cached is not None:
+        slides, total = json.loads(cached)
+    else:
+        try:
+            path = uploaded_deck_path(data)
+        except UnknownUpload:
+            path = None
+        if path is None:
+            return jsonify({'error': 'File not found'}), 404
+        with stage('extract_text'):
+            parsed = upload_cache.get(path)
+            slides = parsed.slides(start, limit, TEXT_EXTRACT_PROCESSES)
+            total = parsed.slide_count
+        if shared_key:
+            shared_cache_put(shared_key, json.dumps([slides, total]).encode('utf-8'))
+    if 'start' not in data and 'limit' not in data:
+        return jsonify({"slides": slides})
+    return jsonify({"slides": slides, "start": start, "total": total})
 
-@app.route('/api/get-slides', methods=['POST'])
-def get_slides():
+@app.route('/api/jobs/save-presentation', methods=['POST'])
+def submit_save_job():
+    """Queue a deck build; the response points at the status and result URLs."""
     data = request.json
-    filename = data.get('filename')
-    if not filename:
-        return jsonify({'error': 'No filename provided'}), 400
-    path = os.path.join(UPLOAD_FOLDER, filename)
-    if not os.path.exists(path):
-        return jsonify({'error': 'File not found'}), 404
+    try:
+        job = job_manager.submit(data)
+    except JobQueueFull as e:
+        response = jsonify({'error': f'Job queue is full: {str(e)}'})
+        response.headers['Retry-After'] = '5'
+        return response, 429
+    info = job.to_dict()
+    info['statusUrl'] = f'/api/jobs/{job.id}'
+    info['resultUrl'] = f'/api/jobs/{job.id}/result'
+    return jsonify(info), 202
 
-    prs = Presentation(path)
-    slides = []
-    for slide in prs.slides:
-        title = ""
-        content = []
-        for shape in slide.shapes:
-            if not shape.has_text_frame:
-                continue
-            text = shape.text.strip()
-            if not text:
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Job status; ?wait=N long-polls up to N seconds (max 60) for the job to finish."""
+    wait = min(float(request.args.get('wait', 0) or 0), 60)
+    job = job_manager.get(job_id, wait=wait)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-Sent Events with the job status, sent on every change until it finishes."""
+    if job_manager.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def events():
+        last_status = None
+        while True:
+            job = job_manager.get(job_id, wait=JOB_EVENT_INTERVAL)
+            if job is None:
+                yield sse_event('error', {'error': 'Job expired'})
+                return
+            info = job.to_dict()
+            if info['status'] != last_status:
+                last_status = info['status']
+                yield sse_event('status', info)
+            if info['status'] in (DONE, FAILED):
+                return
+            yield ': waiting\n\n'
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status == FAILED:
+        return jsonify({'error': f'Failed to save presentation: {job.error}'}), 500
+    if job.status != DONE:
+        return jsonify(job.to_dict()), 409
+    body = job.result
+    if body is None:
+        # Published by another node and expired since
+        return jsonify({'error': 'Job not found'}), 404
+    return send_deck(body, job.id, 'JOB')
+
+def generate_batch_slides(spec, client=None):
+    """Slides for one batch deck spec: given directly, or generated from its topic."""
+    if spec.get('slides'):
+        return spec['slides']
+    if not llm_client.configured:
+        raise Exception('OpenAI API key not configured')
+    topic = spec.get('topic', '')
+    slide_count = spec.get('slideCount', 'brief')
+    bypass = bool(spec.get('noCache'))
+    structured = structured_output(spec)
+    if use_parallel_generation(spec.get('mode', 'auto'), slide_count):
+        slides = generate_slides_parallel(topic, requested_slide_count(slide_count), bypass, client, structured)
+    else:
+        slides = generate_slides_single(topic, slide_count, bypass, client, structured)
+    layout_type = spec.get('layoutType', 'boxes')
+    return [dict(slide, layoutType=slide.get('layoutType', layout_type)) for slide in slides]
+
+def render_batch_deck(spec, slides):
+    data = {
+        'slides': slides,
+        'filename': spec['filename'],
+        'styleColors': spec.get('styleColors', {}),
+        'logoSettings': spec.get('logoSettings', {}),
+    }
+    # Batch decks are always new decks, never appended to an upload of the same name
+    body, timings = render_deck(data, use_upload=False)
+    return body, len(slides), timings
+
+def batch_filename(index, spec):
+    base = spec.get('filename') or f"{spec.get('topic') or 'presentation'}.pptx"
+    base = re.sub(r'[^\w .-]+', '', base).strip() or 'presentation.pptx'
+    if not base.endswith('.pptx'):
+        base += '.pptx'
+    return f'{index + 1:03d}-{base}'
+
+@app.route('/api/batch/generate-presentations', methods=['POST'])
+def batch_generate_presentations():
+    """Generate and render several decks, streamed back as one ZIP with a manifest.json.
+
+    Body: {"decks": [{"topic", "slideCount", "styleColors", "logoSettings", ...}, ...]}.
+    A deck that fails is listed in the manifest with its error; the rest still ship.
+    """
+    data = request.json or {}
+    specs = data.get('decks') or []
+    if not specs:
+        return jsonify({'error': 'No decks provided'}), 400
+    if len(specs) > BATCH_MAX_DECKS:
+        return jsonify({'error': f'At most {BATCH_MAX_DECKS} decks per batch'}), 400
+    specs = [dict(spec, filename=batch_filename(i, spec)) for i, spec in enumerate(specs)]
+    client = llm_client_id()
+
+    def entries():
+        manifest = [None] * len(specs)
+        results = run_pipeline(specs, lambda spec: generate_batch_slides(spec, client), render_batch_deck,
+                               workers=BATCH_WORKERS, render_limit=BATCH_RENDER_WORKERS)
+        for index, result, error in results:
+            name = specs[index]['filename']
+            if error is not None:
+                print(f"Error generating batch deck {name}: {str(error)}")
+                manifest[index] = {'file': name, 'status': 'failed', 'error': str(error)}
                 continue
-            if not title:
-                title = text
-            else:
-                content.append(text)
-        slides.append({
-            "title": title,
-            "content": "\n".join(content)
-        })
-    return jsonify({"slides": slides})
+            body, slide_count, timings = result
+            manifest[index] = {'file': name, 'status': 'ok', 'slides': slide_count, 'bytes': len(body),
+                               'renderSeconds': round(timings['build_seconds'] + timings['save_seconds'], 4)}
+            yield name, body
+        yield 'manifest.json', json.dumps({'decks': manifest}, indent=2).encode('utf-8')
+
+    return Response(stream_zip(entries()), mimetype='application/zip', headers={
+        'Content-Disposition': 'attachment; filename=presentations.zip',
+    })
+
+@app.route('/api/sessions', methods=['POST'])
+def create_session():
+    """Build a deck from a save-presentation payload and keep it for incremental edits."""
+    try:
+        import deck
+        data = request.json
+        slides = list(data.get('slides', []))
+        # A title slide goes in front exactly when no uploaded deck is used, even an empty one
+        offset = 0 if uploaded_deck_path(data) else 1
+        prs, renderer, num_existing_slides = start_presentation(data)
+        for slide_data in slides[num_existing_slides:]:
+            deck.render_slide(renderer, slide_data)
+        # Uploaded slides the client did not send still occupy a position in the deck
+        slides += [{}] * (num_existing_slides - len(slides))
+        rendered = [idx >= num_existing_slides for idx in range(len(slides))]
+        base = {
+            'filename': data.get('filename', 'presentation.pptx'),
+            'uploadId': data.get('uploadId'),
+            'styleColors': data.get('styleColors', {}),
+            'logoSettings': data.get('logoSettings', {}),
+        }
+        session = deck_sessions.add(DeckSession(prs, renderer, slides, rendered, offset,
+                                                deck.deck_renderer, deck.render_slide, base))
+        return jsonify(session.to_dict()), 201
+    except UnknownUpload:
+        return jsonify({'error': 'File not found'}), 404
+    except Exception as e:
+        print(f"Error creating deck session: {str(e)}")
+        return jsonify({'error': f'Failed to create session: {str(e)}'}), 500
+
+def restore_session(state):
+    """Rebuild a deck session saved by another process on a fresh copy of its base deck."""
+    import deck
+    prs, renderer, _ = start_presentation(state['base'])
+    return DeckSession.restore(state, prs, renderer, deck.deck_renderer, deck.render_slide)
+
+@app.route('/api/sessions/<session_id>', methods=['PATCH'])
+def update_session(session_id):
+    """Apply edit/insert/delete/restyle operations, re-rendering only the slides they touch.
+
+    Body: {"operations": [{"op": "edit", "index": 2, "slide": {...}}, {"op": "delete", "index": 5},
+    {"op": "insert", "index": 0, "slide": {...}}, {"op": "restyle", "styleColors": {...}, "logoSettings": {...}}]}
+    """
+    data = request.json
+    operations = data.get('operations', []) if isinstance(data, dict) else None
+    started_at = time.time()
+    # Other processes wait, then rebuild from the state this one saves
+    with deck_sessions.lock(session_id):
+        session = deck_sessions.get(session_id)
+        if session is None:
+            return jsonify({'error': 'Session not found'}), 404
+        with session.lock:
+            version = session.version
+            try:
+                rendered = session.apply(operations)
+            except SessionError as e:
+                return jsonify({'error': str(e), **session.to_dict()}), 400
+            except Exception as e:
+                print(f"Error updating deck session: {str(e)}")
+                return jsonify({'error': f'Failed to update session: {str(e)}'}), 500
+            finally:
+                if session.version != version:
+                    deck_sessions.save(session)
+            info = session.to_dict()
+    info['rendered'] = rendered
+    info['renderSeconds'] = round(time.time() - started_at, 4)
+    return jsonify(info)
+
+@app.route('/api/sessions/<session_id>/presentation', methods=['GET'])
+def session_presentation(session_id):
+    session = deck_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Session not found'}), 404
+    with session.lock:
+        with stage('session_save'):
+            body = session.save()
+        etag = f'{session.id}-{session.version}'
+    return send_deck(body, etag, 'SESSION')
+
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    if not deck_sessions.remove(session_id):
+        return jsonify({'error': 'Session not found'}), 404
+    return '', 204
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/admin/job-stats', methods=['GET'])
+def job_stats():
+    return jsonify(job_manager.stats())
+
+@app.route('/api/admin/llm-stats', methods=['GET'])
+def llm_stats():
+    return jsonify(llm_client.stats())
+
+@app.route('/api/admin/cache-stats', methods=['GET'])
+def cache_stats():
+    import deck
+    return jsonify({
+        'uploads': upload_cache.stats(),
+        'uploadStore': upload_store.stats(),
+        'assets': asset_cache_stats(),
+        'decks': deck_output_cache.stats(),
+        'sessions': deck_sessions.stats(),
+        'static': static_assets.stats(),
+        'presentations': deck.presentation_pool.stats(),
+        'completions': completion_cache.stats() if completion_cache is not None else None,
+        'storage': storage.stats(),
+    })
+
+# Background deck builds. Workers are started on first use with forkserver where
+# available, so they never inherit this process's threads
+job_manager = JobManager(
+    render_deck,
+    max_workers=int(os.getenv('JOB_WORKERS', '0')) or None,
+    max_pending=int(os.getenv('JOB_QUEUE_SIZE', '32')),
+    result_ttl=float(os.getenv('JOB_RESULT_TTL', '600')),
+    start_method=os.getenv('JOB_START_METHOD') or ('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else None),
+    # Status and results are published there for the other processes
+    storage=storage,
+)
+JOB_EVENT_INTERVAL = 1
 
 if __name__ == '__main__':
-    if not openai.api_key:
+    if not os.getenv('OPENAI_API_KEY'):
         print("\nWarning: OpenAI API key not found!")
         print("Please add your API key to the .env file:")
         print("OPENAI_API_KEY=your_api_key_here\n")
+    # Development server; serve.py runs the production one
+    static_assets.reload = True
     app.run(debug=True, port=5001) 
\ No newline at end of file
@@ -0,0 +1,353 @@
+"""Server-side deck sessions for incremental saves.
+
+A session keeps a built Presentation in memory together with the slide list
+it was built from. Edits arrive as small operations (edit, insert, delete,
+restyle) instead of the whole slide list plus logo; only the slides an
+operation touches are rendered again. Serializing goes through
+PackageCache, which keeps every part's deflated bytes and only compresses
+parts that changed since the previous save, so both halves of a save scale
+with the size of the edit rather than the size of the deck.
+
+The live deck is in this process's memory. With a storage backend
+(storage.py) the session's state (base deck, slide list, style, version) is
+saved there after every change, and a process that gets a request for a
+session it does not hold, or holds an older version of, rebuilds the deck
+from that state first; without one, a client has to reach the same process
+(or fall back to a full save on 404).
+"""
+import json
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from io import BytesIO
+from cache import LRUCache
+from zipwriter import ZipWriter, deflate
+
+OPERATIONS = ('edit', 'insert', 'delete', 'restyle')
+
+
+class SessionError(Exception):
+    """An operation that does not apply to the session (bad index, unknown op)."""
+
+
+# -- package writer -------------------------------------------------------
+
+class PackageCache:
+    """Writes a Presentation's package, reusing the deflated bytes of unchanged parts.
+
+    Part blobs are cached by part object; invalidate() a part after changing
+    its XML. A rels item is cached by the (rId, type, target) triples it is
+    made of, so renamed or re-related parts are picked up without help.
+    The presentation part and [Content_Types].xml are small and rebuilt on
+    every write. Members, order and contents match what prs.save() writes.
+    """
+
+    def __init__(self):
+        self._blobs = {}
+        self._rels = {}
+        self.compressed = 0
+        self.reused = 0
+
+    def invalidate(self, part):
+        self._blobs.pop(id(part), None)
+
+    def _member(self, part, always=False):
+        entry = None if always else self._blobs.get(id(part))
+        if entry is None or entry[0] is not part:
+            entry = (part,) + deflate(part.blob)
+            if not always:
+                self._blobs[id(part)] = entry
+            self.compressed += 1
+        else:
+            self.reused += 1
+        return entry[1:]
+
+    def _rels_member(self, part):
+        signature = tuple((rel.rId, rel.reltype, rel.target_ref, rel.is_external) for rel in part.rels)
+        entry = self._rels.get(id(part))
+        if entry is None or entry[0] is not part or entry[1] != signature:
+            entry = (part, signature) + deflate(part.rels.xml)
+            self._rels[id(part)] = entry
+        return entry[2:]
+
+    def write(self, prs, file):
+        """Write prs to the binary file object and return the number of bytes written."""
+        # python-pptx is loaded by whoever built prs; importing it here keeps this module light
+        from pptx.opc.oxml import serialize_part_xml
+        from pptx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI
+        from pptx.opc.serialized import _ContentTypesItem
+        package = prs.part.package
+        parts = tuple(package.iter_parts())
+        members = [
+            (CONTENT_TYPES_URI.membername, deflate(serialize_part_xml(_ContentTypesItem.xml_for(parts)))),
+            (PACKAGE_URI.rels_uri.membername, deflate(package._rels.xml)),
+        ]
+        for part in parts:
+            members.append((part.partname.membername, self._member(part, always=part is prs.part)))
+            if part._rels:
+                members.append((part.partname.rels_uri.membername, self._rels_member(part)))
+
+        # Forget parts that are no longer in the package (deleted slides)
+        live = {id(part) for part in parts}
+        for cache in (self._blobs, self._rels):
+            for key in [key for key in cache if key not in live]:
+                del cache[key]
+        writer = ZipWriter(file)
+        for name, (data, crc, size) in members:
+            writer.add(name, data, crc, size)
+        return writer.close()
+
+
+# -- sessions -------------------------------------------------------------
+
+class DeckSession:
+    """One deck being edited: its Presentation, slide list and renderer.
+
+    slides[i] is the client's slide i. Slides rendered by the session have
+    rendered=True; slides that came from an uploaded deck keep their
+    original content until an edit replaces them, and origins[i] is their
+    position in that deck. New decks also carry the title slide in front,
+    so deck position = index + offset. base is the part of the payload the
+    deck was started from (filename, uploadId, styleColors, logoSettings).
+    """
+
+    def __init__(self, prs, renderer, slides, rendered, offset, make_renderer, render_slide, base=None):
+        self.id = uuid.uuid4().hex
+        self.prs = prs
+        self.renderer = renderer
+        self.slides = list(slides)
+        self.rendered = list(rendered)
+        self.origins = [None if done else index for index, done in enumerate(self.rendered)]
+        self.offset = offset
+        self.base = dict(base or {})
+        self.make_renderer = make_renderer
+        self.render_slide = render_slide
+        self.version = 1
+        self.last_used = time.time()
+        self.lock = threading.Lock()
+        self.package = PackageCache()
+        self._output = None
+        self._last_partnum = max((slide.part.partname.idx or 0 for slide in prs.slides), default=0)
+
+    @property
+    def _sld_ids(self):
+        return self.prs.slides._sldIdLst
+
+    def _check_index(self, index, size):
+        if not isinstance(index, int) or not 0 <= index < size:
+            raise SessionError(f'slide index {index!r} out of range')
+
+    def _remove(self, position):
+        sld_id = self._sld_ids[position]
+        self.package.invalidate(self.prs.part.related_part(sld_id.rId))
+        self._sld_ids.remove(sld_id)
+        self.prs.part.drop_rel(sld_id.rId)
+
+    def _render(self, slide_data, position):
+        from pptx.opc.packuri import PackURI
+        slide = self.render_slide(self.renderer, slide_data)
+        # add_slide names the part slide<count + 1>, which a surviving slide may still
+        # use after a delete. Existing parts are never renamed (relationships cache
+        # their target paths), so the new part gets a number nobody has used yet
+        self._last_partnum += 1
+        slide.part.partname = PackURI(f'/ppt/slides/slide{self._last_partnum}.xml')
+        # Rendering appends; move the new slide into place
+        sld_id = self._sld_ids[-1]
+        self._sld_ids.remove(sld_id)
+        self._sld_ids.insert(position, sld_id)
+
+    def apply(self, operations):
+        """Apply a list of operations in order and return how many slides were rendered.
+
+        Operations are not transactional: if one fails, the ones before it stay applied.
+        The version only changes when at least one operation was applied.
+        """
+        if not isinstance(operations, list) or not all(isinstance(operation, dict) for operation in operations):
+            raise SessionError('operations must be a list of objects')
+        rendered = 0
+        applied = 0
+        try:
+            for operation in operations:
+                # A failed operation may have changed the deck before it gave up
+                self._output = None
+                rendered += self._apply(operation)
+                applied += 1
+        finally:
+            if applied:
+                self.version += 1
+        return rendered
+
+    def _apply(self, operation):
+        op = operation.get('op')
+        if op not in OPERATIONS:
+            raise SessionError(f'unknown operation {op!r}')
+        index = operation.get('index')
+        slide_data = operation.get('slide') or {}
+        if not isinstance(slide_data, dict):
+            raise SessionError('slide must be an object')
+        if op == 'edit':
+            self._check_index(index, len(self.slides))
+            self._remove(index + self.offset)
+            self._render(slide_data, index + self.offset)
+            self.slides[index] = slide_data
+            self.rendered[index] = True
+            self.origins[index] = None
+            return 1
+        if op == 'insert':
+            if index is None:
+                index = len(self.slides)
+            self._check_index(index, len(self.slides) + 1)
+            self._render(slide_data, index + self.offset)
+            self.slides.insert(index, slide_data)
+            self.rendered.insert(index, True)
+            self.origins.insert(index, None)
+            return 1
+        if op == 'delete':
+            self._check_index(index, len(self.slides))
+            self._remove(index + self.offset)
+            del self.slides[index]
+            del self.rendered[index]
+            del self.origins[index]
+            return 0
+        # restyle: colours and logo are baked into every rendered slide, so all of them go again
+        self.base['styleColors'] = operation.get('styleColors') or {}
+        self.base['logoSettings'] = operation.get('logoSettings') or {}
+        self.renderer = self.make_renderer(self.prs, self.base['styleColors'], self.base['logoSettings'])
+        # Remove them all first (back to front) so every slide is rendered at its final position
+        positions = [i + self.offset for i in range(len(self.slides)) if self.rendered[i]]
+        for position in reversed(positions):
+            self._remove(position)
+        for position in positions:
+            self._render(self.slides[position - self.offset], position)
+        return len(positions)
+
+    def save(self):
+        """The serialized deck for the current version, built at most once per version."""
+        if self._output is None or self._output[0] != self.version:
+            output = BytesIO()
+            self.package.write(self.prs, output)
+            self._output = (self.version, output.getvalue())
+        return self._output[1]
+
+    def to_dict(self):
+        return {
+            'sessionId': self.id,
+            'version': self.version,
+            'slideCount': len(self.slides),
+        }
+
+    def to_state(self):
+        """What restore() needs to rebuild this session in another process."""
+        return {
+            'id': self.id,
+            'version': self.version,
+            'base': self.base,
+            'slides': self.slides,
+            'rendered': self.rendered,
+            'origins': self.origins,
+            'offset': self.offset,
+        }
+
+    @classmethod
+    def restore(cls, state, prs, renderer, make_renderer, render_slide):
+        """Rebuild a session from to_state() on a fresh copy of its base deck.
+
+        prs and renderer are what the session was started with: the uploaded
+        deck as uploaded, or a new deck with its title slide, and the current style.
+        """
+        offset = state['offset']
+        session = cls(prs, renderer, [], [], offset, make_renderer, render_slide, state['base'])
+        # Uploaded slides that were edited or deleted go; the others keep their order
+        kept = {origin for origin in state['origins'] if origin is not None}
+        for position in reversed(range(len(prs.slides) - offset)):
+            if position not in kept:
+                session._remove(position + offset)
+        for index, (slide_data, rendered) in enumerate(zip(state['slides'], state['rendered'])):
+            if rendered:
+                session._render(slide_data, index + offset)
+        session.id = state['id']
+        session.version = state['version']
+        session.slides = state['slides']
+        session.rendered = state['rendered']
+        session.origins = state['origins']
+        return session
+
+
+class SessionStore:
+    """Bounded, idle-expiring map of session id to DeckSession.
+
+    With a storage backend, session state is kept there too (see the module
+    docstring); restore(state) must return the rebuilt DeckSession.
+    """
+
+    def __init__(self, max_sessions=64, idle_ttl=3600, storage=None, restore=None):
+        self.idle_ttl = idle_ttl
+        self.storage = storage
+        self.restore = restore
+        self._sessions = LRUCache(max_entries=max_sessions)
+        self.restored = 0
+
+    def add(self, session):
+        self._sessions.put(session.id, session)
+        self.save(session)
+        return session
+
+    def save(self, session):
+        """Publish the session's current state; call after every change."""
+        if self.storage is not None:
+            # The version is kept apart so checking for a newer one stays cheap
+            self.storage.set('session:' + session.id, json.dumps(session.to_state()).encode('utf-8'),
+                             ttl=self.idle_ttl)
+            self.storage.set('session-version:' + session.id, str(session.version).encode('ascii'),
+                             ttl=self.idle_ttl)
+
+    def lock(self, session_id):
+        """Held while changing a session, so processes sharing the storage take turns."""
+        return self.storage.lock('session:' + session_id) if self.storage is not None else nullcontext()
+
+    def get(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is not None and time.time() - session.last_used > self.idle_ttl:
+            self._sessions.pop(session_id)
+            session = None
+        if self.storage is not None:
+            session = self._fresh(session_id, session)
+        if session is not None:
+            session.last_used = time.time()
+        return session
+
+    def _fresh(self, session_id, session):
+        version = self.storage.get('session-version:' + session_id)
+        if version is None:
+            # Deleted or expired elsewhere
+            self._sessions.pop(session_id)
+            return None
+        if session is not None and session.version == int(version):
+            if time.time() - session.last_used > self.idle_ttl / 10:
+                for key in ('session:', 'session-version:'):
+                    self.storage.touch(key + session_id, self.idle_ttl)
+            return session
+        state = self.storage.get('session:' + session_id)
+        if state is None:
+            return None
+        try:
+            session = self.restore(json.loads(state))
+        except Exception as e:
+            print(f"Error restoring deck session {session_id}: {str(e)}")
+            return None
+        self.restored += 1
+        self._sessions.put(session_id, session)
+        return session
+
+    def remove(self, session_id):
+        removed = self._sessions.pop(session_id) is not None
+        if self.storage is not None:
+            removed = self.storage.delete('session-version:' + session_id) or removed
+            self.storage.delete('session:' + session_id)
+        return removed
+
+    def stats(self):
+        stats = self._sessions.stats()
+        stats['restored'] = self.restored
+        return stats
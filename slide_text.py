@@ -0,0 +1,162 @@
+"""Slide titles and text read straight from the slide XML of a .pptx package.
+
+get-slides only needs the text of each slide, so instead of loading the
+package into python-pptx (every part, every shape object) this opens the
+ZIP, finds the slide parts in presentation order and streams each one
+through iterparse, keeping nothing but the text of top-level shapes.
+
+The result matches the object-model extract_slides() (kept in
+benchmarks/legacy_layouts.py) on a python-pptx Presentation exactly: only
+<p:sp> children of the shape tree have a text frame, a shape's text is its
+paragraphs joined by '\\n', and a paragraph is its runs and fields
+concatenated with '\\v' for each line break.
+"""
+import multiprocessing
+import os
+import posixpath
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from lxml import etree
+
+_P = '{http://schemas.openxmlformats.org/presentationml/2006/main}'
+_A = '{http://schemas.openxmlformats.org/drawingml/2006/main}'
+_R = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_PKG_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}Relationship'
+_OFFICE_DOCUMENT = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+
+_SP_TREE = _P + 'spTree'
+_SP = _P + 'sp'
+# Elements python-pptx treats as shapes when they are children of the shape tree
+_SHAPE_TAGS = tuple(_P + tag for tag in ('sp', 'grpSp', 'graphicFrame', 'cxnSp', 'pic', 'contentPart'))
+_TX_BODY = _P + 'txBody'
+_PARAGRAPH = _A + 'p'
+_RUN, _FIELD, _BREAK, _TEXT = _A + 'r', _A + 'fld', _A + 'br', _A + 't'
+
+
+def part_rels(zf, member):
+    """{rId: (type, target member name)} of the internal relationships of member."""
+    directory, name = posixpath.split(member)
+    rels_member = posixpath.join(directory, '_rels', name + '.rels')
+    try:
+        root = etree.fromstring(zf.read(rels_member))
+    except KeyError:
+        return {}
+    rels = {}
+    for rel in root.iter(_PKG_REL):
+        if rel.get('TargetMode') == 'External':
+            continue
+        target = rel.get('Target')
+        if target.startswith('/'):
+            target = target[1:]
+        else:
+            target = posixpath.normpath(posixpath.join(directory, target))
+        rels[rel.get('Id')] = (rel.get('Type'), target)
+    return rels
+
+
+class SlideParts:
+    """The slide XML members of a .pptx package, in presentation order.
+
+    package is the package as bytes or an open zipfile.ZipFile.
+    """
+
+    def __init__(self, package):
+        self._zip = package if isinstance(package, zipfile.ZipFile) else zipfile.ZipFile(BytesIO(package))
+        names = set(self._zip.namelist())
+        self.presentation = next(target for rel_type, target in part_rels(self._zip, '').values()
+                                 if rel_type == _OFFICE_DOCUMENT)
+        rels = part_rels(self._zip, self.presentation)
+        root = etree.fromstring(self._zip.read(self.presentation))
+        self.members = []
+        for sld_id in root.iter(_P + 'sldId'):
+            rel = rels.get(sld_id.get(_R + 'id'))
+            # Like python-pptx, ignore relationships to parts that are not in the package
+            if rel is not None and rel[1] in names:
+                self.members.append(rel[1])
+
+    def __len__(self):
+        return len(self.members)
+
+    def open(self, index):
+        return self._zip.open(self.members[index])
+
+    def read(self, index):
+        return self._zip.read(self.members[index])
+
+
+def _paragraph_text(p):
+    parts = []
+    for child in p:
+        if child.tag == _RUN or child.tag == _FIELD:
+            t = child.find(_TEXT)
+            if t is not None and t.text is not None:
+                parts.append(t.text)
+        elif child.tag == _BREAK:
+            parts.append('\v')
+    return ''.join(parts)
+
+
+def slide_text(source):
+    """{"title", "content"} of one slide, from its XML as bytes or a binary file object."""
+    if isinstance(source, bytes):
+        source = BytesIO(source)
+    title = ""
+    content = []
+    # Same parser options as python-pptx, so whitespace-only text survives identically
+    for _, element in etree.iterparse(source, events=('end',), tag=_SHAPE_TAGS, remove_blank_text=True,
+                                      resolve_entities=False):
+        parent = element.getparent()
+        if parent is None or parent.tag != _SP_TREE:
+            continue
+        if element.tag == _SP:
+            tx_body = element.find(_TX_BODY)
+            if tx_body is not None:
+                text = '\n'.join(_paragraph_text(p) for p in tx_body.iterchildren(_PARAGRAPH)).strip()
+                if text:
+                    if not title:
+                        title = text
+                    else:
+                        content.append(text)
+        # Every top-level shape is done with once it ends; drop it to keep memory flat
+        element.clear()
+        while element.getprevious() is not None:
+            del parent[0]
+    return {
+        "title": title,
+        "content": "\n".join(content)
+    }
+
+
+_pool = None
+_pool_pid = None
+
+
+def _get_pool(processes):
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        # forkserver where available, so workers never inherit the server's threads
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else None
+        _pool = ProcessPoolExecutor(max_workers=processes,
+                                    mp_context=multiprocessing.get_context(method) if method else None)
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def extract_slide_texts(parts, start=0, limit=None, processes=0, min_parallel=64):
+    """Text of slides start..start+limit of a SlideParts.
+
+    With processes > 0, ranges of at least min_parallel slides are parsed
+    on a shared process pool of that size; smaller ones stay in-process,
+    where shipping the XML to a worker would cost more than parsing it.
+    """
+    end = len(parts) if limit is None else min(len(parts), start + limit)
+    indexes = range(max(start, 0), end)
+    if processes and len(indexes) >= min_parallel:
+        chunksize = max(1, len(indexes) // (processes * 4))
+        return list(_get_pool(processes).map(slide_text, (parts.read(i) for i in indexes), chunksize=chunksize))
+    results = []
+    for i in indexes:
+        with parts.open(i) as f:
+            results.append(slide_text(f))
+    return results
@@ -23,6 +23,8 @@ let isWaitingForDraftResponse = false;
 let isWaitingForSlideCount = false;
 let isWaitingForContent = false;
 let currentSlideCount = '';
+// Server-side copy of the deck last saved, so later saves only send what changed
+let deckSession = null;
 
 // Event Listeners
 sendButton.addEventListener('click', handleSendMessage);
@@ -92,8 +94,13 @@ async function handleFileUpload(event) {
         }
 
         const data = await response.json();
+        // The previous upload is no longer needed once another deck is loaded
+        if (currentPresentation && currentPresentation.uploadId) {
+            fetch(`http://localhost:5001/api/uploads/${currentPresentation.uploadId}`, { method: 'DELETE' }).catch(() => {});
+        }
         currentPresentation = {
             name: file.name,
+            uploadId: data.uploadId,
             size: formatFileSize(file.size),
             lastModified: new Date(file.lastModified).toLocaleString()
         };
@@ -104,7 +111,7 @@ async function handleFileUpload(event) {
             headers: {
                 'Content-Type': 'application/json'
             },
-            body: JSON.stringify({ filename: file.name })
+            body: JSON.stringify({ uploadId: data.uploadId, filename: file.name })
         });
         let slides = [];
         if (slidesResponse.ok) {
@@ -112,6 +119,7 @@ async function handleFileUpload(event) {
             slides = slidesData.slides || [];
         }
 
+        deckSession = null;
         presentationState = {
             slides: slides,
             currentSlideIndex: slides.length > 0 ? 0 : -1,
@@ -184,6 +192,70 @@ function handleAddSlide() {
     });
 }
 
+// Operations that turn the last saved slides into the current ones
+function deckSessionOperations(session, slides, styleKey, styleColors, logoSettings) {
+    const operations = [];
+    if (styleKey !== session.styleKey) {
+        operations.push({ op: 'restyle', styleColors, logoSettings });
+    }
+    const common = Math.min(session.slides.length, slides.length);
+    for (let i = 0; i < common; i++) {
+        if (JSON.stringify(slides[i]) !== session.slides[i]) {
+            operations.push({ op: 'edit', index: i, slide: slides[i] });
+        }
+    }
+    for (let i = common; i < slides.length; i++) {
+        operations.push({ op: 'insert', index: i, slide: slides[i] });
+    }
+    for (let i = session.slides.length - 1; i >= slides.length; i--) {
+        operations.push({ op: 'delete', index: i });
+    }
+    return operations;
+}
+
+// Bring the server-side deck session up to date, creating it on the first save.
+// Returns the session id, or null when the session could not be used.
+async function syncDeckSession(payload) {
+    const styleKey = JSON.stringify([payload.styleColors, payload.logoSettings]);
+    if (deckSession && deckSession.filename === payload.filename && deckSession.uploadId === payload.uploadId) {
+        const operations = deckSessionOperations(deckSession, payload.slides, styleKey, payload.styleColors, payload.logoSettings);
+        const response = await fetch(`http://localhost:5001/api/sessions/${deckSession.id}`, {
+            method: 'PATCH',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ operations })
+        });
+        if (response.ok) {
+            deckSession.slides = payload.slides.map(slide => JSON.stringify(slide));
+            deckSession.styleKey = styleKey;
+            return deckSession.id;
+        }
+        // Expired, evicted or out of sync: start over with a fresh session
+        deckSession = null;
+    }
+
+    const response = await fetch('http://localhost:5001/api/sessions', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify(payload)
+    });
+    if (!response.ok) {
+        return null;
+    }
+    const data = await response.json();
+    deckSession = {
+        id: data.sessionId,
+        filename: payload.filename,
+        uploadId: payload.uploadId,
+        slides: payload.slides.map(slide => JSON.stringify(slide)),
+        styleKey
+    };
+    return deckSession.id;
+}
+
 // Handle save presentation
 async function handleSavePresentation() {
     if (!currentPresentation || presentationState.slides.length === 0) {
@@ -192,18 +264,29 @@ async function handleSavePresentation() {
     }
 
     try {
-        const response = await fetch('http://localhost:5001/api/save-presentation', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                slides: presentationState.slides,
-                filename: currentPresentation.name,
-                styleColors: JSON.parse(localStorage.getItem('styleColors') || '{}'),
-                logoSettings: JSON.parse(localStorage.getItem('logoSettings') || '{}')
-            })
-        });
+        const payload = {
+            slides: presentationState.slides,
+            filename: currentPresentation.name,
+            uploadId: currentPresentation.uploadId,
+            styleColors: JSON.parse(localStorage.getItem('styleColors') || '{}'),
+            logoSettings: JSON.parse(localStorage.getItem('logoSettings') || '{}')
+        };
+
+        let response = null;
+        const sessionId = await syncDeckSession(payload).catch(() => null);
+        if (sessionId) {
+            response = await fetch(`http://localhost:5001/api/sessions/${sessionId}/presentation`);
+        }
+        if (!response || !response.ok) {
+            deckSession = null;
+            response = await fetch('http://localhost:5001/api/save-presentation', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify(payload)
+            });
+        }
 
         if (!response.ok) {
             throw new Error('Save failed');
@@ -624,26 +707,79 @@ function createEmptyPresentation() {
     addMessage('Empty presentation created successfully!', 'assistant');
 }
 
-async function createPresentationWithContent(content, slideCount) {
+// Read the Server-Sent Events of /api/generate-presentation/stream, calling onSlide
+// for every slide as it arrives. Falls back to the JSON endpoint if streaming fails.
+async function streamPresentation(content, slideCount, onSlide) {
+    const body = JSON.stringify({ content: content, slideCount: slideCount });
+    const slides = [];
     try {
-        // Call the API to generate presentation content
-        const response = await fetch('/api/generate-presentation', {
+        const response = await fetch('/api/generate-presentation/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({
-                content: content,
-                slideCount: slideCount
-            })
+            body: body
         });
-
-        if (!response.ok) {
-            throw new Error('Failed to generate presentation content');
+        if (!response.ok || !response.body) {
+            throw new Error('Streaming not available');
+        }
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let eventName = 'message';
+                let data = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) eventName = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                });
+                if (eventName === 'slide') {
+                    const slide = JSON.parse(data).slide;
+                    slides.push(slide);
+                    onSlide(slide);
+                } else if (eventName === 'error') {
+                    throw new Error(JSON.parse(data).error);
+                }
+            }
         }
+        return slides;
+    } catch (error) {
+        if (slides.length > 0) throw error;
+        console.warn('Falling back to non-streaming generation:', error);
+    }
 
-        const data = await response.json();
-        const slides = data.slides;
+    const response = await fetch('/api/generate-presentation', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: body
+    });
+
+    if (!response.ok) {
+        throw new Error('Failed to generate presentation content');
+    }
+
+    const data = await response.json();
+    data.slides.forEach(onSlide);
+    return data.slides;
+}
+
+async function createPresentationWithContent(content, slideCount) {
+    try {
+        // Stream the generated slides so each one shows up as soon as it is ready
+        const slides = await streamPresentation(content, slideCount, (slide) => {
+            presentationState.slides.push(slide);
+            updatePresentationPreview();
+            addMessage(`Slide ready: ${slide.title}`, 'assistant');
+        });
 
         // Create presentation with the generated content
         const prs = new Presentation();
@@ -0,0 +1,149 @@
+"""The front end's files, held in memory with ETags and precompressed variants.
+
+Everything under the static folder is read once (at startup, or again when
+a file changes with reload=True), hashed and compressed with gzip, and with
+brotli when the brotli package is installed. index.html is rewritten so its
+references to the other assets carry ?v=<hash>; a request with the current
+version can be cached for a year, anything else (index.html itself, or an
+asset without the right version) is sent with Cache-Control: no-cache and
+revalidated through its ETag.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from werkzeug.wrappers import Response
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# Worth compressing; images are already compressed
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+# Files whose asset references get ?v=<hash>
+VERSIONED_PAGES = ('index.html',)
+_REFERENCE_RE = re.compile(r'''(\s(?:src|href)=")([^"?#:]+)(")''')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+class StaticAsset:
+    __slots__ = ('mimetype', 'body', 'etag', 'version', 'encodings', 'stamp')
+
+    def __init__(self, mimetype, body, stamp):
+        self.mimetype = mimetype
+        self.body = body
+        self.stamp = stamp
+        self.version = hashlib.sha256(body).hexdigest()[:16]
+        self.etag = self.version
+        # encoding -> compressed body, only kept where it is actually smaller
+        self.encodings = {}
+        if mimetype.startswith(COMPRESSIBLE_TYPES):
+            variants = [('gzip', gzip.compress(body, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                variants.insert(0, ('br', brotli.compress(body)))
+            for encoding, data in variants:
+                if len(data) < len(body):
+                    self.encodings[encoding] = data
+
+
+class StaticAssets:
+    def __init__(self, root, reload=False):
+        self.root = root
+        self.reload = reload
+        self._assets = {}
+        self._lock = threading.Lock()
+        self.build()
+
+    def _files(self):
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                yield os.path.relpath(path, self.root).replace(os.sep, '/'), path
+
+    def _stamps(self):
+        stamps = {}
+        for name, path in self._files():
+            st = os.stat(path)
+            stamps[name] = (st.st_mtime_ns, st.st_size)
+        return stamps
+
+    def build(self):
+        """Read and compress every file under root."""
+        assets = {}
+        stamps = self._stamps()
+        for name, path in self._files():
+            with open(path, 'rb') as f:
+                body = f.read()
+            mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            assets[name] = StaticAsset(mimetype, body, stamps.get(name))
+        for name in VERSIONED_PAGES:
+            page = assets.get(name)
+            if page is not None:
+                assets[name] = StaticAsset(page.mimetype, self._version_references(name, page.body, assets), page.stamp)
+        with self._lock:
+            self._assets = assets
+
+    @staticmethod
+    def _version_references(name, body, assets):
+        base = os.path.dirname(name)
+
+        def versioned(match):
+            target = os.path.normpath(os.path.join(base, match.group(2))).replace(os.sep, '/')
+            asset = assets.get(target)
+            if asset is None:
+                return match.group(0)
+            return f'{match.group(1)}{match.group(2)}?v={asset.version}{match.group(3)}'
+
+        return _REFERENCE_RE.sub(versioned, body.decode('utf-8')).encode('utf-8')
+
+    def _changed(self):
+        with self._lock:
+            known = {name: asset.stamp for name, asset in self._assets.items()}
+        return known != self._stamps()
+
+    def get(self, name):
+        if self.reload and self._changed():
+            self.build()
+        with self._lock:
+            return self._assets.get(name)
+
+    def response(self, name, request):
+        """The Response for static file name, or None if there is no such file."""
+        asset = self.get(name)
+        if asset is None:
+            return None
+        encoding = None
+        for candidate in ('br', 'gzip'):
+            if candidate in asset.encodings and request.accept_encodings.quality(candidate) > 0:
+                encoding = candidate
+                break
+        # Every representation gets its own strong ETag
+        etag = f'{asset.etag}-{encoding}' if encoding else asset.etag
+        headers = {
+            'ETag': f'"{etag}"',
+            'Cache-Control': IMMUTABLE if request.args.get('v') == asset.version else 'no-cache',
+        }
+        if asset.encodings:
+            headers['Vary'] = 'Accept-Encoding'
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+        body = asset.encodings[encoding] if encoding else asset.body
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        headers['Content-Length'] = str(len(body))
+        return Response(body, mimetype=asset.mimetype, headers=headers)
+
+    def stats(self):
+        with self._lock:
+            assets = dict(self._assets)
+        return {
+            'files': len(assets),
+            'bytes': sum(len(asset.body) for asset in assets.values()),
+            'compressedBytes': {
+                encoding: sum(len(asset.encodings.get(encoding, asset.body)) for asset in assets.values())
+                for encoding in (('br', 'gzip') if brotli is not None else ('gzip',))
+            },
+        }
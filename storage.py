@@ -0,0 +1,531 @@
+"""Storage shared by the server's processes, on one host or on several.
+
+Two kinds of data go through a storage backend:
+
+- values: byte strings under a key, optionally expiring after a TTL, with
+  add-if-absent and counters (upload records, cached completions and slide
+  text, built decks, deck sessions, job results);
+- blobs: immutable files stored under a name that identifies their content
+  (uploaded decks), read through a path on the local disk.
+
+LocalStorage keeps values in SQLite and blobs as files under one directory,
+which every process on the host shares. RedisStorage talks the Redis
+protocol (RESP) to a Redis server, so several hosts behind a load balancer
+share one state and any of them can serve any request; each host reads
+blobs through its own local copy. benchmarks/stub_redis.py is a small
+stand-in server for trying it out without Redis.
+
+storage_from_env() picks one from STORAGE_URL: unset or file:///path for
+LocalStorage, redis://[:password@]host[:port][/db] for RedisStorage.
+"""
+import hashlib
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from urllib.parse import unquote, urlsplit
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
+
+_NAME_RE = re.compile(r'^[\w.-]+$')
+# Blobs go to and from Redis in pieces of this size
+BLOB_CHUNK_SIZE = 1024 * 1024
+LOCK_STRIPES = 256
+# Drops a lock only while it still holds the caller's token, in one step on the server
+RELEASE_LOCK_SCRIPT = "if redis.call('get',KEYS[1])==ARGV[1] then return redis.call('del',KEYS[1]) else return 0 end"
+
+
+class StorageError(Exception):
+    """The backend refused a command, could not be reached, or a lock stayed busy."""
+
+
+def _check_name(name):
+    if not _NAME_RE.match(name):
+        raise ValueError(f'invalid blob name {name!r}')
+    return name
+
+
+def _expires(ttl):
+    return time.time() + ttl if ttl else None
+
+
+class LocalStorage:
+    """Values in a SQLite file and blobs in a directory, shared by the processes of one host."""
+    remote = False
+
+    def __init__(self, root):
+        self.root = root
+        for name in ('blobs', 'locks'):
+            os.makedirs(os.path.join(root, name), exist_ok=True)
+        self._path = os.path.join(root, 'values.sqlite3')
+        self._local = threading.local()
+        self._stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._writes = 0
+        db = self._connect()
+        db.execute('CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)')
+        db.execute('CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires)')
+
+    def _connect(self):
+        # One connection per thread, and never one inherited across a fork
+        if getattr(self._local, 'pid', None) != os.getpid():
+            db = sqlite3.connect(self._path, timeout=10, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return self._local.db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._connect()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+
+    def _purge(self, db):
+        # Expired rows are invisible already; delete them now and then
+        self._writes += 1
+        if self._writes % 100 == 0:
+            db.execute('DELETE FROM kv WHERE expires <= ?', (time.time(),))
+
+    def get(self, key):
+        row = self._connect().execute(
+            'SELECT value FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)', (key, time.time())).fetchone()
+        return bytes(row[0]) if row is not None else None
+
+    def set(self, key, value, ttl=None):
+        db = self._connect()
+        db.execute('INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)', (key, value, _expires(ttl)))
+        self._purge(db)
+
+    def add(self, key, value, ttl=None):
+        """Set key only if it has no value; True if it was set."""
+        with self._transaction() as db:
+            db.execute('DELETE FROM kv WHERE key = ? AND expires <= ?', (key, time.time()))
+            added = db.execute('INSERT OR IGNORE INTO kv (key, value, expires) VALUES (?, ?, ?)',
+                               (key, value, _expires(ttl))).rowcount == 1
+        return added
+
+    def touch(self, key, ttl):
+        """Restart key's TTL; False if it has no value."""
+        now = time.time()
+        return self._connect().execute(
+            'UPDATE kv SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (now + ttl, key, now)).rowcount == 1
+
+    def delete(self, key):
+        """Drop key; True if it had a value."""
+        now = time.time()
+        return self._connect().execute(
+            'DELETE FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)', (key, now)).rowcount == 1
+
+    def incr(self, key, amount=1):
+        """Add amount to the integer at key (0 if unset) and return the result; counters do not expire."""
+        with self._transaction() as db:
+            row = db.execute('SELECT value FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                             (key, time.time())).fetchone()
+            value = (int(row[0]) if row is not None else 0) + amount
+            db.execute('INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, NULL)',
+                       (key, str(value).encode('ascii')))
+        return value
+
+    @contextmanager
+    def lock(self, name, timeout=30.0):
+        """Exclusive between every thread and process of this host while the block runs.
+
+        Not reentrant; timeout is for RedisStorage's sake, a local lock waits as long as it takes.
+        """
+        stripe = int(hashlib.sha1(name.encode('utf-8')).hexdigest(), 16) % LOCK_STRIPES
+        path = os.path.join(self.root, 'locks', f'{stripe}.lock')
+        with self._stripes[stripe], open(path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _blob_file(self, name):
+        return os.path.join(self.root, 'blobs', _check_name(name))
+
+    def put_blob(self, name, path):
+        """Store the file at path as blob name by moving it there.
+
+        Returns False, leaving path alone, when the blob already exists; names
+        identify content, so the existing one is the same.
+        """
+        target = self._blob_file(name)
+        if os.path.exists(target):
+            return False
+        os.replace(path, target)
+        return True
+
+    def blob_path(self, name):
+        """A local path with the blob's bytes, or None if there is no such blob."""
+        target = self._blob_file(name)
+        return target if os.path.exists(target) else None
+
+    def delete_blob(self, name):
+        """Delete a blob; returns the local path it was read from, or None."""
+        target = self._blob_file(name)
+        try:
+            os.unlink(target)
+        except FileNotFoundError:
+            return None
+        return target
+
+    def stats(self):
+        blobs = os.listdir(os.path.join(self.root, 'blobs'))
+        values = self._connect().execute(
+            'SELECT COUNT(*) FROM kv WHERE expires IS NULL OR expires > ?', (time.time(),)).fetchone()[0]
+        return {
+            'backend': 'local',
+            'values': values,
+            'blobs': len(blobs),
+            'blob_bytes': sum(os.path.getsize(os.path.join(self.root, 'blobs', name)) for name in blobs),
+        }
+
+
+# -- Redis ----------------------------------------------------------------
+
+def _encode(arg):
+    if isinstance(arg, bytes):
+        return arg
+    if isinstance(arg, str):
+        return arg.encode('utf-8')
+    return str(arg).encode('ascii')
+
+
+class RespConnection:
+    """One socket to a Redis server: commands out as RESP arrays, replies parsed back."""
+
+    def __init__(self, host, port, timeout=5.0):
+        self.sock = socket.create_connection((host, port), timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self.sock.makefile('rb')
+
+    def send(self, *args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in map(_encode, args):
+            parts.append(b'$%d\r\n' % len(arg))
+            parts.append(arg)
+            parts.append(b'\r\n')
+        self.sock.sendall(b''.join(parts))
+
+    def read(self):
+        """The next reply: str for status, int, bytes or None for bulk strings, list for arrays.
+
+        An error reply is raised as StorageError; the connection stays usable.
+        """
+        line = self._reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError('connection closed by the server')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode('utf-8')
+        if kind == b'-':
+            raise StorageError(rest.decode('utf-8', 'replace'))
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            size = int(rest)
+            if size < 0:
+                return None
+            data = self._reader.read(size + 2)
+            if len(data) != size + 2:
+                raise ConnectionError('connection closed by the server')
+            return data[:-2]
+        if kind == b'*':
+            size = int(rest)
+            return None if size < 0 else [self.read() for _ in range(size)]
+        raise StorageError(f'unexpected reply {line[:40]!r}')
+
+    def command(self, *args):
+        self.send(*args)
+        return self.read()
+
+    def close(self):
+        try:
+            self._reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisStorage:
+    """Values and blobs in a Redis server, shared by every host that points at it.
+
+    Keys are prefixed with prefix, so several deployments can share a server.
+    Blobs are Redis strings written in BLOB_CHUNK_SIZE pieces under a
+    temporary key and renamed into place, so readers never see half of one;
+    each host keeps local copies in blob_cache, oldest-used dropped once they
+    pass blob_cache_bytes. Expiry, eviction and persistence are the server's:
+    configure maxmemory and a policy such as volatile-lru there.
+    """
+    remote = True
+
+    def __init__(self, host='127.0.0.1', port=6379, db=0, password=None, prefix='sliding:',
+                 blob_cache='blob-cache', blob_cache_bytes=1024 * 1024 * 1024, timeout=5.0, pool_size=16):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.prefix = prefix
+        self.blob_cache = blob_cache
+        self.blob_cache_bytes = blob_cache_bytes
+        self.timeout = timeout
+        self.pool_size = pool_size
+        os.makedirs(blob_cache, exist_ok=True)
+        self._pool = []
+        self._pool_pid = os.getpid()
+        self._pool_lock = threading.Lock()
+        self.blob_downloads = 0
+
+    def _connect(self):
+        conn = RespConnection(self.host, self.port, self.timeout)
+        try:
+            if self.password:
+                conn.command('AUTH', self.password)
+            if self.db:
+                conn.command('SELECT', self.db)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def _acquire(self):
+        with self._pool_lock:
+            # Sockets inherited through fork belong to the parent
+            if self._pool_pid != os.getpid():
+                self._pool = []
+                self._pool_pid = os.getpid()
+            if self._pool:
+                return self._pool.pop(), True
+        return self._connect(), False
+
+    def _release(self, conn):
+        with self._pool_lock:
+            if self._pool_pid == os.getpid() and len(self._pool) < self.pool_size:
+                self._pool.append(conn)
+                return
+        conn.close()
+
+    def execute(self, *args):
+        """Run one command and return its reply.
+
+        A pooled connection the server has since closed is replaced and the
+        command sent once more.
+        """
+        for attempt in (0, 1):
+            try:
+                conn, pooled = self._acquire()
+            except OSError as e:
+                raise StorageError(f'cannot reach redis at {self.host}:{self.port}: {e}') from e
+            try:
+                reply = conn.command(*args)
+            except StorageError:
+                self._release(conn)
+                raise
+            except (OSError, ConnectionError) as e:
+                conn.close()
+                if pooled and attempt == 0:
+                    continue
+                raise StorageError(f'redis at {self.host}:{self.port}: {e}') from e
+            self._release(conn)
+            return reply
+
+    def _key(self, key):
+        return self.prefix + key
+
+    def get(self, key):
+        return self.execute('GET', self._key(key))
+
+    def set(self, key, value, ttl=None):
+        if ttl:
+            self.execute('SET', self._key(key), value, 'PX', int(ttl * 1000))
+        else:
+            self.execute('SET', self._key(key), value)
+
+    def add(self, key, value, ttl=None):
+        """Set key only if it has no value; True if it was set."""
+        args = ('PX', int(ttl * 1000)) if ttl else ()
+        return self.execute('SET', self._key(key), value, 'NX', *args) is not None
+
+    def touch(self, key, ttl):
+        """Restart key's TTL; False if it has no value."""
+        return self.execute('PEXPIRE', self._key(key), int(ttl * 1000)) == 1
+
+    def delete(self, key):
+        """Drop key; True if it had a value."""
+        return self.execute('DEL', self._key(key)) == 1
+
+    def incr(self, key, amount=1):
+        """Add amount to the integer at key (0 if unset) and return the result."""
+        return self.execute('INCRBY', self._key(key), amount)
+
+    @contextmanager
+    def lock(self, name, timeout=30.0):
+        """Exclusive between every process on every host while the block runs.
+
+        Held for at most timeout seconds, in case its holder dies, and waited
+        for at most as long before raising StorageError. Not reentrant.
+        """
+        key = self._key('lock:' + name)
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        delay = 0.005
+        while self.execute('SET', key, token, 'NX', 'PX', int(timeout * 1000)) is None:
+            if time.monotonic() > deadline:
+                raise StorageError(f'lock {name!r} is busy')
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        try:
+            yield
+        finally:
+            # Only ours to drop if it has not expired and been taken by someone else since; a GET
+            # then DEL could delete a lock another host took in between
+            self.execute('EVAL', RELEASE_LOCK_SCRIPT, 1, key, token)
+
+    def _blob_key(self, name):
+        return self._key('blob:' + _check_name(name))
+
+    def _local_copy(self, name):
+        return os.path.join(self.blob_cache, _check_name(name))
+
+    def put_blob(self, name, path):
+        """Upload the file at path as blob name and keep it as this host's local copy.
+
+        Returns False, leaving path alone, when the blob already exists; names
+        identify content, so the existing one is the same.
+        """
+        key = self._blob_key(name)
+        if self.execute('EXISTS', key):
+            return False
+        temp = f'{key}:partial:{uuid.uuid4().hex}'
+        try:
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(BLOB_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    self.execute('APPEND', temp, chunk)
+                    # Cleaned up by the server if we die half way
+                    self.execute('PEXPIRE', temp, 3600 * 1000)
+            stored = self.execute('RENAMENX', temp, key) == 1
+        except BaseException:
+            self.execute('DEL', temp)
+            raise
+        if not stored:
+            self.execute('DEL', temp)
+            return False
+        self.execute('PERSIST', key)
+        os.replace(path, self._local_copy(name))
+        self._prune()
+        return True
+
+    def blob_path(self, name):
+        """A local path with the blob's bytes, downloaded on first use, or None if there is no such blob."""
+        local = self._local_copy(name)
+        try:
+            os.utime(local)
+            return local
+        except FileNotFoundError:
+            pass
+        key = self._blob_key(name)
+        size = self.execute('STRLEN', key)
+        if not size:
+            return None
+        temp = f'{local}.{uuid.uuid4().hex}.part'
+        try:
+            with open(temp, 'wb') as f:
+                for start in range(0, size, BLOB_CHUNK_SIZE):
+                    f.write(self.execute('GETRANGE', key, start, min(size, start + BLOB_CHUNK_SIZE) - 1))
+            os.replace(temp, local)
+        except BaseException:
+            try:
+                os.unlink(temp)
+            except FileNotFoundError:
+                pass
+            raise
+        self.blob_downloads += 1
+        self._prune(keep=local)
+        return local
+
+    def delete_blob(self, name):
+        """Delete a blob; returns the path of this host's local copy if it had one, else None.
+
+        Copies on other hosts are left to age out of their blob caches.
+        """
+        self.execute('DEL', self._blob_key(name))
+        local = self._local_copy(name)
+        try:
+            os.unlink(local)
+        except FileNotFoundError:
+            return None
+        return local
+
+    def _prune(self, keep=None):
+        copies = []
+        for entry in os.scandir(self.blob_cache):
+            if entry.is_file() and not entry.name.endswith('.part'):
+                st = entry.stat()
+                copies.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in copies)
+        for _, size, path in sorted(copies):
+            if total <= self.blob_cache_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self):
+        copies = [entry.stat().st_size for entry in os.scandir(self.blob_cache) if entry.is_file()]
+        with self._pool_lock:
+            idle = len(self._pool)
+        return {
+            'backend': 'redis',
+            'server': f'{self.host}:{self.port}/{self.db}',
+            'keys': self.execute('DBSIZE'),
+            'idle_connections': idle,
+            'local_blobs': len(copies),
+            'local_blob_bytes': sum(copies),
+            'blob_downloads': self.blob_downloads,
+        }
+
+
+def storage_from_env(default_root):
+    """The backend STORAGE_URL names; LocalStorage in default_root when it is unset."""
+    url = os.getenv('STORAGE_URL', '')
+    if url.startswith('redis://'):
+        parts = urlsplit(url)
+        return RedisStorage(
+            host=parts.hostname or '127.0.0.1',
+            port=parts.port or 6379,
+            db=int(parts.path.strip('/') or 0),
+            password=unquote(parts.password) if parts.password else None,
+            prefix=os.getenv('STORAGE_PREFIX', 'sliding:'),
+            blob_cache=os.getenv('STORAGE_BLOB_CACHE', os.path.join(default_root, 'blob-cache')),
+            blob_cache_bytes=int(os.getenv('STORAGE_BLOB_CACHE_BYTES', str(1024 * 1024 * 1024))),
+            timeout=float(os.getenv('STORAGE_TIMEOUT', '5')),
+        )
+    if url.startswith('file://'):
+        return LocalStorage(url[len('file://'):] or default_root)
+    if url:
+        raise ValueError(f'unsupported STORAGE_URL {url!r}: use file:///path or redis://host:port/db')
+    return LocalStorage(default_root)
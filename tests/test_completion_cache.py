@@ -0,0 +1,30 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from completion_cache import CompletionCache
+
+
+def messages(topic):
+    return [{"role": "system", "content": "Make slides."}, {"role": "user", "content": f"Slides about {topic}"}]
+
+
+def test_topics_differing_only_in_punctuation_do_not_share_an_entry(tmp_path):
+    cache = CompletionCache(str(tmp_path / 'completions.sqlite3'))
+    cache.put('presentation', messages('C++ basics'), 'gpt', 1000, 'about C++', topic='C++ basics')
+    assert cache.get('presentation', messages('C# basics'), 'gpt', 1000, topic='C# basics') is None
+    assert cache.get('presentation', messages('C basics'), 'gpt', 1000, topic='C basics') is None
+    assert cache.get('presentation', messages('C++ basics'), 'gpt', 1000, topic='C++ basics') == 'about C++'
+
+
+def test_case_and_whitespace_still_match(tmp_path):
+    cache = CompletionCache(str(tmp_path / 'completions.sqlite3'))
+    cache.put('presentation', messages('Rust  basics'), 'gpt', 1000, 'about Rust', topic='Rust  basics')
+    assert cache.get('presentation', messages('rust basics'), 'gpt', 1000, topic='rust basics') == 'about Rust'
+
+
+def test_fuzzy_lookup_still_ignores_punctuation(tmp_path):
+    cache = CompletionCache(str(tmp_path / 'completions.sqlite3'), fuzzy_threshold=0.9)
+    cache.put('presentation', messages('history of rome'), 'gpt', 1000, 'Rome', topic='history of rome')
+    assert cache.get('presentation', messages('history of Rome!'), 'gpt', 1000, topic='history of Rome!') == 'Rome'
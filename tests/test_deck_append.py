@@ -0,0 +1,116 @@
+import os
+import sys
+import zipfile
+from io import BytesIO
+
+import pytest
+from pptx import Presentation
+from pptx.util import Inches
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import deck
+import zipwriter
+from deck_append import AppendNotSupported, append_slides
+from slide_text import SlideParts, extract_slide_texts
+from zipwriter import ZipTooLarge, check_fits
+
+SLIDES = [
+    {"title": "cats", "layoutType": "boxes", "content": "Fur: Soft.\nPaws: Quiet.\nTails: Long."},
+    {"title": "cats vs dogs", "layoutType": "versus", "content": "Cats: Aloof.\nDogs: Loyal."},
+    {"title": "why", "layoutType": "brain", "content": "Sleep: Lots.\nPlay: Some.\nEat: Often."},
+]
+
+
+def uploaded_deck(path, slides=4):
+    """A deck as a user might upload it: title-and-content slides on the default template."""
+    prs = Presentation()
+    for i in range(slides):
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = f'Uploaded {i}'
+        slide.placeholders[1].text = f'Body of slide {i}'
+    prs.save(str(path))
+    return str(path)
+
+
+def render(prs, num_existing_slides):
+    renderer = deck.deck_renderer(prs, {}, {})
+    for slide_data in SLIDES:
+        deck.render_slide(renderer, slide_data)
+
+
+def in_memory(path):
+    """The same deck built the way the server does without append_slides()."""
+    prs = Presentation(path)
+    prs.slide_width = Inches(16)
+    prs.slide_height = Inches(9)
+    render(prs, len(prs.slides))
+    output = BytesIO()
+    prs.save(output)
+    return output.getvalue()
+
+
+def texts(data):
+    return extract_slide_texts(SlideParts(data))
+
+
+def test_appended_deck_matches_the_in_memory_build(tmp_path):
+    path = uploaded_deck(tmp_path / 'upload.pptx')
+    out = BytesIO()
+    assert append_slides(path, out, render) == len(SLIDES)
+
+    appended = out.getvalue()
+    expected = in_memory(path)
+    assert texts(appended) == texts(expected)
+    assert [text['title'] for text in texts(appended)] == [
+        'Uploaded 0', 'Uploaded 1', 'Uploaded 2', 'Uploaded 3', 'Cats', 'Cats Vs Dogs', 'Why']
+    assert zipfile.ZipFile(BytesIO(appended)).testzip() is None
+
+    # python-pptx opens the result as it would its own output
+    prs = Presentation(BytesIO(appended))
+    assert (prs.slide_width, prs.slide_height) == (Inches(16), Inches(9))
+    assert [slide.slide_layout.name for slide in prs.slides] == [
+        slide.slide_layout.name for slide in Presentation(BytesIO(expected)).slides]
+
+
+def test_appending_twice_numbers_new_parts_after_existing_ones(tmp_path):
+    path = uploaded_deck(tmp_path / 'upload.pptx', slides=2)
+    first = tmp_path / 'first.pptx'
+    with open(first, 'wb') as out:
+        append_slides(path, out, render)
+    out = BytesIO()
+    append_slides(str(first), out, render)
+
+    names = zipfile.ZipFile(BytesIO(out.getvalue())).namelist()
+    assert len(names) == len(set(names))
+    assert len(texts(out.getvalue())) == 2 + 2 * len(SLIDES)
+
+
+def test_archive_over_the_zip_limit_is_refused_before_writing(tmp_path, monkeypatch):
+    path = uploaded_deck(tmp_path / 'upload.pptx')
+    monkeypatch.setattr(zipwriter, '_ZIP_LIMIT', os.path.getsize(path))
+    out = BytesIO()
+    with pytest.raises(AppendNotSupported):
+        append_slides(path, out, render)
+    # Nothing written, so the caller can build the deck in memory instead
+    assert out.getvalue() == b''
+
+
+def test_package_without_slides_is_not_appended_to(tmp_path):
+    path = str(tmp_path / 'not-a-deck.pptx')
+    with zipfile.ZipFile(path, 'w') as zf:
+        zf.writestr('[Content_Types].xml', '<Types/>')
+    out = BytesIO()
+    with pytest.raises(AppendNotSupported):
+        append_slides(path, out, render)
+    assert out.getvalue() == b''
+
+
+def test_check_fits_counts_the_central_directory(monkeypatch):
+    monkeypatch.setattr(zipwriter, '_ZIP_LIMIT', 1000)
+    name = 'ppt/slides/slide1.xml'
+    # One local header, the data and one central directory entry
+    exact = 1000 - (30 + len(name)) - (46 + len(name))
+    check_fits([(name, exact, exact)])
+    with pytest.raises(ZipTooLarge):
+        check_fits([(name, exact + 1, exact + 1)])
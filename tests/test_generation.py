@@ -0,0 +1,42 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generation import JsonSlideStreamParser, parse_json_slides
+
+SLIDE = {"title": "Cats", "points": [{"title": "Fur", "content": "Soft."},
+                                     {"title": "Paws", "content": "Quiet."},
+                                     {"title": "Tails", "content": "Long."}]}
+
+
+def stream(text, size=7):
+    """Every ParsedSlide of text fed in chunks of size characters, and the parser."""
+    parser = JsonSlideStreamParser()
+    parsed = []
+    for start in range(0, len(text), size):
+        parsed += parser.feed(text[start:start + size])
+    return parsed + parser.close(), parser
+
+
+def test_bare_slide_object_is_one_slide_not_its_points():
+    parsed, parser = stream(json.dumps(SLIDE))
+    assert parser.found
+    assert [item.slide for item in parsed] == [{
+        "title": "Slide 1: Cats",
+        "content": [{"title": "Fur", "content": "Soft."}, {"title": "Paws", "content": "Quiet."},
+                    {"title": "Tails", "content": "Long."}],
+    }]
+
+
+def test_slides_array_is_found_after_other_keys_with_lists():
+    text = json.dumps({"notes": ["a", "b"], "slides": [SLIDE, dict(SLIDE, title="Dogs")]})
+    parsed, parser = stream(text)
+    assert [item.slide["title"] for item in parsed] == ["Slide 1: Cats", "Slide 2: Dogs"]
+    assert parser.elements == 2
+
+
+def test_plain_text_reply_is_not_json():
+    parsed = parse_json_slides("Slide 1: Cats\nFur: Soft.\nPaws: Quiet.")
+    assert [item.slide["title"] for item in parsed] == ["Slide 1: Cats"]
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import BULK, INTERACTIVE, FairScheduler, SchedulerBusy
+
+
+def run_calls(scheduler, calls):
+    """Queue (name, client, priority, cost) calls in order behind a call holding the only slot.
+
+    Returns the names in the order they got a slot once it was let go.
+    """
+    started = []
+
+    async def call(name, client, priority, cost):
+        async with scheduler.slot(client, priority, cost):
+            started.append(name)
+            await asyncio.sleep(0)
+
+    async def main():
+        async with scheduler.slot('gate', INTERACTIVE, 0):
+            tasks = []
+            for spec in calls:
+                tasks.append(asyncio.ensure_future(call(*spec)))
+                # Let the call join its queue before the next one
+                await asyncio.sleep(0)
+            assert sum(scheduler.stats()['queued'].values()) == len(calls)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    return started
+
+
+def test_clients_take_turns():
+    scheduler = FairScheduler(1)
+    calls = [(f'a{i}', 'a', BULK, 10) for i in range(5)] + [('b0', 'b', BULK, 10), ('c0', 'c', BULK, 10)]
+    # b and c each get a turn after a's first call, not after all five
+    assert run_calls(scheduler, calls) == ['a0', 'b0', 'c0', 'a1', 'a2', 'a3', 'a4']
+    assert scheduler.stats()['granted'] == 8
+
+
+def test_interactive_calls_go_before_bulk():
+    scheduler = FairScheduler(1)
+    calls = [('bulk0', 'a', BULK, 10), ('bulk1', 'a', BULK, 10), ('bulk2', 'b', BULK, 10),
+             ('chat', 'c', INTERACTIVE, 10)]
+    assert run_calls(scheduler, calls) == ['chat', 'bulk0', 'bulk2', 'bulk1']
+
+
+def test_client_out_of_budget_waits_while_others_go_ahead():
+    scheduler = FairScheduler(2, client_tpm=600, queue_timeout=0.2)
+    order = []
+
+    async def call(name, client):
+        try:
+            async with scheduler.slot(client, BULK, 600):
+                order.append(name)
+        except SchedulerBusy:
+            order.append(name + ' busy')
+
+    async def main():
+        await call('a0', 'a')
+        # a spent its minute's budget on a0, so a1 waits for a refill and b0 goes first
+        await asyncio.gather(call('a1', 'a'), call('b0', 'b'))
+
+    asyncio.run(main())
+    assert order == ['a0', 'b0', 'a1 busy']
+
+
+def test_call_waiting_past_queue_timeout_is_busy():
+    scheduler = FairScheduler(1, queue_timeout=0.05)
+
+    async def main():
+        holding = asyncio.Event()
+        done = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot('a', INTERACTIVE, 10):
+                holding.set()
+                await done.wait()
+
+        holder = asyncio.ensure_future(hold())
+        await holding.wait()
+        with pytest.raises(SchedulerBusy):
+            async with scheduler.slot('b', INTERACTIVE, 10):
+                pass
+        stats = scheduler.stats()
+        assert stats['timed_out'] == 1
+        assert stats['queued'] == {INTERACTIVE: 0, BULK: 0}
+        assert stats['running'] == 1
+        done.set()
+        await holder
+        # The timed-out call gave up its place, so the freed slot is there for the next one
+        async with scheduler.slot('b', INTERACTIVE, 10):
+            assert scheduler.stats()['running'] == 1
+
+    asyncio.run(main())
+    assert scheduler.stats()['running'] == 0
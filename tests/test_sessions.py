@@ -0,0 +1,135 @@
+import os
+import sys
+from io import BytesIO
+
+import pytest
+from pptx import Presentation
+from pptx.util import Inches
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import deck
+from sessions import DeckSession, SessionError
+from slide_text import SlideParts, extract_slide_texts
+
+RED = {'highlightColorRGB': '200, 10, 20'}
+
+
+def slide(title, layout='boxes'):
+    return {'title': title, 'layoutType': layout, 'content': 'Fur: Soft.\nPaws: Quiet.\nTails: Long.'}
+
+
+def new_deck(style=None):
+    """A new deck with its title slide, as the server starts one: (prs, renderer)."""
+    prs = deck.new_presentation()
+    renderer = deck.deck_renderer(prs, style or {}, {})
+    renderer.add_title_slide('Cats')
+    return prs, renderer
+
+
+def new_session(slides):
+    prs, renderer = new_deck()
+    for slide_data in slides:
+        deck.render_slide(renderer, slide_data)
+    return DeckSession(prs, renderer, slides, [True] * len(slides), 1, deck.deck_renderer, deck.render_slide,
+                       {'filename': 'cats.pptx'})
+
+
+def uploaded_deck(path, slides=3):
+    prs = Presentation()
+    for i in range(slides):
+        page = prs.slides.add_slide(prs.slide_layouts[1])
+        page.shapes.title.text = f'Uploaded {i}'
+        page.placeholders[1].text = f'Body of slide {i}'
+    prs.save(str(path))
+    return str(path)
+
+
+def opened(path):
+    prs = Presentation(path)
+    prs.slide_width = Inches(16)
+    prs.slide_height = Inches(9)
+    return prs, deck.deck_renderer(prs, {}, {})
+
+
+def titles(session):
+    return [text['title'] for text in extract_slide_texts(SlideParts(session.save()))]
+
+
+def test_edit_insert_and_delete():
+    session = new_session([slide('one'), slide('two'), slide('three')])
+    assert session.apply([
+        {'op': 'edit', 'index': 1, 'slide': slide('second', 'versus')},
+        {'op': 'insert', 'index': 0, 'slide': slide('zero')},
+        {'op': 'insert', 'slide': slide('last', 'brain')},
+        {'op': 'delete', 'index': 3},
+    ]) == 3
+    assert session.version == 2
+    assert titles(session) == ['Cats', 'Zero', 'One', 'Second', 'Last']
+    assert [data['title'] for data in session.slides] == ['zero', 'one', 'second', 'last']
+
+    # Same text as building the final slide list from scratch
+    full = new_session(session.slides)
+    assert extract_slide_texts(SlideParts(session.save())) == extract_slide_texts(SlideParts(full.save()))
+    part_names = [page.part.partname for page in Presentation(BytesIO(session.save())).slides]
+    assert len(part_names) == len(set(part_names))
+
+
+def test_failed_operation_keeps_the_version():
+    session = new_session([slide('one')])
+    saved = session.save()
+    for operations in ([{'op': 'edit', 'index': 1, 'slide': slide('two')}], [{'op': 'move', 'index': 0}],
+                       [{'op': 'edit', 'index': 0, 'slide': 'two'}], {'op': 'delete', 'index': 0}):
+        with pytest.raises(SessionError):
+            session.apply(operations)
+    assert session.version == 1
+    assert session.save() == saved
+
+
+def test_restyle_renders_only_the_sessions_own_slides(tmp_path):
+    path = uploaded_deck(tmp_path / 'upload.pptx')
+    prs, renderer = opened(path)
+    deck.render_slide(renderer, slide('new'))
+    session = DeckSession(prs, renderer, [{}, {}, {}, slide('new')], [False, False, False, True], 0,
+                          deck.deck_renderer, deck.render_slide, {'filename': 'upload.pptx'})
+
+    assert session.apply([{'op': 'restyle', 'styleColors': RED}]) == 1
+    assert session.base['styleColors'] == RED
+    assert titles(session) == ['Uploaded 0', 'Uploaded 1', 'Uploaded 2', 'New']
+    # The new colour is in the restyled slide, and the uploaded ones are untouched
+    xml = [page.part.blob for page in session.prs.slides]
+    assert b'C80A14' in xml[3]
+    assert not any(b'C80A14' in blob for blob in xml[:3])
+
+
+def test_restore_rebuilds_a_new_deck():
+    session = new_session([slide('one'), slide('two'), slide('three')])
+    session.apply([{'op': 'restyle', 'styleColors': RED}])
+    session.apply([{'op': 'delete', 'index': 0}, {'op': 'insert', 'index': 1, 'slide': slide('four')}])
+
+    prs, renderer = new_deck(RED)
+    restored = DeckSession.restore(session.to_state(), prs, renderer, deck.deck_renderer, deck.render_slide)
+    assert (restored.id, restored.version) == (session.id, session.version)
+    assert restored.to_state() == session.to_state()
+    assert extract_slide_texts(SlideParts(restored.save())) == extract_slide_texts(SlideParts(session.save()))
+    assert titles(restored) == ['Cats', 'Two', 'Four', 'Three']
+
+    # The restored session keeps taking operations
+    restored.apply([{'op': 'edit', 'index': 0, 'slide': slide('again')}])
+    assert titles(restored) == ['Cats', 'Again', 'Four', 'Three']
+
+
+def test_restore_rebuilds_an_uploaded_deck(tmp_path):
+    path = uploaded_deck(tmp_path / 'upload.pptx', slides=4)
+    prs, renderer = opened(path)
+    session = DeckSession(prs, renderer, [{}] * 4, [False] * 4, 0, deck.deck_renderer, deck.render_slide)
+    session.apply([
+        {'op': 'edit', 'index': 0, 'slide': slide('edited')},
+        {'op': 'delete', 'index': 2},
+        {'op': 'insert', 'slide': slide('added')},
+    ])
+    assert titles(session) == ['Edited', 'Uploaded 1', 'Uploaded 3', 'Added']
+
+    prs, renderer = opened(path)
+    restored = DeckSession.restore(session.to_state(), prs, renderer, deck.deck_renderer, deck.render_slide)
+    assert extract_slide_texts(SlideParts(restored.save())) == extract_slide_texts(SlideParts(session.save()))
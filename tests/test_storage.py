@@ -0,0 +1,121 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from storage import LocalStorage, RedisStorage, StorageError
+from stub_redis import StubRedisServer
+
+
+@pytest.fixture(params=['local', 'redis'])
+def hosts(request, tmp_path):
+    """Two backends sharing one state, as two hosts (or processes) would."""
+    if request.param == 'local':
+        yield LocalStorage(str(tmp_path / 'store')), LocalStorage(str(tmp_path / 'store'))
+        return
+    server = StubRedisServer().start()
+    port = server.server_address[1]
+    yield (RedisStorage(port=port, blob_cache=str(tmp_path / 'a')),
+           RedisStorage(port=port, blob_cache=str(tmp_path / 'b')))
+    server.shutdown()
+    server.server_close()
+
+
+def write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path)
+
+
+def test_values_expire_after_their_ttl(hosts):
+    a, b = hosts
+    a.set('kept', b'1')
+    a.set('short', b'2', ttl=0.2)
+    assert b.get('short') == b'2'
+    assert not b.add('short', b'3')
+    time.sleep(0.3)
+    assert b.get('short') is None
+    assert b.get('kept') == b'1'
+    assert b.add('short', b'3', ttl=0.2)
+    assert a.touch('short', 60)
+    time.sleep(0.3)
+    assert a.get('short') == b'3'
+    assert a.delete('short')
+    assert not b.touch('short', 60)
+
+
+def test_lock_excludes_other_holders(hosts):
+    a, b = hosts
+    a.set('count', b'0')
+
+    def bump(storage):
+        for _ in range(5):
+            with storage.lock('count'):
+                value = int(storage.get('count'))
+                time.sleep(0.002)
+                storage.set('count', str(value + 1).encode('ascii'))
+
+    threads = [threading.Thread(target=bump, args=(storage,)) for storage in (a, b, a, b)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert a.get('count') == b'20'
+
+
+def test_blob_reference_counts(hosts, tmp_path):
+    a, b = hosts
+    assert a.put_blob('deck-1.pptx', write(tmp_path / 'first', b'deck bytes'))
+    # The same content again: the caller keeps its file and takes another reference
+    duplicate = write(tmp_path / 'second', b'deck bytes')
+    assert not b.put_blob('deck-1.pptx', duplicate)
+    assert os.path.exists(duplicate)
+    assert [a.incr('refs:deck-1'), b.incr('refs:deck-1')] == [1, 2]
+
+    with open(b.blob_path('deck-1.pptx'), 'rb') as f:
+        assert f.read() == b'deck bytes'
+    assert a.incr('refs:deck-1', -1) == 1
+    assert b.blob_path('deck-1.pptx') is not None
+    assert b.incr('refs:deck-1', -1) == 0
+    b.delete_blob('deck-1.pptx')
+    # Other hosts' local copies age out of their caches; the blob itself is gone
+    assert b.blob_path('deck-1.pptx') is None
+
+
+def test_redis_lock_release_leaves_a_lock_taken_after_expiry(tmp_path):
+    server = StubRedisServer().start()
+    port = server.server_address[1]
+    a = RedisStorage(port=port, blob_cache=str(tmp_path / 'a'))
+    b = RedisStorage(port=port, blob_cache=str(tmp_path / 'b'))
+    try:
+        taken = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with b.lock('session:1', timeout=5):
+                taken.set()
+                release.wait(5)
+
+        with a.lock('session:1', timeout=0.2):
+            # a's lock expires while a is still in its block, and b takes it
+            time.sleep(0.3)
+            holder = threading.Thread(target=hold)
+            holder.start()
+            assert taken.wait(5)
+        # Leaving a's block must not have dropped b's lock
+        with pytest.raises(StorageError):
+            with a.lock('session:1', timeout=0.2):
+                pass
+        release.set()
+        holder.join()
+        with a.lock('session:1', timeout=0.2):
+            pass
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,75 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import LocalStorage
+from upload_store import UnknownUpload, UploadStore, UploadTooLarge
+
+
+def upload(store, data, filename='deck.pptx'):
+    """Write data to a new temp file of store in two chunks and commit it."""
+    file = store.temp_file()
+    file.write(data[:3])
+    file.write(data[3:])
+    return store.commit(file, filename)
+
+
+def test_same_bytes_share_one_stored_deck(tmp_path):
+    store = UploadStore(str(tmp_path / 'uploads'), LocalStorage(str(tmp_path / 'store')))
+    first = upload(store, b'deck bytes', 'a.pptx')
+    second = upload(store, b'deck bytes', 'b.pptx')
+    other = upload(store, b'other deck')
+
+    assert first['uploadId'] != second['uploadId']
+    assert first['sha256'] == second['sha256'] != other['sha256']
+    assert [first['deduplicated'], second['deduplicated'], other['deduplicated']] == [False, True, False]
+    assert store.stats() == {'deduplicated': 1}
+    assert store.path(first['uploadId']) == store.path(second['uploadId'])
+    with open(store.path(second['uploadId']), 'rb') as f:
+        assert f.read() == b'deck bytes'
+    assert store.get(second['uploadId'])['filename'] == 'b.pptx'
+    # The duplicate's temp file is not left behind
+    assert os.listdir(tmp_path / 'uploads' / 'tmp') == []
+
+
+def test_deck_is_deleted_with_its_last_upload_id(tmp_path):
+    store = UploadStore(str(tmp_path / 'uploads'), LocalStorage(str(tmp_path / 'store')))
+    first = upload(store, b'deck bytes')
+    second = upload(store, b'deck bytes')
+    path = store.path(first['uploadId'])
+
+    assert store.release(first['uploadId']) is None
+    assert store.get(first['uploadId']) is None
+    assert store.path(second['uploadId']) == path
+    assert os.path.exists(path)
+
+    assert store.release(second['uploadId']) is not None
+    assert not os.path.exists(path)
+    # Uploading it again stores it afresh
+    third = upload(store, b'deck bytes')
+    assert not third['deduplicated']
+    assert os.path.exists(store.path(third['uploadId']))
+
+
+def test_unknown_and_released_ids(tmp_path):
+    store = UploadStore(str(tmp_path / 'uploads'), LocalStorage(str(tmp_path / 'store')))
+    record = upload(store, b'deck bytes')
+    store.release(record['uploadId'])
+
+    for upload_id in (record['uploadId'], '0' * 32, '../etc/passwd', None):
+        assert store.get(upload_id) is None
+        assert store.path(upload_id) is None
+        with pytest.raises(UnknownUpload):
+            store.release(upload_id)
+
+
+def test_oversized_upload_leaves_no_temp_file(tmp_path):
+    store = UploadStore(str(tmp_path / 'uploads'), LocalStorage(str(tmp_path / 'store')), max_bytes=8)
+    partial = store.temp_file()
+    partial.write(b'12345678')
+    with pytest.raises(UploadTooLarge):
+        partial.write(b'9')
+    assert os.listdir(tmp_path / 'uploads' / 'tmp') == []
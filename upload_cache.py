@@ -0,0 +1,116 @@
+import os
+import threading
+import zipfile
+from cache import LRUCache
+from slide_text import SlideParts, extract_slide_texts
+
+# Rough cost of remembering one slide's text beyond the text itself
+SLIDE_OVERHEAD = 256
+
+
+class ParsedUpload:
+    """What the API needs from an uploaded deck file.
+
+    Only the slide list is read up front. Slide text is extracted from the
+    XML on demand, a slide at a time, straight from the file, and
+    remembered; the package itself is never held in memory, and the
+    python-pptx object model is built only when a save actually needs the deck.
+    """
+
+    __slots__ = ('path', 'slide_count', 'nbytes', '_texts', '_lock')
+
+    def __init__(self, path):
+        self.path = path
+        with zipfile.ZipFile(path) as zf:
+            self.slide_count = len(SlideParts(zf))
+        self._texts = [None] * self.slide_count
+        self.nbytes = SLIDE_OVERHEAD * self.slide_count
+        self._lock = threading.Lock()
+
+    def slides(self, start=0, limit=None, processes=0):
+        """{"title", "content"} of slides start..start+limit, as get-slides returns them."""
+        end = self.slide_count if limit is None else min(self.slide_count, start + limit)
+        start = max(start, 0)
+        with self._lock:
+            missing = [i for i in range(start, end) if self._texts[i] is None]
+            if missing:
+                first = missing[0]
+                with zipfile.ZipFile(self.path) as zf:
+                    texts = extract_slide_texts(SlideParts(zf), first, missing[-1] + 1 - first, processes)
+                for i, text in enumerate(texts, first):
+                    if self._texts[i] is None:
+                        self.nbytes += len(text['title']) + len(text['content'])
+                    self._texts[i] = text
+            return self._texts[start:end]
+
+    def open(self):
+        """Return a fresh, mutable Presentation loaded from the file."""
+        from pptx import Presentation
+        return Presentation(self.path)
+
+
+class UploadCache:
+    """Bounded cache of parsed uploads, keyed by (path, mtime, size).
+
+    A lookup for an unchanged file costs one stat(); a file that changed is
+    parsed again under its new stamp. Entries are sized by the slide text
+    extracted so far, re-measured on every lookup.
+    """
+
+    def __init__(self, max_entries=32, max_bytes=256 * 1024 * 1024):
+        self._parsed = LRUCache(max_entries=max_entries, max_bytes=max_bytes,
+                                sizeof=lambda entry: entry.nbytes)
+        # path -> its current key, so invalidate() and a changed file drop the old entry
+        self._paths = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        key = (path, st.st_mtime_ns, st.st_size)
+        entry = self._parsed.get(key)
+        if entry is not None:
+            self._count(hit=True)
+            # Text extracted since the last lookup counts against the budget now
+            self._parsed.put(key, entry)
+            return entry
+
+        self._count(hit=False)
+        entry = ParsedUpload(path)
+        with self._lock:
+            previous = self._paths.get(path)
+            self._paths[path] = key
+        if previous is not None and previous != key:
+            self._parsed.pop(previous)
+        self._parsed.put(key, entry)
+        return entry
+
+    def invalidate(self, path):
+        """Forget a path, e.g. because /api/upload is replacing the file."""
+        with self._lock:
+            key = self._paths.pop(os.path.abspath(path), None)
+        if key is not None:
+            self._parsed.pop(key)
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        parsed = self._parsed.stats()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': parsed['entries'],
+                'bytes': parsed['bytes'],
+                'evictions': parsed['evictions'],
+                'paths': len(self._paths),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
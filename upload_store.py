@@ -0,0 +1,152 @@
+"""Content-addressed store for uploaded decks.
+
+Uploads are written to a temporary file as they arrive, hashed on the way
+and handed to the storage backend (storage.py) as the blob
+upload-<sha256>.pptx once complete, so the same deck uploaded twice is
+stored once. Every upload gets its own opaque id, whose record is the value
+upload:<id>; upload-refs:<sha256> counts the ids pointing at a deck, and the
+deck is deleted when the last one is released.
+
+Commits and releases of a deck hold the backend's lock for it, so every
+process sharing the backend (on one host, or on several with Redis) can
+share a store. Decks are immutable once stored, so reading them needs no lock.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+
+_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadTooLarge(Exception):
+    """The upload exceeded the store's max_bytes."""
+
+
+class UnknownUpload(KeyError):
+    """No upload with this id (never issued, or already released)."""
+
+
+class HashingFile:
+    """Writable temp file that hashes and counts what is written, refusing more than max_bytes.
+
+    Passed to werkzeug as the upload stream; commit it with UploadStore.commit().
+    An uncommitted file is deleted when closed.
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.committed = False
+        self._sha256 = hashlib.sha256()
+        self._file = open(path, 'w+b')
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            # The parser gives up on the request, so nobody else will close this
+            self.close()
+            raise UploadTooLarge(f'upload exceeds {self.max_bytes} bytes')
+        self._sha256.update(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._sha256.hexdigest()
+
+    def close(self):
+        self._file.close()
+        if not self.committed:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    def __getattr__(self, name):
+        # read/seek/tell/flush etc. go to the underlying file
+        return getattr(self._file, name)
+
+
+class UploadStore:
+    def __init__(self, root, storage, max_bytes=512 * 1024 * 1024):
+        """root holds the temporary files of uploads in progress; decks and records go to storage."""
+        self.root = root
+        self.storage = storage
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(root, 'tmp'), exist_ok=True)
+        self.deduplicated = 0
+
+    @staticmethod
+    def _blob_name(sha256):
+        return f'upload-{sha256}.pptx'
+
+    @staticmethod
+    def _ref_key(upload_id):
+        return 'upload:' + upload_id
+
+    @staticmethod
+    def _count_key(sha256):
+        return 'upload-refs:' + sha256
+
+    def temp_file(self):
+        """A new HashingFile in the store's tmp directory for an incoming upload."""
+        return HashingFile(os.path.join(self.root, 'tmp', uuid.uuid4().hex + '.part'), self.max_bytes)
+
+    def commit(self, upload, filename):
+        """Store a completely written HashingFile and return its ref record."""
+        upload.flush()
+        os.fsync(upload.fileno())
+        sha256 = upload.hexdigest()
+        record = {
+            'uploadId': uuid.uuid4().hex,
+            'sha256': sha256,
+            'filename': filename,
+            'size': upload.size,
+            'created': time.time(),
+        }
+        try:
+            with self.storage.lock('upload:' + sha256):
+                # Moves the file when it is stored; a duplicate is left for close() to delete
+                upload.committed = self.storage.put_blob(self._blob_name(sha256), upload.path)
+                record['deduplicated'] = not upload.committed
+                if record['deduplicated']:
+                    self.deduplicated += 1
+                self.storage.incr(self._count_key(sha256))
+                self.storage.set(self._ref_key(record['uploadId']), json.dumps(record).encode('utf-8'))
+        finally:
+            upload.close()
+        return record
+
+    def get(self, upload_id):
+        """The ref record of an upload id, or None if it is unknown (or not an id at all)."""
+        if not isinstance(upload_id, str) or not _ID_RE.match(upload_id):
+            return None
+        value = self.storage.get(self._ref_key(upload_id))
+        return json.loads(value) if value is not None else None
+
+    def path(self, upload_id):
+        """Local path of the stored deck for an upload id, or None."""
+        record = self.get(upload_id)
+        return self.storage.blob_path(self._blob_name(record['sha256'])) if record is not None else None
+
+    def release(self, upload_id):
+        """Drop an upload id; returns the local path of the deck if that deleted it, else None.
+
+        Raises UnknownUpload for unknown ids.
+        """
+        record = self.get(upload_id)
+        if record is None:
+            raise UnknownUpload(upload_id)
+        sha256 = record['sha256']
+        with self.storage.lock('upload:' + sha256):
+            if not self.storage.delete(self._ref_key(upload_id)):
+                raise UnknownUpload(upload_id)
+            if self.storage.incr(self._count_key(sha256), -1) > 0:
+                return None
+            self.storage.delete(self._count_key(sha256))
+            return self.storage.delete_blob(self._blob_name(sha256))
+
+    def stats(self):
+        return {'deduplicated': self.deduplicated}
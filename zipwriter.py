@@ -0,0 +1,102 @@
+"""A small ZIP writer for members whose compressed bytes are already at hand.
+
+zipfile always compresses what it is given. Deck sessions keep the deflated
+bytes of unchanged parts between saves, and appending to a large upload
+copies the existing members' compressed bytes across unchanged; both just
+need headers written around bytes that are already compressed. Sizes and
+CRCs go in the local headers, so the output file does not need to be
+seekable.
+"""
+import struct
+import time
+import zipfile
+import zlib
+
+_LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+_CENTRAL_HEADER = struct.Struct('<4s4B4HL2L5H2L')
+_END_RECORD = struct.Struct('<4s4H2LH')
+_ZIP_LIMIT = 0xFFFFFFFF
+_UTF8_FLAG = 0x800
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class ZipTooLarge(ValueError):
+    """The archive needs ZIP64 (a member or offset over 4 GB, or over 65535 members)."""
+
+
+def deflate(blob):
+    """(compressed bytes, crc32, uncompressed size) of blob, deflated the way zipfile does it."""
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    return compressor.compress(blob) + compressor.flush(), zlib.crc32(blob), len(blob)
+
+
+def check_fits(members):
+    """Raise ZipTooLarge unless members, (name, compressed size, size) in archive order, fit a plain ZIP file."""
+    offset = 0
+    directory = 0
+    for count, (name, compressed_size, size) in enumerate(members):
+        if offset > _ZIP_LIMIT or compressed_size > _ZIP_LIMIT or size > _ZIP_LIMIT or count >= 0xFFFF:
+            raise ZipTooLarge('archive too large for a plain ZIP file')
+        encoded_length = len(name.encode('utf-8'))
+        offset += _LOCAL_HEADER.size + encoded_length + compressed_size
+        directory += _CENTRAL_HEADER.size + encoded_length
+    # The central directory close() writes has to fit as well
+    if offset + directory > _ZIP_LIMIT:
+        raise ZipTooLarge('archive too large for a plain ZIP file')
+
+
+def _dos_time(timestamp):
+    t = time.localtime(timestamp)
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+class ZipWriter:
+    def __init__(self, file):
+        self._file = file
+        self._offset = 0
+        self._central = []
+        self._dos_time, self._dos_date = _dos_time(time.time())
+
+    def _header(self, name, crc, compressed_size, size, method):
+        if self._offset > _ZIP_LIMIT or compressed_size > _ZIP_LIMIT or size > _ZIP_LIMIT \
+                or len(self._central) >= 0xFFFF:
+            raise ZipTooLarge('archive too large for a plain ZIP file')
+        encoded = name.encode('utf-8')
+        flags = 0 if encoded.isascii() else _UTF8_FLAG
+        self._file.write(_LOCAL_HEADER.pack(b'PK\x03\x04', 20, 0, flags, method, self._dos_time, self._dos_date,
+                                            crc, compressed_size, size, len(encoded), 0))
+        self._file.write(encoded)
+        self._central.append(_CENTRAL_HEADER.pack(b'PK\x01\x02', 20, 3, 20, 0, flags, method,
+                                                  self._dos_time, self._dos_date, crc, compressed_size, size,
+                                                  len(encoded), 0, 0, 0, 0, 0o600 << 16, self._offset) + encoded)
+        self._offset += _LOCAL_HEADER.size + len(encoded) + compressed_size
+
+    def add(self, name, data, crc, size, method=zipfile.ZIP_DEFLATED):
+        """Add a member from its already compressed bytes."""
+        self._header(name, crc, len(data), size, method)
+        self._file.write(data)
+
+    def copy(self, source, info):
+        """Copy member info of the open binary file source (a ZIP) across without recompressing it."""
+        source.seek(info.header_offset)
+        header = source.read(_LOCAL_HEADER.size)
+        name_length, extra_length = struct.unpack('<2H', header[26:30])
+        source.seek(info.header_offset + _LOCAL_HEADER.size + name_length + extra_length)
+        self._header(info.filename, info.CRC, info.compress_size, info.file_size, info.compress_type)
+        remaining = info.compress_size
+        while remaining:
+            chunk = source.read(min(remaining, COPY_CHUNK_SIZE))
+            if not chunk:
+                raise zipfile.BadZipFile(f'truncated member {info.filename}')
+            self._file.write(chunk)
+            remaining -= len(chunk)
+
+    def close(self):
+        """Write the central directory; returns the archive size."""
+        directory = b''.join(self._central)
+        if self._offset + len(directory) > _ZIP_LIMIT:
+            raise ZipTooLarge('archive too large for a plain ZIP file')
+        self._file.write(directory)
+        self._file.write(_END_RECORD.pack(b'PK\x05\x06', 0, 0, len(self._central), len(self._central),
+                                          len(directory), self._offset, 0))
+        return self._offset + len(directory) + _END_RECORD.size